@@ -1,10 +1,19 @@
 import asyncio
+import sys
 
-from fractal.client import main
+from fractal.daemon import forward
 
 
 def run():
-    asyncio.run(main())
+    reply = forward(sys.argv)
+    if reply is None:
+        from fractal.client import main
+
+        asyncio.run(main())
+    else:
+        sys.stderr.write(reply["log"])
+        sys.stdout.write(reply["output"])
+        sys.exit(reply["retcode"])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+"""
+Helpers for the zip archives of job logs
+
+Members are selected with glob patterns on their names, and extracted in
+parallel: each worker thread opens the archive on its own, and zlib releases
+the GIL while decompressing.
+"""
+import io
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import List
+from typing import Optional
+from typing import Sequence
+from zipfile import BadZipFile
+from zipfile import ZipFile
+from zipfile import ZipInfo
+
+from .authclient import AuthClient
+from .config import settings
+from .download import CONTENT_RANGE
+
+# Signature of the "end of central directory" record of zip files
+EOCD_SIGNATURE = b"PK\x05\x06"
+
+
+def select_members(
+    members: Sequence[ZipInfo],
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+) -> List[ZipInfo]:
+    """
+    Members whose name matches any of the `include` patterns (or all, if
+    none is given) and none of the `exclude` ones
+    """
+    return [
+        member
+        for member in members
+        if not member.is_dir()
+        and (not include or any(fnmatch(member.filename, p) for p in include))
+        and not any(fnmatch(member.filename, p) for p in exclude or [])
+    ]
+
+
+def _member_folder(name: str, folder: Path) -> Path:
+    """
+    Folder in which `ZipFile.extract` writes a member, whose name it
+    sanitises the same way
+    """
+    parts = [p for p in name.split("/")[:-1] if p not in ("", ".", "..")]
+    return folder.joinpath(*parts)
+
+
+def _extract(path: Path, names: List[str], folder: Path):
+    with ZipFile(path) as zipfile:
+        for name in names:
+            zipfile.extract(name, path=folder)
+
+
+def extract_members(
+    path: Path,
+    members: Sequence[ZipInfo],
+    folder: Path,
+    workers: Optional[int] = None,
+):
+    """
+    Extract some members of an archive, on `FRACTAL_EXTRACT_WORKERS` threads
+
+    Members are spread across the workers so that each extracts about the
+    same number of (uncompressed) bytes.
+    """
+    workers = workers or settings.FRACTAL_EXTRACT_WORKERS
+    # Create the folders upfront, since `ZipFile.extract` fails if another
+    # worker creates them between its existence check and `os.makedirs`
+    for name in {member.filename for member in members}:
+        os.makedirs(_member_folder(name, folder), exist_ok=True)
+    batches: List[List[str]] = [[] for _ in range(workers)]
+    sizes = [0] * workers
+    for member in sorted(members, key=lambda m: m.file_size, reverse=True):
+        i = sizes.index(min(sizes))
+        batches[i].append(member.filename)
+        sizes[i] += member.file_size
+    batches = [batch for batch in batches if batch]
+    if len(batches) <= 1:
+        for batch in batches:
+            _extract(path, batch, folder)
+        return
+    with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+        for future in [
+            executor.submit(_extract, path, batch, folder) for batch in batches
+        ]:
+            future.result()
+
+
+class _TailFile(io.RawIOBase):
+    """
+    Read-only file of a given size, of which only the last bytes are known
+    """
+
+    def __init__(self, tail: bytes, size: int):
+        self.tail = tail
+        self.size = size
+        self.start = size - len(tail)
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        base = {
+            os.SEEK_SET: 0,
+            os.SEEK_CUR: self.position,
+            os.SEEK_END: self.size,
+        }
+        self.position = base[whence] + offset
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        if self.position < self.start:
+            raise OSError("Read outside of the known part of the file")
+        start = self.position - self.start
+        end = start + len(buffer)
+        data = self.tail[start:end]
+        buffer[: len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+def _central_directory_span(tail: bytes, size: int) -> Optional[int]:
+    """
+    Bytes from the start of the central directory to the end of an archive,
+    according to the "end of central directory" record found in its tail
+    """
+    position = tail.rfind(EOCD_SIGNATURE)
+    if position < 0 or len(tail) < position + 22:
+        return None
+    (offset,) = struct.unpack_from("<I", tail, position + 16)
+    if offset == 0xFFFFFFFF:
+        # ZIP64 archive, whose actual offset is stored elsewhere
+        return None
+    return size - offset
+
+
+async def list_remote_archive(
+    client: AuthClient, url: str, tail_size: int = 64 * 1024
+) -> Optional[List[ZipInfo]]:
+    """
+    Members of a remote archive, read from its central directory only
+
+    The end of the archive is fetched with suffix `Range` requests, growing
+    until it includes the whole central directory (or the whole archive).
+
+    Returns:
+        The members, or `None` if the server does not support ranges.
+
+    Raises:
+        BadZipFile: If the archive is corrupted.
+    """
+    previous_start = None
+    while True:
+        headers = {"Range": f"bytes=-{tail_size}"}
+        async with client.stream("GET", url, headers=headers) as res:
+            match = CONTENT_RANGE.fullmatch(
+                res.headers.get("content-range", "")
+            )
+            if res.status_code != 206 or not match or match[3] == "*":
+                return None
+            tail = await res.aread()
+        start, size = int(match[1]), int(match[3])
+        if previous_start is not None and start >= previous_start:
+            # The server does not send a larger tail than before
+            return None
+        previous_start = start
+        try:
+            with ZipFile(_TailFile(tail, size)) as zipfile:
+                return zipfile.infolist()
+        except (BadZipFile, OSError):
+            if start == 0:
+                raise BadZipFile(f"Corrupted archive at {url}")
+            # The tail must grow, even if the announced span of the central
+            # directory is wrong
+            span = _central_directory_span(tail, size)
+            tail_size = max(span or tail_size * 16, tail_size * 2)
@@ -0,0 +1,159 @@
+"""
+Content-addressed cache of the log archives of finished jobs
+
+The log archive of a job which is `done` or `failed` does not change anymore,
+so it is stored in `FRACTAL_CACHE_PATH/archives/<namespace>`, with one folder
+per server and user:
+    * `objects/<sha256>`: the archives, named after the digest of their
+      content, so that identical archives are only stored once;
+    * `jobs/<job_id>`: the digest of the archive of a job, along with the
+      start timestamp of the job (which tells apart jobs with the same ID on a
+      server whose database was reset).
+
+Cached archives are hard-linked (or copied, across filesystems) to where they
+are needed. The total size of the objects is capped, by evicting the least
+recently used ones.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from .cache import atomic_write
+from .cache import cache_namespace
+from .cache import get_cache_dir
+from .config import settings
+
+
+def _link(source: Path, dest: Path):
+    """
+    Hard-link `source` to `dest` (replacing it), or copy it if they are on
+    different filesystems
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.")
+    os.close(fd)
+    try:
+        os.unlink(tmp_path)
+        try:
+            os.link(source, tmp_path)
+        except OSError:
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+class ArchiveCache:
+    def __init__(self, server: str, username: str, max_size: int):
+        namespace = cache_namespace(server, username)
+        self.objects = get_cache_dir("archives", namespace, "objects")
+        self.jobs = get_cache_dir("archives", namespace, "jobs")
+        self.max_size = max_size
+
+    def load(
+        self, job_id: int, start_timestamp: Optional[str] = None
+    ) -> Optional[Path]:
+        """
+        Return the path of the cached archive of a job, if any
+
+        Arguments:
+            start_timestamp: If set, only return an archive stored for a job
+                with the same start timestamp.
+        """
+        try:
+            entry = json.loads((self.jobs / str(job_id)).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        if start_timestamp not in (None, entry["start_timestamp"]):
+            return None
+        path = self.objects / entry["sha256"]
+        try:
+            # The modification time tracks the last use, for LRU eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def export(
+        self, job_id: int, dest: Path, start_timestamp: Optional[str] = None
+    ) -> bool:
+        """
+        Link the cached archive of a job to `dest`
+
+        Returns:
+            Whether the archive was in the cache.
+        """
+        path = self.load(job_id, start_timestamp)
+        if path is None:
+            return False
+        try:
+            _link(path, dest)
+        except FileNotFoundError:
+            # Evicted by a concurrent process
+            return False
+        return True
+
+    def store(self, job_id: int, path: Path, start_timestamp: str):
+        """
+        Store the archive of a finished job
+        """
+        digest = hashlib.sha256()
+        with path.open("rb") as f:
+            for chunk in iter(
+                lambda: f.read(settings.FRACTAL_DOWNLOAD_CHUNK_SIZE), b""
+            ):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        try:
+            os.utime(self.objects / sha256)
+        except FileNotFoundError:
+            _link(path, self.objects / sha256)
+        entry = dict(sha256=sha256, start_timestamp=start_timestamp)
+        atomic_write(self.jobs / str(job_id), json.dumps(entry))
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in self.objects.iterdir():
+            if path.name.startswith("."):
+                # Temporary file of a concurrent write
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in entries)
+        evicted = set()
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            evicted.add(path.name)
+            total_size -= size
+        if not evicted:
+            return
+        for path in self.jobs.iterdir():
+            try:
+                entry = json.loads(path.read_text())
+            except (FileNotFoundError, ValueError):
+                continue
+            if entry["sha256"] in evicted:
+                path.unlink(missing_ok=True)
+
+
+def get_archive_cache(username: str) -> Optional[ArchiveCache]:
+    """
+    Archive cache of a user on the current server, unless disabled
+    """
+    if not settings.FRACTAL_ARCHIVE_CACHE:
+        return None
+    return ArchiveCache(
+        settings.FRACTAL_SERVER,
+        username,
+        max_size=settings.FRACTAL_ARCHIVE_CACHE_SIZE,
+    )
@@ -1,17 +1,180 @@
-from pathlib import Path
+import asyncio
+import gzip
+import json
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from typing import Any
+from typing import AsyncIterator
+from typing import Dict
+from typing import Optional
+from urllib.parse import urlsplit
+from uuid import uuid4
 
 import jwt
 from httpx import AsyncClient
-from jwt.exceptions import ExpiredSignatureError
+from httpx import ConnectError
+from httpx import ConnectTimeout
+from httpx import Limits
+from httpx import PoolTimeout
+from httpx import Response
+from httpx import Timeout
+from httpx import TransportError
+from httpx import URL
+from jwt.exceptions import PyJWTError
 
+from .archivecache import get_archive_cache
+from .cache import atomic_write
+from .cache import cache_namespace
+from .cache import FileLock
+from .cache import get_cache_dir
 from .config import settings
+from .httpcache import get_http_cache
+from .ratelimit import RequestLimiter
 
 
 class AuthenticationError(ValueError):
     pass
 
 
+# Methods which can be repeated without changing the outcome. The PATCH
+# endpoints of the server only replace the fields they receive.
+IDEMPOTENT_METHODS = ["GET", "HEAD", "OPTIONS", "PUT", "PATCH", "DELETE"]
+RETRY_STATUS_CODES = [429, 502, 503, 504]
+# Failures which happen before the request reaches the server, so that it is
+# always safe to retry them
+NOT_SENT_ERRORS = (ConnectError, ConnectTimeout, PoolTimeout)
+
+
+def _retry_after(res: Response) -> Optional[float]:
+    """
+    Delay (in seconds) requested by the `Retry-After` header, if any
+    """
+    value = res.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+def _backoff(attempt: int) -> float:
+    """
+    Exponential backoff with full jitter
+    """
+    cap = min(
+        settings.FRACTAL_RETRY_BACKOFF * 2**attempt,
+        settings.FRACTAL_RETRY_MAX_DELAY,
+    )
+    return random.uniform(0, cap)
+
+
+# Transport options which can be overridden from the command line
+HTTP_OPTIONS = [
+    "http2",
+    "max_connections",
+    "max_keepalive_connections",
+    "keepalive_expiry",
+    "connect_timeout",
+    "read_timeout",
+    "write_timeout",
+    "pool_timeout",
+]
+
+
+def get_http_options(args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract the transport options that were set in the parsed CLI arguments
+    """
+    return {
+        key: args[key] for key in HTTP_OPTIONS if args.get(key) is not None
+    }
+
+
+def make_async_client(
+    *,
+    http2: Optional[bool] = None,
+    max_connections: Optional[int] = None,
+    max_keepalive_connections: Optional[int] = None,
+    keepalive_expiry: Optional[float] = None,
+    connect_timeout: Optional[float] = None,
+    read_timeout: Optional[float] = None,
+    write_timeout: Optional[float] = None,
+    pool_timeout: Optional[float] = None,
+) -> AsyncClient:
+    """
+    Create an httpx client with the transport configuration from the
+    settings, where each option can be overridden (e.g. by CLI flags)
+
+    NOTE: httpx negotiates compressed responses by itself, with gzip and
+    deflate always, and with brotli if the `brotli` package is installed.
+    """
+
+    def _option(value, setting):
+        return getattr(settings, setting) if value is None else value
+
+    http2 = _option(http2, "FRACTAL_HTTP2")
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logging.warning(
+                "HTTP/2 requires the `h2` package (`pip install httpx[http2]`)"
+                ", falling back to HTTP/1.1"
+            )
+            http2 = False
+
+    limits = Limits(
+        max_connections=_option(max_connections, "FRACTAL_MAX_CONNECTIONS"),
+        max_keepalive_connections=_option(
+            max_keepalive_connections, "FRACTAL_MAX_KEEPALIVE_CONNECTIONS"
+        ),
+        keepalive_expiry=_option(keepalive_expiry, "FRACTAL_KEEPALIVE_EXPIRY"),
+    )
+    timeout = Timeout(
+        connect=_option(connect_timeout, "FRACTAL_CONNECT_TIMEOUT"),
+        read=_option(read_timeout, "FRACTAL_READ_TIMEOUT"),
+        write=_option(write_timeout, "FRACTAL_WRITE_TIMEOUT"),
+        pool=_option(pool_timeout, "FRACTAL_POOL_TIMEOUT"),
+    )
+    return AsyncClient(http2=http2, limits=limits, timeout=timeout)
+
+
+def _decode_expiration(token: str) -> Optional[float]:
+    try:
+        claims = jwt.decode(
+            jwt=token,
+            options={"verify_signature": False, "verify_exp": False},
+        )
+        return float(claims["exp"])
+    except (PyJWTError, KeyError, TypeError, ValueError):
+        return None
+
+
 class AuthToken:
+    """
+    Bearer token of a fractal user
+
+    The `exp` claim is only decoded when a new token is set. Concurrent
+    callers which find the token expired share a single login, and once a
+    token is in use it is refreshed in the background shortly before it
+    expires.
+
+    Tokens are cached in `FRACTAL_CACHE_PATH/sessions`, in one file per
+    server and user. Logins are serialised through a lock file, so that
+    concurrent processes reuse the token obtained by the first one.
+    """
+
     def __init__(
         self,
         client: AsyncClient,
@@ -24,11 +187,36 @@ class AuthToken:
         self.password = password
         self.slurm_user = slurm_user
 
+        self.token: Optional[str] = None
+        self.expires_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+        namespace = cache_namespace(settings.FRACTAL_SERVER, username)
+        self._cache_file = get_cache_dir("sessions") / namespace
+        self._cache_lock = FileLock(
+            self._cache_file.with_name(f"{namespace}.lock")
+        )
+        self._load_cached_token()
+
+    def _set_token(self, token: str):
+        self.token = token
+        self.expires_at = _decode_expiration(token)
+
+    def _load_cached_token(self):
+        """
+        Adopt the cached token, if it expires later than the current one
+        """
         try:
-            with open(f"{settings.FRACTAL_CACHE_PATH}/session", "r") as f:
-                self.token = f.read()
+            token = self._cache_file.read_text()
         except FileNotFoundError:
-            pass
+            return
+        expires_at = _decode_expiration(token)
+        if expires_at is not None and (
+            self.expires_at is None or expires_at > self.expires_at
+        ):
+            self.token = token
+            self.expires_at = expires_at
 
     async def _get_fresh_token(self):
         data = dict(
@@ -45,33 +233,56 @@ class AuthToken:
                 f"{res.json()}\n"
             )
         raw_token = res.json()
-        self.token = raw_token["access_token"]
+        self._set_token(raw_token["access_token"])
+        atomic_write(self._cache_file, self.token)
 
-        # Create cache folder, if needed
-        cache_dir = Path(f"{settings.FRACTAL_CACHE_PATH}").expanduser()
-        cache_dir.mkdir(parents=True, exist_ok=True)
-
-        # Write token in cache_file
-        cache_file = cache_dir / "session"
-        with cache_file.open("w") as f:
-            f.write(self.token)
+    def _expires_within(self, seconds: float) -> bool:
+        if self.expires_at is None:
+            return True
+        return time.time() + seconds >= self.expires_at
 
     @property
     def expired(self):
-        try:
-            jwt.decode(
-                jwt=self.token,
-                requires=["exp"],
-                options={
-                    "verify_signature": False,
-                    "verify_exp": True,
-                },
+        return self._expires_within(0)
+
+    async def _refresh(self, margin: float = 0):
+        """
+        Get a fresh token if the current one expires within `margin` seconds
+
+        The check is repeated after acquiring the locks, so that callers
+        which were waiting for a concurrent refresh (in this or in another
+        process) reuse its token.
+        """
+        async with self._lock:
+            if not self._expires_within(margin):
+                return
+            async with self._cache_lock:
+                self._load_cached_token()
+                if self._expires_within(margin):
+                    await self._get_fresh_token()
+
+    async def _refresh_in_background(self):
+        while self.expires_at is not None:
+            remaining = self.expires_at - time.time()
+            # Sleep at least half of the token lifetime, so that a margin
+            # larger than the lifetime does not trigger back-to-back logins
+            await asyncio.sleep(
+                max(
+                    remaining - settings.FRACTAL_TOKEN_REFRESH_MARGIN,
+                    remaining / 2,
+                    0,
+                )
             )
-            return False
-        except AttributeError:
-            return True
-        except ExpiredSignatureError:
-            return True
+            try:
+                # Refresh unless another coroutine already replaced the token
+                await self._refresh(margin=self.expires_at - time.time() + 1)
+            except Exception as e:
+                # Leave it to the next request to log in again, rather than
+                # leaving the error on a task which nobody awaits
+                logging.warning(
+                    f"Could not refresh token in background: {e!r}"
+                )
+                return
 
     async def header(self):
         token = await self.__call__()
@@ -79,9 +290,37 @@ class AuthToken:
 
     async def __call__(self):
         if self.expired:
-            await self._get_fresh_token()
+            await self._refresh()
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(
+                self._refresh_in_background()
+            )
         return self.token
 
+    async def invalidate(self, token: str):
+        """
+        Discard a token which was rejected by the server, e.g. because its
+        user does not exist anymore
+        """
+        async with self._lock:
+            if self.token != token:
+                # Already replaced by a concurrent caller
+                return
+            self.token = None
+            self.expires_at = None
+            async with self._cache_lock:
+                try:
+                    if self._cache_file.read_text() == token:
+                        self._cache_file.unlink()
+                except FileNotFoundError:
+                    pass
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+
 
 class AuthClient:
     def __init__(
@@ -89,15 +328,32 @@ class AuthClient:
         username: str,
         password: str,
         slurm_user: str,
+        use_cache: bool = True,
+        **http_options,
     ):
+        """
+        Arguments:
+            use_cache: Whether GET responses go through the HTTP cache, and
+                job archives through the archive cache (if enabled in the
+                settings).
+            http_options: Overrides of the transport configuration, see
+                `make_async_client`.
+        """
         self.auth = None
         self.client = None
         self.username = username
         self.password = password
         self.slurm_user = slurm_user
+        self.http_options = http_options
+        self.limiter = RequestLimiter()
+        # Hosts which (do not) accept gzip-compressed request bodies
+        self.accepts_gzip: Dict[str, bool] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.cache = get_http_cache(username) if use_cache else None
+        self.archive_cache = get_archive_cache(username) if use_cache else None
 
     async def __aenter__(self):
-        self.client = AsyncClient()
+        self.client = make_async_client(**self.http_options)
         self.auth = AuthToken(
             client=self.client,
             username=self.username,
@@ -107,24 +363,222 @@ class AuthClient:
         return self
 
     async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.auth.close()
         await self.client.aclose()
 
-    async def get(self, *args, **kwargs):
-        return await self.client.get(
-            headers=await self.auth.header(), *args, **kwargs
+    def _compress(self, host: str, kwargs: dict) -> Optional[bytes]:
+        """
+        Gzip-compressed JSON body of a request, if it is worth compressing
+        and the server accepts it
+        """
+        if (
+            kwargs.get("json") is None
+            or not settings.FRACTAL_COMPRESS_REQUESTS
+        ):
+            return None
+        if not self.accepts_gzip.get(host):
+            return None
+        content = json.dumps(kwargs["json"]).encode()
+        if len(content) < settings.FRACTAL_COMPRESS_THRESHOLD:
+            return None
+        return gzip.compress(content, compresslevel=6)
+
+    def _learn_encodings(self, host: str, res: Response):
+        """
+        Record whether the server accepts compressed request bodies, which it
+        advertises through the `Accept-Encoding` response header (RFC 7694)
+        """
+        accept_encoding = res.headers.get("Accept-Encoding")
+        if accept_encoding is not None:
+            encodings = [
+                item.split(";")[0].strip().lower()
+                for item in accept_encoding.split(",")
+            ]
+            self.accepts_gzip[host] = "gzip" in encodings
+
+    async def _send_once(self, method: str, url: str, headers: dict, **kwargs):
+        host = urlsplit(str(url)).netloc
+        compressed = self._compress(host, kwargs)
+        async with self.limiter(url):
+            if compressed is not None:
+                res = await self.client.request(
+                    method,
+                    url,
+                    headers={
+                        **headers,
+                        "Content-Type": "application/json",
+                        "Content-Encoding": "gzip",
+                    },
+                    content=compressed,
+                    **{k: v for k, v in kwargs.items() if k != "json"},
+                )
+                self._learn_encodings(host, res)
+                if res.status_code != 415:
+                    return res
+                # Support was withdrawn (e.g. by a proxy), send as is
+                self.accepts_gzip[host] = False
+            res = await self.client.request(
+                method, url, headers=headers, **kwargs
+            )
+        self._learn_encodings(host, res)
+        return res
+
+    async def _send(self, method: str, url: str, headers: dict, **kwargs):
+        token = await self.auth()
+        res = await self._send_once(
+            method,
+            url,
+            {**headers, "Authorization": f"Bearer {token}"},
+            **kwargs,
         )
+        if res.status_code == 401:
+            # A cached token may be rejected even if it is not expired, retry
+            # once with a fresh one
+            await self.auth.invalidate(token)
+            res = await self._send_once(
+                method,
+                url,
+                {**headers, **await self.auth.header()},
+                **kwargs,
+            )
+        return res
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        *,
+        retry: Optional[bool] = None,
+        headers: Optional[dict] = None,
+        **kwargs,
+    ):
+        """
+        Send a request, retrying on transient failures
+
+        Arguments:
+            retry: Whether the request may be repeated when the server may
+                have received it already. Defaults to `True` for idempotent
+                methods, and to `FRACTAL_RETRY_POST` for POST requests.
+                Failures to connect are retried in any case.
+        """
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS or (
+                method == "POST" and settings.FRACTAL_RETRY_POST
+            )
+        headers = dict(headers or {})
+        if retry and method not in IDEMPOTENT_METHODS:
+            # Let the server recognise repetitions of the same request
+            headers.setdefault("Idempotency-Key", str(uuid4()))
+
+        deadline = time.monotonic() + settings.FRACTAL_RETRY_BUDGET
+        attempt = 0
+        while True:
+            res, error, delay = None, None, None
+            try:
+                res = await self._send(method, url, headers, **kwargs)
+            except TransportError as e:
+                if not (retry or isinstance(e, NOT_SENT_ERRORS)):
+                    raise
+                error = e
+            if res is not None:
+                if not (retry and res.status_code in RETRY_STATUS_CODES):
+                    return res
+                delay = _retry_after(res)
+
+            if delay is None:
+                delay = _backoff(attempt)
+            attempt += 1
+            if (
+                attempt > settings.FRACTAL_MAX_RETRIES
+                or time.monotonic() + delay > deadline
+            ):
+                if error is not None:
+                    raise error
+                return res
+            reason = repr(error) if error else f"status code {res.status_code}"
+            logging.warning(
+                f"{method} {url} failed with {reason}, retrying in "
+                f"{delay:.1f} s ({attempt}/{settings.FRACTAL_MAX_RETRIES})"
+            )
+            await asyncio.sleep(delay)
+
+    async def _cached_get(self, url: str):
+        if self.cache is None:
+            return await self._request("GET", url)
+        entry = self.cache.load(url)
+        headers = self.cache.validators(entry) if entry else None
+        res = await self._request("GET", url, headers=headers)
+        if res.status_code == 304 and entry:
+            return self.cache.response(entry, res.request)
+        self.cache.store(url, res)
+        return res
+
+    async def get(self, url: str, *, params=None, **kwargs):
+        """
+        Send a GET request, sharing the response with identical requests
+        which are already in flight, and revalidating cached responses
+
+        Shared responses are fully read, and callers must treat them as
+        read-only.
+        """
+        if kwargs:
+            # Custom headers, timeouts etc. make requests not interchangeable
+            return await self._request("GET", url, params=params, **kwargs)
+
+        key = str(URL(str(url), params=params))
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._cached_get(key))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # A caller which is cancelled must not cancel the others
+        return await asyncio.shield(future)
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: Optional[dict] = None,
+        **kwargs,
+    ) -> AsyncIterator[Response]:
+        """
+        Send a request and stream the body of the response, holding a slot
+        of the request limiter until the body is read
+
+        Streamed requests are not retried, since part of their body may have
+        been consumed already: callers resume them instead (see
+        `fractal.download`). They ask for an unencoded body by default, since
+        `Content-Length` and byte ranges refer to the encoded body while the
+        chunks are decoded.
+        """
+        headers = {"Accept-Encoding": "identity", **(headers or {})}
+        async with self.limiter(url):
+            token = await self.auth()
+            for attempt in range(2):
+                request = self.client.build_request(
+                    method,
+                    url,
+                    headers={**headers, "Authorization": f"Bearer {token}"},
+                    **kwargs,
+                )
+                res = await self.client.send(request, stream=True)
+                if res.status_code != 401 or attempt == 1:
+                    break
+                await res.aclose()
+                await self.auth.invalidate(token)
+                token = await self.auth()
+            try:
+                yield res
+            finally:
+                await res.aclose()
 
     async def post(self, *args, **kwargs):
-        return await self.client.post(
-            headers=await self.auth.header(), *args, **kwargs
-        )
+        return await self._request("POST", *args, **kwargs)
 
     async def patch(self, *args, **kwargs):
-        return await self.client.patch(
-            headers=await self.auth.header(), *args, **kwargs
-        )
+        return await self._request("PATCH", *args, **kwargs)
 
     async def delete(self, *args, **kwargs):
-        return await self.client.delete(
-            headers=await self.auth.header(), *args, **kwargs
-        )
+        return await self._request("DELETE", *args, **kwargs)
@@ -0,0 +1,93 @@
+"""
+Helpers for the files stored under `FRACTAL_CACHE_PATH`
+
+Several fractal processes (e.g. the tasks of a SLURM job array) may share the
+same cache folder, so files are always replaced atomically, and
+read-modify-write cycles are protected by advisory file locks.
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Union
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # Not available on Windows, where cache files are not locked
+    fcntl = None
+
+from .config import settings
+
+
+def get_cache_dir(*parts: str) -> Path:
+    """
+    Return (and create, if needed) a folder within the cache
+    """
+    cache_dir = Path(settings.FRACTAL_CACHE_PATH).expanduser().joinpath(*parts)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def cache_namespace(server: str, username: str) -> str:
+    """
+    Name of the cache entries which belong to a given user on a given server
+    """
+    key = f"{server.rstrip('/')}\n{username}"
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def atomic_write(path: Path, data: Union[str, bytes], mode: int = 0o600):
+    """
+    Write a file so that readers never observe partially written content
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class FileLock:
+    """
+    Exclusive advisory lock, shared among processes through a lock file
+
+    The lock is acquired by polling, so that waiting for it does not block the
+    event loop.
+    """
+
+    def __init__(self, path: Path, poll_interval: float = 0.05):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._fd = None
+
+    async def __aenter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if fcntl is None:  # pragma: no cover
+            return self
+        try:
+            while True:
+                try:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return self
+                except BlockingIOError:
+                    pass
+                await asyncio.sleep(self.poll_interval)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
@@ -17,13 +17,6 @@ import logging
 from sys import argv
 from typing import List
 
-from httpx import AsyncClient
-from httpx import ConnectError
-
-from . import cmd
-from .authclient import AuthClient
-from .authclient import AuthenticationError
-from .config import settings
 from .interface import PrintInterface
 from .parser import parser_main
 
@@ -35,29 +28,48 @@ async def handle(cli_args: List[str] = argv):
     args = parser_main.parse_args(cli_args[1:])
     logging.debug(args)
 
+    # Imported (and settings resolved) only once the command line is valid
+    from httpx import ConnectError
+
+    from . import cmd
+    from .authclient import AuthClient
+    from .authclient import AuthenticationError
+    from .authclient import get_http_options
+    from .authclient import make_async_client
+    from .config import settings
+    from .nameindex import NameResolutionError
+
     if args.cmd:
-        handler = getattr(cmd, args.cmd)
+        handler = getattr(cmd, args.cmd.replace("-", "_"))
     else:
         # no command provided. Print help and exit 1
         parser_main.print_help()
         exit(1)
 
+    http_options = get_http_options(vars(args))
     try:
-        if args.cmd in ["version", "register"]:
-            async with AsyncClient() as client:
+        if args.cmd in ["debug", "daemon"]:
+            interface = await handler(**vars(args))
+        elif args.cmd in ["version", "register"]:
+            async with make_async_client(**http_options) as client:
                 interface = await handler(client, **vars(args))
         else:
             async with AuthClient(
                 username=args.user or settings.FRACTAL_USER,
                 password=args.password or settings.FRACTAL_PASSWORD,
                 slurm_user=args.slurm_user or settings.SLURM_USER,
+                use_cache=not args.no_cache,
+                **http_options,
             ) as client:
                 interface = await handler(client, **vars(args))
     except AuthenticationError as e:
         return PrintInterface(retcode=1, data=e.args[0])
     except ConnectError as e:
         return PrintInterface(retcode=1, data=e.args[0])
+    except NameResolutionError as e:
+        return PrintInterface(retcode=1, data=f"ERROR: {e.args[0]}")
 
+    interface.output = args.output
     return interface
 
 
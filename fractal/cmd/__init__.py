@@ -7,30 +7,8 @@ from ..interface import BaseInterface
 from ..interface import PrintInterface
 from ..interface import RichJsonInterface
 from ..response import check_response
-from ._dataset import dataset_add_resource
-from ._dataset import dataset_delete_resource
-from ._dataset import dataset_edit
-from ._dataset import dataset_show
-from ._job import job_download_logs
-from ._job import job_list
-from ._job import job_status
-from ._project import project_add_dataset
-from ._project import project_create
-from ._project import project_list
-from ._project import project_show
-from ._task import task_collect_pip
-from ._task import task_collection_check
-from ._task import task_edit
-from ._task import task_list
-from ._workflow import workflow_add_task
-from ._workflow import workflow_apply
-from ._workflow import workflow_delete
-from ._workflow import workflow_edit
-from ._workflow import workflow_edit_task
-from ._workflow import workflow_list
-from ._workflow import workflow_new
-from ._workflow import workflow_remove_task
-from ._workflow import workflow_show
+from .utils import invalidate_names
+from .utils import resolve_names
 
 
 class NoCommandError(ValueError):
@@ -40,6 +18,13 @@ class NoCommandError(ValueError):
 async def project(
     client: AuthClient, subcmd: str, batch: bool = False, **kwargs
 ) -> BaseInterface:
+    from ._project import project_add_dataset
+    from ._project import project_create
+    from ._project import project_list
+    from ._project import project_show
+
+    kwargs = await resolve_names(client, kwargs)
+
     if subcmd == "new":
         iface = await project_create(client, batch=batch, **kwargs)
     elif subcmd == "show":
@@ -58,12 +43,21 @@ async def project(
     else:
         raise NoCommandError(f"Command project {subcmd} not found")
 
+    if subcmd in ["new", "add-dataset"]:
+        await invalidate_names(client, "projects", "datasets/")
     return iface
 
 
 async def dataset(
     client: AuthClient, subcmd: str, batch: bool = False, **kwargs
 ) -> BaseInterface:
+    from ._dataset import dataset_add_resource
+    from ._dataset import dataset_delete_resource
+    from ._dataset import dataset_edit
+    from ._dataset import dataset_show
+
+    kwargs = await resolve_names(client, kwargs)
+
     if subcmd == "show":
         iface = await dataset_show(client, **kwargs)
     elif subcmd == "add-resource":
@@ -98,6 +92,9 @@ async def dataset(
         )
     else:
         raise NoCommandError(f"Command dataset {subcmd} not found")
+
+    if subcmd == "edit":
+        await invalidate_names(client, "datasets/")
     return iface
 
 
@@ -140,6 +137,11 @@ async def register(
 async def task(
     client: AuthClient, subcmd: str, batch: bool = False, **kwargs
 ) -> BaseInterface:
+    from ._task import task_collect_pip
+    from ._task import task_collection_check
+    from ._task import task_edit
+    from ._task import task_list
+
     if subcmd == "list":
         iface = await task_list(client, **kwargs)
     elif subcmd == "collect":
@@ -156,6 +158,21 @@ async def task(
 async def workflow(
     client: AuthClient, subcmd: str, batch: bool = False, **kwargs
 ) -> BaseInterface:
+    from ._workflow import workflow_add_task
+    from ._workflow import workflow_apply
+    from ._workflow import workflow_delete
+    from ._workflow import workflow_edit
+    from ._workflow import workflow_edit_task
+    from ._workflow import workflow_list
+    from ._workflow import workflow_new
+    from ._workflow import workflow_remove_task
+    from ._workflow import workflow_show
+
+    # The project of `workflow edit` is the new one of the workflow
+    kwargs = await resolve_names(
+        client, kwargs, id_kind="workflow", project_scoped=subcmd != "edit"
+    )
+
     if subcmd == "show":
         iface = await workflow_show(client, **kwargs)
     elif subcmd == "new":
@@ -176,18 +193,39 @@ async def workflow(
         iface = await workflow_apply(client, **kwargs)
     else:
         raise NoCommandError(f"Command workflow {subcmd} not found")
+
+    if subcmd in ["new", "edit", "delete"]:
+        await invalidate_names(client, "workflows/")
     return iface
 
 
 async def job(
     client: AuthClient, subcmd: str, batch: bool = False, **kwargs
 ) -> BaseInterface:
+    from ._job import job_download_logs
+    from ._job import job_grep
+    from ._job import job_list
+    from ._job import job_logs
+    from ._job import job_status
+    from ._job import job_wait
+    from ._job import job_watch
+
+    kwargs = await resolve_names(client, kwargs)
+
     if subcmd == "list":
         iface = await job_list(client, batch=batch, **kwargs)
     elif subcmd == "status":
         iface = await job_status(client, batch=batch, **kwargs)
     elif subcmd == "download-logs":
-        iface = await job_download_logs(client, **kwargs)
+        iface = await job_download_logs(client, batch=batch, **kwargs)
+    elif subcmd == "logs":
+        iface = await job_logs(client, **kwargs)
+    elif subcmd == "wait":
+        iface = await job_wait(client, batch=batch, **kwargs)
+    elif subcmd == "watch":
+        iface = await job_watch(client, batch=batch, **kwargs)
+    elif subcmd == "grep":
+        iface = await job_grep(client, batch=batch, **kwargs)
     else:
         raise NoCommandError(f"Command job {subcmd} not found")
     return iface
@@ -207,3 +245,38 @@ async def version(client: AsyncClient, **kwargs) -> PrintInterface:
             f"\tversion: {data['version']}"
         ),
     )
+
+
+async def debug(subcmd: str, batch: bool = False, **kwargs) -> BaseInterface:
+    from ._debug import debug_startup
+    from ._debug import debug_task_cache
+
+    if subcmd == "startup":
+        iface = await debug_startup(batch=batch, **kwargs)
+    elif subcmd == "task-cache":
+        iface = await debug_task_cache(**kwargs)
+    else:
+        raise NoCommandError(f"Command debug {subcmd} not found")
+    return iface
+
+
+async def run_script(client: AuthClient, **kwargs) -> BaseInterface:
+    from ._script import script_run
+
+    return await script_run(client, **kwargs)
+
+
+async def daemon(subcmd: str, **kwargs) -> BaseInterface:
+    from ._daemon import daemon_start
+    from ._daemon import daemon_status
+    from ._daemon import daemon_stop
+
+    if subcmd == "start":
+        iface = await daemon_start(**kwargs)
+    elif subcmd == "status":
+        iface = await daemon_status(**kwargs)
+    elif subcmd == "stop":
+        iface = await daemon_stop(**kwargs)
+    else:
+        raise NoCommandError(f"Command daemon {subcmd} not found")
+    return iface
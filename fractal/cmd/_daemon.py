@@ -0,0 +1,59 @@
+from typing import Optional
+
+from ..authclient import AuthClient
+from ..authclient import get_http_options
+from ..config import settings
+from ..daemon import Daemon
+from ..daemon import get_socket_path
+from ..daemon import request
+from ..interface import BaseInterface
+from ..interface import PrintInterface
+from ..interface import RichJsonInterface
+
+
+async def daemon_start(
+    *,
+    user: Optional[str] = None,
+    password: Optional[str] = None,
+    slurm_user: Optional[str] = None,
+    **kwargs,
+) -> BaseInterface:
+    async with AuthClient(
+        username=user or settings.FRACTAL_USER,
+        password=password or settings.FRACTAL_PASSWORD,
+        slurm_user=slurm_user or settings.SLURM_USER,
+        **get_http_options(kwargs),
+    ) as client:
+        # Fail early, rather than on the first forwarded command, if the
+        # credentials are not valid
+        await client.auth()
+        daemon = Daemon(
+            client,
+            socket_path=get_socket_path(),
+            server=settings.FRACTAL_SERVER,
+        )
+        await daemon.serve()
+    return PrintInterface(
+        retcode=0,
+        data=f"Daemon stopped after {daemon.requests_served} requests",
+    )
+
+
+async def daemon_status(**kwargs) -> BaseInterface:
+    try:
+        status = await request("status")
+    except OSError:
+        return PrintInterface(
+            retcode=1, data=f"No daemon listening on {get_socket_path()}"
+        )
+    return RichJsonInterface(retcode=0, data=status)
+
+
+async def daemon_stop(**kwargs) -> BaseInterface:
+    try:
+        await request("stop")
+    except OSError:
+        return PrintInterface(
+            retcode=1, data=f"No daemon listening on {get_socket_path()}"
+        )
+    return PrintInterface(retcode=0, data="Daemon stopping")
@@ -2,10 +2,9 @@ import json
 import os
 from typing import Any
 from typing import Dict
+from typing import List
 from typing import Optional
 
-from rich.table import Table
-
 from ..authclient import AuthClient
 from ..common.schemas import DatasetRead
 from ..common.schemas import DatasetUpdate
@@ -17,6 +16,12 @@ from ..interface import PrintInterface
 from ..interface import RichConsoleInterface
 from ..interface import RichJsonInterface
 from ..response import check_response
+from .utils import fields_params
+from .utils import is_single_id
+from .utils import parse_id_specs
+from .utils import read_records
+from .utils import records_interface
+from .utils import resolve_name
 
 
 async def dataset_add_resource(
@@ -97,18 +102,67 @@ async def dataset_edit(
 
 
 async def dataset_show(
-    client: AuthClient, *, project_id: int, dataset_id: int, **kwargs
+    client: AuthClient,
+    *,
+    project_id: int,
+    dataset_ids: List[str],
+    from_file: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    **kwargs,
 ) -> BaseInterface:
+    if not is_single_id(dataset_ids, from_file):
+        try:
+            ids = parse_id_specs(dataset_ids, from_file)
+        except ValueError as e:
+            return PrintInterface(retcode=1, data=f"ERROR: {e}")
+        datasets = await read_records(
+            client,
+            ids,
+            lambda id: f"{settings.BASE_URL}/dataset/{project_id}/{id}",
+            kind="dataset",
+            project_id=int(project_id),
+            fields=fields,
+        )
+        columns = dict(
+            id="Id",
+            name="Name",
+            type="Type",
+            resource_list="Resources",
+            read_only="Read only",
+        )
+        if fields is not None:
+            columns = {field: columns.get(field, field) for field in fields}
+        return records_interface(
+            datasets,
+            columns,
+            title=f"Datasets of project {project_id}",
+            formatters=dict(
+                resource_list=lambda resources: str(len(resources)),
+                read_only=lambda read_only: "✅" if read_only else "❌",
+            ),
+        )
+
+    dataset_id = dataset_ids[0]
+    if not dataset_id.isdigit():
+        dataset_id = await resolve_name(
+            client, "dataset", dataset_id, project_id=int(project_id)
+        )
     res = await client.get(
-        f"{settings.BASE_URL}/dataset/{project_id}/{dataset_id}"
+        f"{settings.BASE_URL}/dataset/{project_id}/{dataset_id}",
+        params=fields_params(fields),
     )
-    from rich.console import Group
-
+    if fields is not None:
+        # Partial records are shown as they are, without the tables below
+        data = check_response(res, expected_status_code=200, fields=fields)
+        return RichJsonInterface(retcode=0, data=data)
     dataset = check_response(res, expected_status_code=200, coerce=DatasetRead)
 
     if kwargs.get("json", False):
         return RichJsonInterface(retcode=0, data=dataset.dict())
     else:
+        from rich.console import Group
+        from rich.table import Table
+
         table = Table(title="Dataset")
         table.add_column("Id", style="cyan", no_wrap=True)
         table.add_column("Name", justify="right", style="green")
@@ -0,0 +1,148 @@
+import asyncio
+import shlex
+import sys
+import time
+from collections import defaultdict
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from ..interface import BaseInterface
+from ..interface import PrintInterface
+from ..interface import RichConsoleInterface
+from ..interface import RichJsonInterface
+
+
+# Mimic the startup of the `fractal` entry point: import the client, parse the
+# command line and import the module which holds the selected handler (without
+# running it)
+STARTUP_SNIPPET = """
+import importlib
+import importlib.util
+import sys
+from fractal.client import parser_main
+args = parser_main.parse_args(sys.argv[1:])
+module = f"fractal.cmd._{args.cmd}"
+if args.cmd and importlib.util.find_spec(module):
+    importlib.import_module(module)
+"""
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """
+    Parse the output of `python -X importtime`
+
+    Returns:
+        A list of `(module, self_us, cumulative_us)` tuples.
+    """
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line.partition(":")[2].split("|")
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            # Header line (`self [us] | cumulative | imported package`)
+            continue
+        records.append((fields[2].strip(), self_us, cumulative_us))
+    return records
+
+
+async def debug_startup(
+    *,
+    command: str,
+    limit: int = 15,
+    batch: bool = False,
+    json: bool = False,
+    **kwargs,
+) -> BaseInterface:
+    """
+    Profile the imports triggered by the startup of a fractal command
+    """
+    start = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-X",
+        "importtime",
+        "-c",
+        STARTUP_SNIPPET,
+        *shlex.split(command),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await proc.communicate()
+    wall_time_ms = (time.perf_counter() - start) * 1000
+    stderr = stderr.decode()
+    if proc.returncode != 0:
+        error = "\n".join(
+            line
+            for line in stderr.splitlines()
+            if not line.startswith("import time:")
+        )
+        return PrintInterface(
+            retcode=1,
+            data=f"Could not profile startup of `{command}`:\n{error}",
+        )
+
+    records = parse_importtime(stderr)
+    package_us: Dict[str, int] = defaultdict(int)
+    for module, self_us, _ in records:
+        package_us[module.split(".")[0]] += self_us
+    import_time_ms = sum(package_us.values()) / 1000
+    breakdown = sorted(package_us.items(), key=lambda x: x[1], reverse=True)
+
+    if batch:
+        return PrintInterface(retcode=0, data=f"{import_time_ms:.1f}")
+
+    data = dict(
+        command=command,
+        wall_time_ms=round(wall_time_ms, 1),
+        import_time_ms=round(import_time_ms, 1),
+        modules_imported=len(records),
+        packages={pkg: round(us / 1000, 1) for pkg, us in breakdown[:limit]},
+    )
+    if json:
+        return RichJsonInterface(retcode=0, data=data)
+
+    from rich.table import Table
+
+    table = Table(
+        title=f"Startup of `fractal {command}`",
+        caption=(
+            f"{import_time_ms:.1f} ms importing {len(records)} modules, "
+            f"{wall_time_ms:.1f} ms wall time"
+        ),
+    )
+    table.add_column("Package", style="cyan")
+    table.add_column("Import time (ms)", justify="right")
+    table.add_column("Share", justify="right", style="green")
+    for pkg, us in breakdown[:limit]:
+        table.add_row(
+            pkg, f"{us / 1000:.1f}", f"{100 * us / 1000 / import_time_ms:.1f}%"
+        )
+    return RichConsoleInterface(retcode=0, data=table)
+
+
+async def debug_task_cache(
+    *, user: Optional[str] = None, **kwargs
+) -> BaseInterface:
+    """
+    Show the state of the task registry of the current user and server
+    """
+    from ..config import settings
+    from ..taskregistry import get_task_registry
+
+    registry = get_task_registry(user or settings.FRACTAL_USER)
+    synced = registry.synced_at > 0
+    data = dict(
+        path=str(registry.path),
+        tasks=len(registry.tasks),
+        names=len(registry.index),
+        age=round(registry.age) if synced else None,
+        ttl=settings.FRACTAL_TASK_CACHE_TTL,
+        negative_ttl=settings.FRACTAL_TASK_CACHE_NEGATIVE_TTL,
+        fresh=synced and registry.age < settings.FRACTAL_TASK_CACHE_TTL,
+    )
+    return RichJsonInterface(retcode=0, data=data)
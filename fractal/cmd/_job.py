@@ -1,92 +1,446 @@
+import asyncio
 import logging
-import os
+import random
+import re
+import shutil
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from datetime import timezone
 from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any
+from typing import Awaitable
+from typing import Dict
+from typing import List
+from typing import Optional
+from zipfile import BadZipFile
 from zipfile import ZipFile
+from zipfile import ZipInfo
 
-from rich.table import Table
+from httpx import HTTPError
 
+from ..archive import extract_members
+from ..archive import list_remote_archive
+from ..archive import select_members
 from ..authclient import AuthClient
 from ..common.schemas import ApplyWorkflowRead
 from ..config import settings
+from ..download import download
+from ..download import DownloadError
 from ..interface import BaseInterface
 from ..interface import PrintInterface
-from ..interface import RichConsoleInterface
+from ..interface import RAW_OUTPUTS
+from ..interface import RecordsInterface
 from ..interface import RichJsonInterface
+from ..interface import StreamInterface
+from ..interface import write_records
+from ..logsearch import grep_archive
+from ..logsearch import grep_text
 from ..response import check_response
+from ..response import select_fields
+from .utils import fields_params
+from .utils import is_single_id
+from .utils import list_records
+from .utils import parse_id_specs
+from .utils import read_records
+from .utils import records_interface
+from .utils import response_error
+from .utils import stream_records
+
+# Columns of the `job list` table
+JOB_COLUMNS = dict(
+    id="id",
+    start_timestamp="start_timestamp",
+    status="status",
+    workflow_id="workflow_id",
+    working_dir="working_dir",
+)
+
+# Statuses of the jobs which have not finished yet
+ACTIVE_STATUSES = ["submitted", "running"]
+
+# Fields needed to tell whether the log archive of a job can be cached
+CACHE_FIELDS = ["status", "start_timestamp"]
 
 
 async def job_status(
     client: AuthClient,
-    job_id: int,
+    job_ids: List[str],
+    from_file: Optional[str] = None,
     batch: bool = False,
     do_not_separate_logs: bool = False,
+    fields: Optional[List[str]] = None,
+    output: Optional[str] = None,
+    tail: Optional[int] = None,
     **kwargs,
 ) -> BaseInterface:
     """
-    Query the status of a workflow-execution job
+    Query the status of one or more workflow-execution jobs
     """
+    if not is_single_id(job_ids, from_file):
+        try:
+            ids = parse_id_specs(job_ids, from_file)
+        except ValueError as e:
+            return PrintInterface(retcode=1, data=f"ERROR: {e}")
+        return await _job_status_many(
+            client,
+            ids,
+            batch=batch,
+            fields=fields,
+            output=output,
+        )
 
-    res = await client.get(f"{settings.BASE_URL}/job/{job_id}")
-    job = check_response(
-        res, expected_status_code=200, coerce=ApplyWorkflowRead
-    )
+    job_id = job_ids[0]
     if batch:
-        return PrintInterface(retcode=0, data=job.status)
+        fields = ["status"]
+    res = await client.get(
+        f"{settings.BASE_URL}/job/{job_id}", params=fields_params(fields)
+    )
+    if fields is not None:
+        data = check_response(res, expected_status_code=200, fields=fields)
+        if batch:
+            return PrintInterface(retcode=0, data=data["status"])
+        log = data.get("log")
     else:
+        job = check_response(
+            res, expected_status_code=200, coerce=ApplyWorkflowRead
+        )
         data = job.sanitised_dict()
-        if do_not_separate_logs or (job.log is None):
-            return RichJsonInterface(retcode=0, data=data)
-        else:
-            log = data.pop("log")
-            extra_lines = ["\nThis is the job log:\n", log]
-            return RichJsonInterface(
-                retcode=0, data=data, extra_lines=extra_lines
-            )
+        log = job.log
+    if tail is not None and log is not None:
+        data["log"] = log = last_lines(log, tail)
+    if do_not_separate_logs or (log is None):
+        return RichJsonInterface(retcode=0, data=data)
+    else:
+        log = data.pop("log")
+        extra_lines = ["\nThis is the job log:\n", log]
+        return RichJsonInterface(retcode=0, data=data, extra_lines=extra_lines)
+
+
+async def _job_status_many(
+    client: AuthClient,
+    job_ids: List[int],
+    batch: bool = False,
+    fields: Optional[List[str]] = None,
+    output: Optional[str] = None,
+) -> BaseInterface:
+    columns = JOB_COLUMNS
+    if batch:
+        fields = ["status"]
+    elif fields is not None:
+        columns = {field: JOB_COLUMNS.get(field, field) for field in fields}
+    elif output not in RAW_OUTPUTS:
+        fields = list(JOB_COLUMNS)
+    jobs = await read_records(
+        client,
+        job_ids,
+        lambda job_id: f"{settings.BASE_URL}/job/{job_id}",
+        fields=fields,
+    )
+    if batch:
+        return PrintInterface(
+            retcode=int(any("error" in job for job in jobs)),
+            data="\n".join(
+                f"{job['id']} {job.get('status', 'error')}" for job in jobs
+            ),
+        )
+    return records_interface(
+        jobs,
+        columns,
+        title="Jobs",
+        formatters=dict(start_timestamp=lambda t: t[:19].replace("T", " ")),
+    )
 
 
 async def job_list(
     client: AuthClient,
     project_id: int,
     batch: bool = False,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    page_size: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+    output: Optional[str] = None,
     **kwargs,
 ) -> BaseInterface:
-
-    res = await client.get(f"{settings.BASE_URL}/project/{project_id}/jobs/")
-    jobs = check_response(res, expected_status_code=200)
-
-    # Coerce to a list of ApplyWorkflowRead objects
-    jobs = [ApplyWorkflowRead(**job) for job in jobs]
+    columns = JOB_COLUMNS
+    if batch:
+        fields = ["id"]
+    elif fields is not None:
+        columns = {field: JOB_COLUMNS.get(field, field) for field in fields}
+    elif output not in RAW_OUTPUTS:
+        # The table never shows wide fields, such as the job log
+        fields = list(JOB_COLUMNS)
+    pages = dict(
+        limit=limit, offset=offset, page_size=page_size, fields=fields
+    )
+    url = f"{settings.BASE_URL}/project/{project_id}/jobs/"
+    if output in RAW_OUTPUTS and not batch:
+        return await stream_records(client, url, output, **pages)
+    jobs = await list_records(client, url, **pages)
 
     if batch:
-        job_ids = " ".join(str(job.id) for job in jobs)
+        job_ids = " ".join(str(job["id"]) for job in jobs)
         return PrintInterface(retcode=0, data=job_ids)
     else:
-        table = Table(title=f"Job list for project {project_id}")
-        kwargs = dict(style="white", justify="center")
-        table.add_column("id", **kwargs)
-        table.add_column("start_timestamp", **kwargs)
-        table.add_column("status", **kwargs)
-        table.add_column("workflow_id", **kwargs)
-        table.add_column("working_dir", **kwargs)
-
-        for j in jobs:
-            timestamp = j.dict()["start_timestamp"]
-            table.add_row(
-                str(j.id),
-                timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-                j.status,
-                str(j.workflow_id),
-                j.working_dir,
-            )
-        return RichConsoleInterface(retcode=0, data=table)
+        return RecordsInterface(
+            retcode=0,
+            data=jobs,
+            columns=columns,
+            title=f"Job list for project {project_id}",
+            formatters=dict(
+                # e.g. `2023-03-01T10:20:30.123456` to `2023-03-01 10:20:30`
+                start_timestamp=lambda t: t[:19].replace("T", " "),
+            ),
+        )
 
 
-async def job_download_logs(
+@contextmanager
+def _download_progress():
+    """
+    Progress bars of downloads on stderr, if it is a terminal
+
+    Yields:
+        A `rich` progress display, shared by concurrent downloads, or `None`.
+    """
+    from rich.console import Console
+
+    console = Console(stderr=True)
+    if not console.is_terminal:
+        yield None
+        return
+
+    from rich.progress import BarColumn
+    from rich.progress import DownloadColumn
+    from rich.progress import Progress
+    from rich.progress import TextColumn
+    from rich.progress import TransferSpeedColumn
+
+    with Progress(
+        TextColumn("{task.description}"),
+        BarColumn(),
+        DownloadColumn(),
+        TransferSpeedColumn(),
+        console=console,
+        transient=True,
+    ) as progress:
+        yield progress
+
+
+async def _download_archive(
+    client: AuthClient, job_id: int, path: Path, progress=None
+):
+    """
+    Download the log archive of a job, with a progress bar if `progress` is
+    set (see `_download_progress`)
+
+    An interrupted download is resumed by downloading to the same path again.
+    """
+    url = f"{settings.BASE_URL}/job/download/{job_id}"
+    content_type = "application/x-zip-compressed"
+    if progress is None:
+        await download(client, url, path, expected_content_type=content_type)
+        return
+
+    task = progress.add_task(f"Job {job_id}", total=None)
+
+    def on_progress(done: int, total: Optional[int]):
+        progress.update(task, completed=done, total=total)
+
+    try:
+        await download(
+            client,
+            url,
+            path,
+            expected_content_type=content_type,
+            on_progress=on_progress,
+        )
+    finally:
+        progress.remove_task(task)
+
+
+async def _get_archive(
+    client: AuthClient,
+    job_id: int,
+    path: Path,
+    progress=None,
+    job: Optional[Dict[str, Any]] = None,
+) -> bool:
+    """
+    Fetch the log archive of a job to `path`, from the archive cache if
+    possible
+
+    Arguments:
+        job: The `status` and `start_timestamp` of the job, if known (they
+            are only requested to the server when the archive is not cached).
+
+    Returns:
+        Whether the archive was found in the cache.
+    """
+    cache = client.archive_cache
+    if cache is None:
+        await _download_archive(client, job_id, path, progress)
+        return False
+    if cache.export(job_id, path, job and job["start_timestamp"]):
+        return True
+
+    # The archive is only final if the job had already finished when its
+    # download started
+    if job is None:
+        res = await client.get(
+            f"{settings.BASE_URL}/job/{job_id}",
+            params=fields_params(CACHE_FIELDS),
+        )
+        job = check_response(
+            res, expected_status_code=200, fields=CACHE_FIELDS
+        )
+    await _download_archive(client, job_id, path, progress)
+    if job["status"] not in ACTIVE_STATUSES:
+        await asyncio.get_running_loop().run_in_executor(
+            None, cache.store, job_id, path, job["start_timestamp"]
+        )
+    return False
+
+
+async def _fetch_logs(
     client: AuthClient,
     job_id: int,
-    output_folder: str,
+    folder: Path,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    progress=None,
+    job: Optional[Dict[str, Any]] = None,
+) -> bool:
+    """
+    Fetch the log archive of a job (see `_get_archive`), and extract (some
+    of) its members to `folder`
+
+    Members are extracted to a temporary folder, which is renamed to `folder`
+    once complete, so that `folder` only exists if all its files do.
+
+    Returns:
+        Whether the archive was found in the cache.
+
+    Raises:
+        DownloadError: If the archive cannot be downloaded.
+        BadZipFile: If the archive is corrupted.
+    """
+    # An interrupted download is resumed by the next call
+    archive = folder.with_name(f"{folder.name}_tmp.zip")
+    cached = await _get_archive(client, job_id, archive, progress, job)
+
+    partial = folder.with_name(f"{folder.name}.tmp")
+    shutil.rmtree(partial, ignore_errors=True)
+    partial.mkdir()
+    try:
+        # The CRC of the members is checked while extracting them
+        with ZipFile(archive) as zipfile:
+            members = select_members(zipfile.infolist(), include, exclude)
+        await asyncio.get_running_loop().run_in_executor(
+            None, extract_members, archive, members, partial
+        )
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    finally:
+        archive.unlink(missing_ok=True)
+    partial.rename(folder)
+    return cached
+
+
+async def _list_archive(client: AuthClient, job_id: int) -> List[ZipInfo]:
+    """
+    Members of the log archive of a job, from the archive cache or without
+    downloading all of it if the server supports range requests
+    """
+    cache = client.archive_cache
+    path = cache and cache.load(job_id)
+    if path:
+        try:
+            with ZipFile(path) as zipfile:
+                return zipfile.infolist()
+        except FileNotFoundError:
+            # Evicted by a concurrent process
+            pass
+
+    members = await list_remote_archive(
+        client, f"{settings.BASE_URL}/job/download/{job_id}"
+    )
+    if members is None:
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / "archive.zip"
+            await _download_archive(client, job_id, path)
+            with ZipFile(path) as zipfile:
+                members = zipfile.infolist()
+    return members
+
+
+async def job_download_logs(
+    client: AuthClient,
+    job_id: Optional[int] = None,
+    output_folder: Optional[str] = None,
+    project_id: Optional[int] = None,
+    status: Optional[List[str]] = None,
+    batch: bool = False,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    list_only: bool = False,
     **kwargs,
 ) -> BaseInterface:
+    if (job_id is None) == (project_id is None):
+        return PrintInterface(
+            retcode=1, data="ERROR: give either a job ID or --project"
+        )
+    if project_id is None and status:
+        return PrintInterface(
+            retcode=1, data="ERROR: --status requires --project"
+        )
+    if list_only:
+        if job_id is None:
+            return PrintInterface(
+                retcode=1, data="ERROR: --list requires a job ID"
+            )
+        try:
+            members = await _list_archive(client, job_id)
+        except DownloadError as e:
+            logging.error(e.args[0])
+            return PrintInterface(retcode=1, data="ERROR: download failed")
+        return RecordsInterface(
+            retcode=0,
+            data=[
+                dict(
+                    name=member.filename,
+                    size=member.file_size,
+                    compressed_size=member.compress_size,
+                    modified=datetime(*member.date_time).isoformat(),
+                )
+                for member in select_members(members, include, exclude)
+            ],
+            columns=dict(
+                name="Name",
+                size="Size",
+                compressed_size="Compressed",
+                modified="Modified",
+            ),
+            title=f"Log archive of job {job_id}",
+        )
+
+    if output_folder is None:
+        return PrintInterface(retcode=1, data="ERROR: --output is required")
+    if project_id is not None:
+        return await _download_project_logs(
+            client,
+            project_id,
+            Path(output_folder),
+            statuses=status,
+            include=include,
+            exclude=exclude,
+            batch=batch,
+        )
 
     # Check that output_folder does not already exist
     if Path(output_folder).exists():
@@ -94,53 +448,596 @@ async def job_download_logs(
             retcode=1, data=f"ERROR: {output_folder=} already exists"
         )
 
-    # Send request to server
-    res = await client.get(f"{settings.BASE_URL}/job/download/{job_id}")
+    try:
+        with _download_progress() as progress:
+            await _fetch_logs(
+                client,
+                job_id,
+                Path(output_folder),
+                include=include,
+                exclude=exclude,
+                progress=progress,
+            )
+    except DownloadError as e:
+        logging.error(e.args[0])
+        return PrintInterface(retcode=1, data="ERROR: download failed")
+    except BadZipFile as e:
+        return PrintInterface(
+            retcode=1, data=f"ERROR: the downloaded archive is corrupted ({e})"
+        )
+
+    return PrintInterface(
+        retcode=0, data=f"Logs downloaded to {output_folder=}"
+    )
+
+
+async def _download_project_logs(
+    client: AuthClient,
+    project_id: int,
+    output_folder: Path,
+    statuses: Optional[List[str]] = None,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    batch: bool = False,
+) -> BaseInterface:
+    """
+    Download the logs of the jobs of a project (optionally, only those with
+    given statuses) concurrently, each to its own `job_<id>` subfolder
+
+    Subfolders which exist already are complete (see `_fetch_logs`), and the
+    corresponding jobs are skipped. The logs of jobs which are still active
+    may grow, so they go to a `job_<id>.active` subfolder instead, which is
+    replaced on each call and removed once the job has finished.
+    """
+    jobs = await list_records(
+        client,
+        f"{settings.BASE_URL}/project/{project_id}/jobs/",
+        fields=["id", *CACHE_FIELDS],
+    )
+    if statuses:
+        jobs = [job for job in jobs if job["status"] in statuses]
+    output_folder.mkdir(parents=True, exist_ok=True)
+    semaphore = asyncio.Semaphore(settings.FRACTAL_MAX_CONCURRENT_DOWNLOADS)
+
+    async def _fetch(job: Dict[str, Any], progress) -> Dict[str, Any]:
+        folder = output_folder / f"job_{job['id']}"
+        snapshot = folder.with_name(f"{folder.name}.active")
+        if job["status"] in ACTIVE_STATUSES:
+            folder = snapshot
+        elif folder.exists():
+            return dict(job, result="skipped", folder=str(folder))
+        async with semaphore:
+            shutil.rmtree(folder, ignore_errors=True)
+            try:
+                cached = await _fetch_logs(
+                    client, job["id"], folder, include, exclude, progress, job
+                )
+            except DownloadError as e:
+                return dict(job, result="failed", error=e.args[0])
+            except BadZipFile as e:
+                return dict(job, result="failed", error=f"corrupted ({e})")
+        if folder != snapshot:
+            shutil.rmtree(snapshot, ignore_errors=True)
+        result = "cached" if cached else "downloaded"
+        return dict(job, result=result, folder=str(folder))
 
-    # NOTE: We cannot use our default check_response here, because res._content
-    # is binary. Therefore we check the status code by hand
-    if res.status_code != 200:
-        logging.error(f"Server returned {res.status_code}")
-        logging.error(
-            f"Original request: {res._request.method} {res._request.url}"
+    with _download_progress() as progress:
+        results = await asyncio.gather(
+            *(_fetch(job, progress) for job in jobs)
         )
-        logging.error(
-            f"Original payload: {res._request._content.decode('utf-8')}"
+
+    retcode = int(any(r["result"] == "failed" for r in results))
+    if batch:
+        return PrintInterface(
+            retcode=retcode,
+            data="\n".join(f"{r['id']} {r['result']}" for r in results),
         )
-        logging.error("Terminating.\n")
-        exit(1)
+    counts = Counter(r["result"] for r in results)
+    return records_interface(
+        results,
+        dict(id="Job", status="Status", result="Result", folder="Folder"),
+        title=(
+            f"Logs of {len(results)} jobs of project {project_id}: "
+            + ", ".join(f"{n} {result}" for result, n in counts.items())
+        ),
+    )
+
 
-    # Check the content-type entry in the response headers
-    content_type = res.headers["content-type"]
-    expected_content_type = "application/x-zip-compressed"
-    if content_type != expected_content_type:
-        logging.error(
-            f"Unexpected {content_type=} in headers of server "
-            f"response, instead of {expected_content_type=}"
+def last_lines(text: str, n: int) -> str:
+    """
+    The last `n` lines of a text, without splitting all of it
+    """
+    if n <= 0:
+        return ""
+    return "\n".join(text.rstrip("\n").rsplit("\n", n)[-n:])
+
+
+# Fields needed to track the progress of a job
+WATCH_FIELDS = ["id", "status", "start_timestamp", "workflow_id"]
+
+
+def _job_age(start_timestamp: Optional[str]) -> float:
+    """
+    Seconds since a job was submitted, or zero if unknown
+    """
+    if not start_timestamp:
+        return 0.0
+    start = datetime.fromisoformat(start_timestamp)
+    if start.tzinfo is None:
+        # The server stores timestamps in UTC
+        start = start.replace(tzinfo=timezone.utc)
+    return max((datetime.now(timezone.utc) - start).total_seconds(), 0.0)
+
+
+def poll_interval(start_timestamp: Optional[str]) -> float:
+    """
+    Seconds to wait before polling again a job submitted at `start_timestamp`
+
+    Jobs are polled often right after submission, and less and less often
+    as they keep running (see `FRACTAL_POLL_*`). Some jitter prevents jobs
+    submitted together from being polled in lockstep.
+    """
+    interval = _job_age(start_timestamp) * settings.FRACTAL_POLL_BACKOFF
+    interval = min(
+        max(interval, settings.FRACTAL_POLL_MIN_INTERVAL),
+        settings.FRACTAL_POLL_MAX_INTERVAL,
+    )
+    return interval * random.uniform(0.9, 1.1)
+
+
+async def _complete(request: Awaitable) -> Any:
+    """
+    Await a request, completing it even if the caller is cancelled
+
+    The result is then dropped and the cancellation goes on, but the request
+    is no longer in flight when the client is closed (which httpcore reports
+    as an error).
+    """
+    task = asyncio.ensure_future(request)
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        await asyncio.gather(task, return_exceptions=True)
+        raise
+
+
+async def _poll_job(client: AuthClient, job_id: int, jobs: Dict[int, dict]):
+    """
+    Poll a job until it finishes, storing its latest state in `jobs`
+
+    A job which cannot be read (e.g. an unknown ID) is stored with an `error`
+    status, without affecting the other pollers.
+    """
+    while True:
+        try:
+            res = await _complete(
+                client.get(
+                    f"{settings.BASE_URL}/job/{job_id}",
+                    params=fields_params(WATCH_FIELDS),
+                )
+            )
+        except HTTPError as e:
+            error = f"{type(e).__name__}: {e}"
+        else:
+            error = None if res.status_code == 200 else response_error(res)
+        if error is not None:
+            jobs[job_id] = dict(id=job_id, status="error", error=error)
+            return
+        job = select_fields(res.json(), WATCH_FIELDS)
+        jobs[job_id] = job
+        if job["status"] not in ACTIVE_STATUSES:
+            return
+        await asyncio.sleep(poll_interval(job["start_timestamp"]))
+
+
+async def _poll_project(
+    client: AuthClient, project_id: int, jobs: Dict[int, dict]
+):
+    """
+    Poll the jobs of a project until they all finish, storing their latest
+    state in `jobs`
+
+    Jobs which had already finished on the first poll are ignored, while
+    jobs submitted in the meantime are tracked as well.
+    """
+    url = f"{settings.BASE_URL}/project/{project_id}/jobs/"
+    ignored = None
+    while True:
+        records = await _complete(
+            list_records(client, url, fields=WATCH_FIELDS)
         )
-        logging.error(
-            f"Original request: {res._request.method} {res._request.url}"
+        if ignored is None:
+            ignored = {
+                job["id"]
+                for job in records
+                if job["status"] not in ACTIVE_STATUSES
+            }
+        for job in records:
+            if job["id"] not in ignored:
+                jobs[job["id"]] = job
+        active = [
+            job for job in jobs.values() if job["status"] in ACTIVE_STATUSES
+        ]
+        if not active:
+            return
+        # The youngest job sets the pace
+        await asyncio.sleep(
+            min(poll_interval(job["start_timestamp"]) for job in active)
+        )
+
+
+def _jobs_table(jobs: Dict[int, dict], title: str):
+    from rich.table import Table
+
+    status_style = dict(
+        submitted="yellow",
+        running="cyan",
+        done="green",
+        failed="red",
+        error="red",
+    )
+    table = Table(title=title)
+    table.add_column("Id", justify="right", style="cyan")
+    table.add_column("Workflow", justify="right")
+    table.add_column("Status", justify="center")
+    table.add_column("Elapsed (s)", justify="right")
+    for job in sorted(jobs.values(), key=lambda job: job["id"]):
+        status = job["status"]
+        elapsed = (
+            f"{_job_age(job['start_timestamp']):.0f}"
+            if status in ACTIVE_STATUSES
+            else ""
         )
-        logging.error(
-            f"Original payload: {res._request._content.decode('utf-8')}"
+        table.add_row(
+            str(job["id"]),
+            str(job.get("workflow_id", "")),
+            f"[{status_style.get(status, 'white')}]{status}",
+            elapsed,
         )
-        logging.error("Terminating.\n")
-        exit(1)
+    return table
 
-    # Write response into a temporary zipped file
-    zipped_archive_path = output_folder + "_tmp.zip"
-    with open(zipped_archive_path, "wb") as f:
-        f.write(res.content)
 
-    # Unzip the log archive
-    unzipped_archived_path = output_folder
-    os.mkdir(unzipped_archived_path)
-    with ZipFile(zipped_archive_path, mode="r") as zipfile:
-        zipfile.extractall(path=unzipped_archived_path)
+async def _track_jobs(
+    pollers: List[Awaitable],
+    jobs: Dict[int, dict],
+    *,
+    title: str,
+    timeout: Optional[float] = None,
+    batch: bool = False,
+) -> BaseInterface:
+    """
+    Run job pollers concurrently, with a live table of their progress on
+    the terminal
+
+    The return code is 0 if all jobs are done, 1 if any failed, 2 if some
+    were still running after `timeout` seconds, and 3 if some could not be
+    read.
+    """
+    live = None
+    if not batch:
+        from rich.console import Console
+
+        console = Console(stderr=True)
+        if console.is_terminal:
+            from rich.live import Live
+
+            live = Live(
+                _jobs_table(jobs, title), console=console, transient=True
+            )
+            live.start()
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    pending = {asyncio.ensure_future(poller) for poller in pollers}
+    try:
+        while pending:
+            wait = 0.25 if live else None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                wait = remaining if wait is None else min(wait, remaining)
+            done, pending = await asyncio.wait(pending, timeout=wait)
+            for task in done:
+                # Propagate errors
+                task.result()
+            if live:
+                live.update(_jobs_table(jobs, title))
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if live:
+            live.stop()
+
+    statuses = [job["status"] for job in jobs.values()]
+    if "error" in statuses:
+        retcode = 3
+    elif pending or any(status in ACTIVE_STATUSES for status in statuses):
+        retcode = 2
+    elif "failed" in statuses:
+        retcode = 1
+    else:
+        retcode = 0
+
+    if batch:
+        return PrintInterface(
+            retcode=retcode,
+            data="\n".join(
+                f"{job_id} {jobs[job_id]['status']}" for job_id in sorted(jobs)
+            ),
+        )
+    columns = dict(
+        id="Id",
+        workflow_id="Workflow",
+        status="Status",
+        start_timestamp="Submitted",
+    )
+    if "error" in statuses:
+        columns["error"] = "Error"
+    return RecordsInterface(
+        retcode=retcode,
+        data=[jobs[job_id] for job_id in sorted(jobs)],
+        columns=columns,
+        title=title,
+        formatters=dict(start_timestamp=lambda t: t[:19].replace("T", " ")),
+    )
+
+
+async def job_wait(
+    client: AuthClient,
+    job_ids: List[int],
+    timeout: Optional[float] = None,
+    batch: bool = False,
+    **kwargs,
+) -> BaseInterface:
+    """
+    Wait for some jobs to finish
+    """
+    jobs: Dict[int, dict] = {}
+    return await _track_jobs(
+        [_poll_job(client, job_id, jobs) for job_id in dict.fromkeys(job_ids)],
+        jobs,
+        title="Jobs",
+        timeout=timeout,
+        batch=batch,
+    )
 
-    # Remove zipped temporary file
-    os.unlink(zipped_archive_path)
 
+async def job_watch(
+    client: AuthClient,
+    project_id: int,
+    timeout: Optional[float] = None,
+    batch: bool = False,
+    **kwargs,
+) -> BaseInterface:
+    """
+    Wait for all the running jobs of a project to finish
+    """
+    jobs: Dict[int, dict] = {}
+    return await _track_jobs(
+        [_poll_project(client, project_id, jobs)],
+        jobs,
+        title=f"Jobs of project {project_id}",
+        timeout=timeout,
+        batch=batch,
+    )
+
+
+class LogTail:
+    """
+    Position within a job log which keeps growing, remembering only the
+    last characters already read rather than the whole log
+    """
+
+    # Characters compared to check that a full log extends the part which was
+    # already read
+    ANCHOR_SIZE = 256
+
+    def __init__(self):
+        self.offset = 0
+        self.anchor = ""
+        self.rewritten = False
+
+    def update(self, log: str, offset: Optional[int] = None) -> str:
+        """
+        Return the new part of the log
+
+        Arguments:
+            log: The log starting from `offset`, if the server supports
+                partial reads, or the full log otherwise.
+        """
+        self.rewritten = False
+        if offset is None:
+            end = self.offset
+            start = end - len(self.anchor)
+            if log[start:end] == self.anchor:
+                log = log[end:]
+            else:
+                # The log was truncated or rewritten, start over
+                self.rewritten = end > 0
+                self.offset = 0
+                self.anchor = ""
+        self.offset += len(log)
+        anchor_size = self.ANCHOR_SIZE
+        self.anchor = (self.anchor + log)[-anchor_size:]
+        return log
+
+
+async def _read_log(client: AuthClient, job_id: int, tail: LogTail):
+    """
+    Fetch the status of a job and the part of its log following `tail`
+
+    The server is asked for the log from `tail.offset` onwards (through the
+    `log_offset` query parameter); servers which ignore it send the whole
+    log, and the new part is found by comparison with the part already read.
+    """
+    params = dict(
+        fields_params(["status", "start_timestamp", "log"]),
+        log_offset=tail.offset,
+    )
+    res = await client.get(f"{settings.BASE_URL}/job/{job_id}", params=params)
+    job = check_response(res, expected_status_code=200)
+    new = tail.update(job.get("log") or "", job.get("log_offset"))
+    return job, new
+
+
+async def job_logs(
+    client: AuthClient,
+    job_id: int,
+    follow: bool = False,
+    tail: Optional[int] = None,
+    **kwargs,
+) -> BaseInterface:
+    """
+    Show the log of a job, and optionally keep showing what is appended to
+    it until the job finishes
+    """
+    log_tail = LogTail()
+    job, log = await _read_log(client, job_id, log_tail)
+    if tail is not None:
+        log = last_lines(log, tail) + ("\n" if log.endswith("\n") else "")
+    if not follow:
+        return PrintInterface(retcode=0, data=log.rstrip("\n"))
+
+    write = sys.stdout.write
+    while True:
+        if log_tail.rewritten:
+            logging.warning(f"The log of job {job_id} was rewritten")
+        write(log)
+        sys.stdout.flush()
+        if job["status"] not in ACTIVE_STATUSES:
+            break
+        await asyncio.sleep(poll_interval(job["start_timestamp"]))
+        job, log = await _read_log(client, job_id, log_tail)
+
+    status = job["status"]
     return PrintInterface(
-        retcode=0, data=f"Logs downloaded to {output_folder=}"
+        retcode=0 if status == "done" else 1,
+        data=f"Job {job_id} finished with status {status}",
+    )
+
+
+async def job_grep(
+    client: AuthClient,
+    pattern: str,
+    project_id: int,
+    status: Optional[List[str]] = None,
+    archives: bool = False,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    ignore_case: bool = False,
+    batch: bool = False,
+    output: Optional[str] = None,
+    **kwargs,
+) -> BaseInterface:
+    """
+    Search a regular expression in the logs (and optionally in the log
+    archives) of the jobs of a project
+
+    Logs are fetched concurrently and searched on `FRACTAL_SEARCH_WORKERS`
+    processes, and matches are written as soon as they are found (except
+    with `--output json` or `csv`, which need all of them). As with `grep`,
+    the exit status is 0 if any line matched, 1 if none did and 2 if some
+    logs could not be searched.
+    """
+    flags = re.IGNORECASE if ignore_case else 0
+    try:
+        re.compile(pattern, flags)
+    except re.error as e:
+        return PrintInterface(
+            retcode=2, data=f"ERROR: invalid {pattern=} ({e})"
+        )
+
+    jobs = await list_records(
+        client,
+        f"{settings.BASE_URL}/project/{project_id}/jobs/",
+        fields=["id", *CACHE_FIELDS],
     )
+    if status:
+        jobs = [job for job in jobs if job["status"] in status]
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(settings.FRACTAL_MAX_CONCURRENT_REQUESTS)
+    workers = max(1, min(settings.FRACTAL_SEARCH_WORKERS, len(jobs)))
+    errors = 0
+
+    async def _search_log(pool, job: Dict[str, Any]):
+        nonlocal errors
+        async with semaphore:
+            try:
+                res = await client.get(
+                    f"{settings.BASE_URL}/job/{job['id']}",
+                    params=fields_params(["log"]),
+                )
+            except HTTPError as e:
+                error = f"{type(e).__name__}: {e}"
+            else:
+                error = None if res.status_code == 200 else response_error(res)
+        if error is not None:
+            logging.error(
+                f"Could not search the log of job {job['id']}: {error}"
+            )
+            errors += 1
+            return []
+        log = select_fields(res.json(), ["log"])["log"]
+        matches = await loop.run_in_executor(
+            pool, grep_text, log or "", pattern, flags
+        )
+        return [(job["id"], "log", lineno, line) for lineno, line in matches]
+
+    async def _search_archive(pool, job: Dict[str, Any], tmp: Path):
+        nonlocal errors
+        path = tmp / f"job_{job['id']}.zip"
+        try:
+            await _get_archive(client, job["id"], path, job=job)
+            matches = await loop.run_in_executor(
+                pool, grep_archive, path, pattern, flags, include, exclude
+            )
+        except (DownloadError, BadZipFile) as e:
+            logging.error(
+                f"Could not search the archive of job {job['id']}: {e}"
+            )
+            errors += 1
+            return []
+        finally:
+            path.unlink(missing_ok=True)
+        return [(job["id"], *match) for match in matches]
+
+    stream = output not in ("json", "csv")
+    records = []
+    matched_jobs = set()
+    write = sys.stdout.write
+    with TemporaryDirectory() as tmp:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            searches = [_search_log(pool, job) for job in jobs]
+            if archives:
+                searches += [
+                    _search_archive(pool, job, Path(tmp)) for job in jobs
+                ]
+            for search in asyncio.as_completed(searches):
+                for job_id, filename, lineno, line in await search:
+                    matched_jobs.add(job_id)
+                    record = dict(
+                        job_id=job_id, file=filename, line=lineno, text=line
+                    )
+                    if not stream:
+                        records.append(record)
+                    elif output == "ndjson":
+                        write_records([record], output)
+                    else:
+                        write(f"{job_id}:{filename}:{lineno}:{line}\n")
+                sys.stdout.flush()
+
+    retcode = 2 if errors else 0 if matched_jobs else 1
+    summary = dict(jobs=len(jobs), matched_jobs=len(matched_jobs))
+    if not stream:
+        return RecordsInterface(
+            retcode=retcode,
+            data=records,
+            columns=dict(job_id="Job", file="File", line="Line", text="Text"),
+        )
+    if not batch and output is None:
+        sys.stderr.write(
+            f"Pattern found in {len(matched_jobs)} of {len(jobs)} jobs\n"
+        )
+    return StreamInterface(retcode=retcode, data=summary)
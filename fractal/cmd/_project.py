@@ -1,9 +1,8 @@
 import json
 import logging
+from typing import List
 from typing import Optional
 
-from rich.table import Table
-
 from ..authclient import AuthClient
 from ..common.schemas import DatasetCreate
 from ..common.schemas import DatasetRead
@@ -12,9 +11,22 @@ from ..common.schemas import ProjectRead
 from ..config import settings
 from ..interface import BaseInterface
 from ..interface import PrintInterface
-from ..interface import RichConsoleInterface
+from ..interface import RAW_OUTPUTS
+from ..interface import RecordsInterface
 from ..interface import RichJsonInterface
 from ..response import check_response
+from .utils import fields_params
+from .utils import list_records
+from .utils import stream_records
+
+# Columns of the `project list` table
+PROJECT_COLUMNS = dict(
+    id="Id",
+    name="Name",
+    project_dir="Proj. Dir.",
+    dataset_list="Dataset list",
+    read_only="Read only",
+)
 
 
 async def project_create(
@@ -47,47 +59,53 @@ async def project_create(
         return RichJsonInterface(retcode=0, data=project.dict())
 
 
-async def project_list(client: AuthClient, **kwargs) -> RichConsoleInterface:
-
-    res = await client.get(f"{settings.BASE_URL}/project/")
-    res = check_response(res, expected_status_code=200)
-
-    projects = [ProjectRead(**item) for item in res]
-
-    table = Table(title="Project List")
-    table.add_column("Id", style="cyan", no_wrap=True)
-    table.add_column("Name", style="magenta")
-    table.add_column("Proj. Dir.", justify="right", style="green")
-    table.add_column("Dataset list", style="white")
-    table.add_column("Read only", justify="center")
-
-    for p in projects:
-        # Map p.read_only (True/False) to read_only_icon (✅/❌)
-        if p.read_only:
-            read_only_icon = "✅"
-        else:
-            read_only_icon = "❌"
-
-        p_dataset_list = str([dataset.name for dataset in p.dataset_list])
-
-        table.add_row(
-            str(p.id),
-            p.name,
-            p.project_dir,
-            str(p_dataset_list),
-            read_only_icon,
-        )
-
-    return RichConsoleInterface(retcode=0, data=table)
+async def project_list(
+    client: AuthClient,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    page_size: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+    output: Optional[str] = None,
+    **kwargs,
+) -> BaseInterface:
+    columns = PROJECT_COLUMNS
+    if fields is not None:
+        columns = {
+            field: PROJECT_COLUMNS.get(field, field) for field in fields
+        }
+    elif output not in RAW_OUTPUTS:
+        fields = list(PROJECT_COLUMNS)
+    pages = dict(
+        limit=limit, offset=offset, page_size=page_size, fields=fields
+    )
+    url = f"{settings.BASE_URL}/project/"
+    if output in RAW_OUTPUTS:
+        return await stream_records(client, url, output, **pages)
+    projects = await list_records(client, url, **pages)
+
+    return RecordsInterface(
+        retcode=0,
+        data=projects,
+        columns=columns,
+        title="Project List",
+        formatters=dict(
+            dataset_list=lambda datasets: str([d["name"] for d in datasets]),
+            read_only=lambda read_only: "✅" if read_only else "❌",
+        ),
+    )
 
 
 async def project_show(
-    client: AuthClient, project_id: int, **kwargs
+    client: AuthClient,
+    project_id: int,
+    fields: Optional[List[str]] = None,
+    **kwargs,
 ) -> RichJsonInterface:
     res = await client.get(
         f"{settings.BASE_URL}/project/{project_id}",
+        params=fields_params(fields),
     )
-    project = check_response(res, expected_status_code=200)
+    project = check_response(res, expected_status_code=200, fields=fields)
     return RichJsonInterface(retcode=0, data=project)
 
 
@@ -0,0 +1,341 @@
+import argparse as ap
+import asyncio
+import logging
+import re
+import shlex
+import time
+from pathlib import Path
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from ..authclient import AuthClient
+from ..interface import BaseInterface
+from ..interface import PrintInterface
+from ..interface import RichConsoleInterface
+from ..interface import RichJsonInterface
+from ..parser import parser_main
+
+
+# `${label}` is replaced by the output of the line labelled `label`, and
+# `${label[i]}` by its i-th whitespace-separated field
+PLACEHOLDER = re.compile(r"\$\{(?P<label>\w+)(?:\[(?P<index>\d+)\])?\}")
+LABEL = re.compile(r"^(?P<label>[A-Za-z_]\w*)\s*=\s*(?P<command>.+)$")
+
+# Commands that cannot be used within a script
+NOT_SCRIPTABLE = ["daemon", "debug", "register", "run-script", "version"]
+
+# Destinations of the arguments which identify objects, by ID or name
+OBJECT_ARGUMENT = re.compile(r"(^|_)(id|ids|name)$")
+
+
+def _subparsers_action(parser: ap.ArgumentParser):
+    for action in parser._actions:
+        if isinstance(action, ap._SubParsersAction):
+            return action
+    return None
+
+
+def object_arguments(tokens: List[str]) -> List[str]:
+    """
+    Values of the arguments of a (valid) command which identify objects,
+    i.e. the IDs and names it refers to, but not e.g. paths or flags
+    """
+    parser = parser_main
+    options = dict(parser._option_string_actions)
+    positionals: List[str] = []
+    values: List[str] = []
+    tokens = list(tokens)
+    while tokens:
+        token = tokens.pop(0)
+        if token.startswith("-"):
+            option, equals, value = token.partition("=")
+            action = options.get(option)
+            if action is None or action.nargs == 0:
+                continue
+            if equals:
+                args = [value]
+            else:
+                count = 0
+                while count < len(tokens) and not tokens[count].startswith(
+                    "-"
+                ):
+                    count += 1
+                if action.nargs in (None, "?"):
+                    count = min(count, 1)
+                args, tokens = tokens[:count], tokens[count:]
+            if OBJECT_ARGUMENT.search(action.dest):
+                values.extend(args)
+            continue
+        subparsers = _subparsers_action(parser)
+        if subparsers is not None and not positionals:
+            # A (sub)command
+            parser = subparsers._name_parser_map[token]
+            options.update(parser._option_string_actions)
+            continue
+        positionals.append(token)
+
+    actions = [
+        action
+        for action in parser._actions
+        if not action.option_strings
+        and not isinstance(action, ap._SubParsersAction)
+    ]
+    for i, action in enumerate(actions):
+        if action.nargs in ("*", "+"):
+            # Leave one token to each of the next positional arguments
+            count = max(len(positionals) - (len(actions) - i - 1), 0)
+        else:
+            count = 1
+        args, positionals = positionals[:count], positionals[count:]
+        if OBJECT_ARGUMENT.search(action.dest):
+            values.extend(args)
+    return values
+
+
+class ScriptLine:
+    """
+    A single command of a script, with the lines it has to wait for
+    """
+
+    def __init__(self, lineno: int, command: str, label: Optional[str]):
+        self.lineno = lineno
+        self.command = command
+        self.label = label
+        self.tokens = shlex.split(command)
+        if self.tokens and self.tokens[0] == "fractal":
+            self.tokens = self.tokens[1:]
+        self.references = {
+            match.group("label") for match in PLACEHOLDER.finditer(command)
+        }
+        self.depends_on: List["ScriptLine"] = []
+
+        self.status = "pending"
+        self.value: Optional[str] = None
+        self.elapsed: Optional[float] = None
+        self.finished: Optional[asyncio.Event] = None
+
+    def resource_keys(self) -> List[str]:
+        """
+        Tokens identifying the objects this line acts upon, i.e. IDs, names
+        and placeholders (see `object_arguments`)
+        """
+        keys = []
+        for token in object_arguments(self.tokens):
+            placeholders = [m.group(0) for m in PLACEHOLDER.finditer(token)]
+            keys.extend(placeholders or [token])
+        return keys
+
+
+def parse_script(text: str) -> List[ScriptLine]:
+    """
+    Split a script into commands and compute their dependencies
+
+    A line depends on:
+        * the lines whose label it refers to through a placeholder;
+        * the previous line sharing an ID, a name or a placeholder with it,
+          so that e.g. a workflow is created after its project and tasks are
+          added to it in the order of the script;
+        * all previous lines, if a `wait` line sits in between.
+
+    Raises:
+        ValueError: If a line is not a valid command, or refers to a label
+            that is not defined on a previous line.
+    """
+    lines: List[ScriptLine] = []
+    labels: Dict[str, ScriptLine] = {}
+    last_use: Dict[str, ScriptLine] = {}
+    barrier: List[ScriptLine] = []
+
+    # Join lines continued with a trailing backslash
+    logical_lines = []
+    buffer, start = "", None
+    for lineno, raw in enumerate(text.splitlines(), start=1):
+        start = start or lineno
+        if raw.rstrip().endswith("\\"):
+            buffer += raw.rstrip()[:-1] + " "
+            continue
+        logical_lines.append((start, buffer + raw))
+        buffer, start = "", None
+    if buffer:
+        logical_lines.append((start, buffer))
+
+    for lineno, raw in logical_lines:
+        command = raw.strip()
+        if not command or command.startswith("#"):
+            continue
+        if command == "wait":
+            barrier = list(lines)
+            continue
+
+        match = LABEL.match(command)
+        label = None
+        if match:
+            label, command = match.group("label"), match.group("command")
+        try:
+            line = ScriptLine(lineno, command, label)
+        except ValueError as e:
+            raise ValueError(f"Line {lineno}: {e}")
+
+        # Validate the command, with placeholders replaced by a dummy ID
+        tokens = [PLACEHOLDER.sub("1", token) for token in line.tokens]
+        try:
+            args = parser_main.parse_args(tokens)
+        except SystemExit:
+            raise ValueError(f"Line {lineno}: invalid command `{command}`")
+        if args.cmd is None or args.cmd in NOT_SCRIPTABLE:
+            raise ValueError(
+                f"Line {lineno}: `{command}` cannot be used in a script"
+            )
+
+        dependencies = list(barrier)
+        for reference in sorted(line.references):
+            if reference not in labels:
+                raise ValueError(
+                    f"Line {lineno}: label `{reference}` is not defined on "
+                    "any previous line"
+                )
+            dependencies.append(labels[reference])
+        for key in line.resource_keys():
+            if key in last_use:
+                dependencies.append(last_use[key])
+            last_use[key] = line
+        for dependency in dependencies:
+            if dependency not in line.depends_on:
+                line.depends_on.append(dependency)
+
+        if label:
+            labels[label] = line
+        lines.append(line)
+    return lines
+
+
+def _interface_value(iface: BaseInterface) -> str:
+    """
+    Value of a command output, as seen by placeholders
+    """
+    if isinstance(iface.data, dict) and "id" in iface.data:
+        return str(iface.data["id"])
+    return str(iface.data)
+
+
+async def _run_line(
+    line: ScriptLine,
+    client: AuthClient,
+    semaphore: asyncio.Semaphore,
+    values: Dict[str, str],
+):
+    from .. import cmd
+
+    for dependency in line.depends_on:
+        await dependency.finished.wait()
+    if any(dependency.status != "ok" for dependency in line.depends_on):
+        line.status = "skipped"
+        line.finished.set()
+        return
+
+    def _substitute(match) -> str:
+        value = values[match.group("label")]
+        if match.group("index") is not None:
+            return value.split()[int(match.group("index"))]
+        return value
+
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            tokens = [PLACEHOLDER.sub(_substitute, t) for t in line.tokens]
+            args = parser_main.parse_args(["--batch"] + tokens)
+            handler = getattr(cmd, args.cmd)
+            iface = await handler(client, **vars(args))
+            line.status = "ok" if iface.retcode == 0 else "failed"
+            line.value = _interface_value(iface)
+        except SystemExit:
+            # Raised by `check_response`, which already logged the error
+            line.status = "failed"
+        except Exception as e:
+            logging.error(f"Line {line.lineno}: {e!r}")
+            line.status = "failed"
+        line.elapsed = time.perf_counter() - start
+
+    if line.label and line.status == "ok":
+        values[line.label] = line.value
+    line.finished.set()
+
+
+async def script_run(
+    client: AuthClient,
+    *,
+    script_file: str,
+    max_concurrency: int = 8,
+    batch: bool = False,
+    json: bool = False,
+    **kwargs,
+) -> BaseInterface:
+    """
+    Run all the commands of a script through a single client
+
+    Independent lines run concurrently (up to `max_concurrency` at a time),
+    see `parse_script` for the rules on dependencies between lines.
+    """
+    try:
+        lines = parse_script(Path(script_file).read_text())
+    except ValueError as e:
+        return PrintInterface(retcode=1, data=f"ERROR: {e}")
+
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    values: Dict[str, str] = {}
+    for line in lines:
+        line.finished = asyncio.Event()
+    await asyncio.gather(
+        *(_run_line(line, client, semaphore, values) for line in lines)
+    )
+    elapsed = time.perf_counter() - start
+
+    retcode = 0 if all(line.status == "ok" for line in lines) else 1
+    results = [
+        dict(
+            line=line.lineno,
+            label=line.label,
+            command=line.command,
+            status=line.status,
+            output=line.value,
+            elapsed=None if line.elapsed is None else round(line.elapsed, 3),
+        )
+        for line in lines
+    ]
+
+    if batch:
+        output = "\n".join(
+            f"{line.lineno} {line.status} {line.value or ''}".rstrip()
+            for line in lines
+        )
+        return PrintInterface(retcode=retcode, data=output)
+    if json:
+        return RichJsonInterface(retcode=retcode, data=results)
+
+    from rich.table import Table
+
+    n_ok = sum(line.status == "ok" for line in lines)
+    table = Table(
+        title=f"Script {script_file}",
+        caption=f"{n_ok}/{len(lines)} commands succeeded in {elapsed:.2f} s",
+    )
+    table.add_column("Line", justify="right", style="cyan")
+    table.add_column("Command")
+    table.add_column("Status", justify="center")
+    table.add_column("Output", style="green")
+    table.add_column("Time (s)", justify="right")
+    status_style = dict(ok="green", failed="red", skipped="yellow")
+    for line in lines:
+        command = (
+            f"{line.label} = {line.command}" if line.label else line.command
+        )
+        table.add_row(
+            str(line.lineno),
+            command,
+            f"[{status_style[line.status]}]{line.status}",
+            line.value,
+            "" if line.elapsed is None else f"{line.elapsed:.3f}",
+        )
+    return RichConsoleInterface(retcode=retcode, data=table)
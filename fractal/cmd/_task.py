@@ -1,3 +1,4 @@
+from typing import List
 from typing import Optional
 
 from ..authclient import AuthClient
@@ -8,14 +9,36 @@ from ..common.schemas import TaskUpdate
 from ..config import settings
 from ..interface import BaseInterface
 from ..interface import PrintInterface
+from ..interface import RAW_OUTPUTS
 from ..interface import RichJsonInterface
 from ..response import check_response
 from .utils import get_cached_task_by_name
+from .utils import list_records
 from .utils import refresh_task_cache
+from .utils import stream_records
 
 
-async def task_list(client: AuthClient, **kwargs) -> RichJsonInterface:
-    task_list = await refresh_task_cache(client=client, **kwargs)
+async def task_list(
+    client: AuthClient,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    page_size: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+    output: Optional[str] = None,
+    **kwargs,
+) -> BaseInterface:
+    if limit is None and not offset and fields is None:
+        # The full list is also used to sync the task registry
+        task_list = await refresh_task_cache(client=client, **kwargs)
+        return RichJsonInterface(retcode=0, data=task_list)
+
+    pages = dict(
+        limit=limit, offset=offset, page_size=page_size, fields=fields
+    )
+    url = f"{settings.BASE_URL}/task/"
+    if output in RAW_OUTPUTS:
+        return await stream_records(client, url, output, **pages)
+    task_list = await list_records(client, url, **pages)
     return RichJsonInterface(retcode=0, data=task_list)
 
 
@@ -1,6 +1,7 @@
 import json
 import logging
 from pathlib import Path
+from typing import List
 from typing import Optional
 
 from ..authclient import AuthClient
@@ -15,9 +16,18 @@ from ..common.schemas import WorkflowUpdate
 from ..config import settings
 from ..interface import BaseInterface
 from ..interface import PrintInterface
+from ..interface import RAW_OUTPUTS
 from ..interface import RichJsonInterface
 from ..response import check_response
+from .utils import fields_params
 from .utils import get_cached_task_by_name
+from .utils import is_single_id
+from .utils import list_records
+from .utils import parse_id_specs
+from .utils import read_records
+from .utils import records_interface
+from .utils import resolve_name
+from .utils import stream_records
 
 
 async def workflow_query_job_status(
@@ -78,13 +88,20 @@ async def workflow_list(
     client: AuthClient,
     project_id: int,
     batch: bool = False,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    page_size: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+    output: Optional[str] = None,
     **kwargs,
-) -> RichJsonInterface:
-
-    res = await client.get(
-        f"{settings.BASE_URL}/project/{project_id}/workflows/"
+) -> BaseInterface:
+    pages = dict(
+        limit=limit, offset=offset, page_size=page_size, fields=fields
     )
-    workflow_list = check_response(res, expected_status_code=200)
+    url = f"{settings.BASE_URL}/project/{project_id}/workflows/"
+    if output in RAW_OUTPUTS:
+        return await stream_records(client, url, output, **pages)
+    workflow_list = await list_records(client, url, **pages)
     return RichJsonInterface(retcode=0, data=workflow_list)
 
 
@@ -102,11 +119,42 @@ async def workflow_delete(
 async def workflow_show(
     client: AuthClient,
     *,
-    id: int,
+    ids: List[str],
+    from_file: Optional[str] = None,
+    fields: Optional[List[str]] = None,
     **kwargs,
-) -> RichJsonInterface:
-    res = await client.get(f"{settings.BASE_URL}/workflow/{id}")
-    workflow = check_response(res, expected_status_code=200)
+) -> BaseInterface:
+    if not is_single_id(ids, from_file):
+        try:
+            id_list = parse_id_specs(ids, from_file)
+        except ValueError as e:
+            return PrintInterface(retcode=1, data=f"ERROR: {e}")
+        workflows = await read_records(
+            client,
+            id_list,
+            lambda id: f"{settings.BASE_URL}/workflow/{id}",
+            kind="workflow",
+            fields=fields,
+        )
+        columns = dict(
+            id="Id", name="Name", project_id="Project", task_list="Tasks"
+        )
+        if fields is not None:
+            columns = {field: columns.get(field, field) for field in fields}
+        return records_interface(
+            workflows,
+            columns,
+            title="Workflows",
+            formatters=dict(task_list=lambda tasks: str(len(tasks))),
+        )
+
+    id = ids[0]
+    if not id.isdigit():
+        id = await resolve_name(client, "workflow", id)
+    res = await client.get(
+        f"{settings.BASE_URL}/workflow/{id}", params=fields_params(fields)
+    )
+    workflow = check_response(res, expected_status_code=200, fields=fields)
     return RichJsonInterface(retcode=0, data=workflow)
 
 
@@ -1,76 +1,474 @@
-import json
-import logging
+import asyncio
+import re
+import sys
+from collections import deque
 from pathlib import Path
+from typing import Any
+from typing import AsyncIterator
+from typing import Callable
+from typing import Dict
 from typing import List
+from typing import Optional
+from typing import Union
+
+from httpx import HTTPError
+from httpx import Response
 
 from ..authclient import AuthClient
 from ..config import settings
+from ..interface import RecordsInterface
+from ..interface import RecordWriter
+from ..interface import StreamInterface
+from ..nameindex import AmbiguousNameError
+from ..nameindex import get_name_index
+from ..nameindex import NameIndex
+from ..nameindex import NameNotFoundError
+from ..nameindex import NameResolutionError
 from ..response import check_response
+from ..response import select_fields
+from ..taskregistry import get_task_registry
+from ..taskregistry import stats
 
 
 async def get_cached_task_by_name(name: str, client: AuthClient) -> int:
+    """
+    ID of the task referred to as `name` or `name@version`
 
-    # Set paths
-    cache_dir = Path(f"{settings.FRACTAL_CACHE_PATH}").expanduser()
-    cache_file = cache_dir / "tasks"
-
-    # If cache is missing, create it
-    cache_up_to_date = False
-    if not cache_file.exists():
-        await refresh_task_cache(client)
-        cache_up_to_date = True
-
-    # Read cache
-    with cache_file.open("r") as f:
-        task_cache = json.load(f)
-
-    # Look for name in cache
-    # Case 1: name exists in cache
-    if name in task_cache.keys():
-        return task_cache[name]
-    # Case 2: name is missing, and cache was just updated
-    elif cache_up_to_date:
-        raise KeyError(f'Task "{name}" not in {cache_file}\n')
-    # Case 3: name is missing but cache may be out of date
-    else:
-        await refresh_task_cache(client)
-        with cache_file.open("r") as f:
-            task_cache = json.load(f)
+    The local task registry is synced with the server if it is older than
+    `FRACTAL_TASK_CACHE_TTL`, or if the task is not found in it. Tasks which
+    are not found within `FRACTAL_TASK_CACHE_NEGATIVE_TTL` of a sync are
+    reported as missing without syncing again.
+    """
+    registry = get_task_registry(client.username)
+    if registry.age < settings.FRACTAL_TASK_CACHE_TTL:
         try:
-            return task_cache[name]
-        except KeyError as e:
-            raise KeyError(f'Task "{name}" not in {cache_file}\n', str(e))
+            task_id = registry.lookup(name)
+            stats["hits"] += 1
+            return task_id
+        except KeyError:
+            if registry.age < settings.FRACTAL_TASK_CACHE_NEGATIVE_TTL:
+                stats["negative_hits"] += 1
+                raise
+    stats["misses"] += 1
+    await refresh_task_cache(client)
+    return get_task_registry(client.username).lookup(name)
 
 
 async def refresh_task_cache(client: AuthClient, **kwargs) -> List[dict]:
+    """
+    Sync the local task registry with the full task list of the server
+
+    NOTE: fractal-server sends no `ETag`/`Last-Modified` for the task list,
+    so the HTTP cache (which only stores responses it can revalidate) does
+    not apply, and each sync downloads the whole list. Only the registry
+    file is spared a rewrite when nothing changed.
+    """
+    task_list = await list_records(client, f"{settings.BASE_URL}/task/")
+
+    registry = get_task_registry(client.username)
+    async with registry.lock:
+        registry.sync(task_list)
+
+    return task_list
+
+
+# Arguments which refer to projects, datasets or workflows, by ID or by name
+NAME_ARGS = dict(
+    project_id="project",
+    dataset_id="dataset",
+    input_dataset_id="dataset",
+    output_dataset_id="dataset",
+    workflow_id="workflow",
+)
 
-    # Get task_list
-    res = await client.get(f"{settings.BASE_URL}/task/")
-    task_list = check_response(res, expected_status_code=200)
-
-    # Check that there are no name clashes
-    names = [task["name"] for task in task_list]
-    if len(set(names)) < len(names):
-        msg = (
-            "Cannot write task-list cache if task names are not unique "
-            "(version-based disambiguation will be added in the future).\n"
-            f"Current task list includes: {names}"
+
+async def _sync_projects(client: AuthClient, index: NameIndex) -> NameIndex:
+    """
+    Sync the projects and their datasets, which come in a single response
+    """
+    res = await client.get(f"{settings.BASE_URL}/project/")
+    projects = check_response(res, expected_status_code=200)
+    scopes = dict(projects=projects)
+    for project in projects:
+        scopes[f"datasets/{project['id']}"] = project["dataset_list"]
+    return await index.update(scopes)
+
+
+async def _sync_workflows(
+    client: AuthClient, index: NameIndex, project_ids: List[int]
+) -> NameIndex:
+    async def _fetch(project_id: int) -> List[Dict[str, Any]]:
+        res = await client.get(
+            f"{settings.BASE_URL}/project/{project_id}/workflows/"
         )
-        logging.warning(msg)
-        return task_list
+        return check_response(res, expected_status_code=200)
 
-    # Refresh cache of (name,id) pairs
-    task_cache = {}
-    for task in task_list:
-        task_cache[task["name"]] = task["id"]
+    workflows = await asyncio.gather(*(_fetch(id) for id in project_ids))
+    return await index.update(
+        {
+            f"workflows/{project_id}": project_workflows
+            for project_id, project_workflows in zip(project_ids, workflows)
+        }
+    )
 
-    # Set paths and create cache folder (if needed)
-    cache_dir = Path(f"{settings.FRACTAL_CACHE_PATH}").expanduser()
-    cache_file = cache_dir / "tasks"
-    cache_dir.mkdir(parents=True, exist_ok=True)
 
-    # Write task cache
-    with cache_file.open("w") as f:
-        json.dump(task_cache, f, indent=4)
+def _scopes(index: NameIndex, kind: str, project_id: Optional[int]):
+    if kind == "project":
+        return ["projects"]
+    project_ids = [project_id] if project_id else index.ids("projects")
+    return [f"{kind}s/{id}" for id in project_ids]
 
-    return task_list
+
+async def resolve_name(
+    client: AuthClient,
+    kind: str,
+    name: str,
+    project_id: Optional[int] = None,
+) -> int:
+    """
+    ID of the project, dataset or workflow with a given name
+
+    Datasets and workflows are looked up within `project_id`, if set, or
+    within all the projects of the user otherwise. The scopes of the local
+    index which are involved are synced with the server if they are older
+    than `FRACTAL_NAME_CACHE_TTL`, or if the name is not found in them.
+
+    Raises:
+        NameNotFoundError: If no object has the given name.
+        AmbiguousNameError: If more than one object has the given name.
+    """
+    index = get_name_index(client.username)
+    for attempt in range(2):
+        scopes = _scopes(index, kind, project_id)
+        if kind != "project" and project_id is None:
+            # The list of projects is part of the lookup
+            scopes.append("projects")
+        ages = [index.age(scope) for scope in scopes]
+        ids = [id for scope in scopes for id in index.lookup(scope, name)]
+        if ids and max(ages) < settings.FRACTAL_NAME_CACHE_TTL:
+            break
+        if attempt == 1 or (
+            max(ages) < settings.FRACTAL_NAME_CACHE_NEGATIVE_TTL
+        ):
+            break
+        # Sync the scopes and look again
+        if kind != "workflow" or project_id is None:
+            index = await _sync_projects(client, index)
+        if kind == "workflow":
+            project_ids = [project_id] if project_id else index.ids("projects")
+            index = await _sync_workflows(client, index, project_ids)
+
+    where = f" in project {project_id}" if project_id else ""
+    if not ids:
+        raise NameNotFoundError(f'No {kind} named "{name}"{where}')
+    if len(ids) > 1:
+        raise AmbiguousNameError(
+            f'Name "{name}" is ambiguous, it matches the {kind}s with IDs '
+            f"{ids}{where}. Use the ID instead."
+        )
+    return ids[0]
+
+
+async def invalidate_names(client: AuthClient, *prefixes: str):
+    """
+    Mark scopes of the name index as out of date, see `NameIndex.invalidate`
+    """
+    await get_name_index(client.username).invalidate(*prefixes)
+
+
+async def resolve_names(
+    client: AuthClient,
+    kwargs: Dict[str, Any],
+    *,
+    id_kind: Optional[str] = None,
+    project_scoped: bool = True,
+) -> Dict[str, Any]:
+    """
+    Replace the names passed in place of IDs with the corresponding IDs
+
+    Arguments:
+        kwargs: Parsed command-line arguments.
+        id_kind: Kind of object the `id` argument refers to, if any.
+        project_scoped: Whether `project_id` is the project which contains
+            the datasets and workflows of the other arguments.
+    """
+    arg_kinds = dict(NAME_ARGS)
+    if id_kind:
+        arg_kinds["id"] = id_kind
+
+    def _is_name(value) -> bool:
+        return isinstance(value, str) and not value.isdigit()
+
+    kwargs = dict(kwargs)
+    project_id = kwargs.get("project_id")
+    if _is_name(project_id):
+        project_id = await resolve_name(client, "project", project_id)
+        kwargs["project_id"] = project_id
+    for key, kind in arg_kinds.items():
+        if key == "project_id" or not _is_name(kwargs.get(key)):
+            continue
+        kwargs[key] = await resolve_name(
+            client,
+            kind,
+            kwargs[key],
+            project_id=int(project_id)
+            if project_scoped and project_id
+            else None,
+        )
+    return kwargs
+
+
+def fields_params(fields: Optional[List[str]]) -> Dict[str, str]:
+    """
+    Query parameters asking the server for a subset of the fields of a record
+
+    Servers which do not support them return whole records, and the unused
+    fields are then dropped right after decoding (see `select_fields`).
+    """
+    if fields is None:
+        return {}
+    return dict(fields=",".join(fields))
+
+
+async def iter_pages(
+    client: AuthClient,
+    url: str,
+    *,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    page_size: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Iterate over the pages of a collection, from `offset` and up to `limit`
+    records, optionally restricted to some `fields` (see `fields_params`)
+
+    Pages are requested with `offset` and `limit` query parameters, and the
+    server replies either with `{"items": [...], ...}` or with a bare list.
+    Up to `FRACTAL_PAGE_PREFETCH` pages are fetched concurrently, ahead of
+    the one being consumed. A server which ignores the parameters replies
+    with a longer list than requested (or with the same list again, or with
+    more than one record to a request for one), which is then sliced on the
+    client side.
+    """
+    page_size = page_size or settings.FRACTAL_PAGE_SIZE
+    end = None if limit is None else offset + limit
+
+    async def _fetch(start: int, size: int):
+        params = dict(offset=start, limit=size, **fields_params(fields))
+        res = await client.get(url, params=params)
+        return check_response(res, expected_status_code=200)
+
+    first_size = page_size if limit is None else min(page_size, limit)
+    first = await _fetch(offset, first_size)
+    if isinstance(first, list):
+        first_items = first
+        paginated = len(first) <= first_size
+        if paginated and offset and first:
+            # Either a page past `offset`, or the start of a collection which
+            # is not paginated: only the latter has more than one record
+            # when asked for one
+            paginated = len(await _fetch(0, 1)) <= 1
+        if not paginated:
+            # The server ignores pagination, and sent the whole collection
+            records = first[offset:end]
+            for start in range(0, len(records), page_size):
+                stop = start + page_size
+                yield select_fields(records[start:stop], fields)
+            return
+    else:
+        first_items = first["items"]
+        if first.get("total") is not None:
+            total = first["total"]
+            end = total if end is None else min(end, total)
+    yield select_fields(first_items, fields)
+    if len(first_items) < first_size:
+        return
+
+    next_start = offset + first_size
+    pending: deque = deque()
+    try:
+        while True:
+            while len(pending) < settings.FRACTAL_PAGE_PREFETCH and (
+                end is None or next_start < end
+            ):
+                size = (
+                    page_size
+                    if end is None
+                    else min(page_size, end - next_start)
+                )
+                future = asyncio.ensure_future(_fetch(next_start, size))
+                pending.append((future, size))
+                next_start += size
+            if not pending:
+                return
+            future, size = pending.popleft()
+            page = await future
+            items = page if isinstance(page, list) else page["items"]
+            if isinstance(page, list) and (
+                len(items) > size or items == first_items
+            ):
+                # The server ignores pagination, and the whole collection was
+                # the first page
+                return
+            if items:
+                yield select_fields(items, fields)
+            if len(items) < size:
+                # Past the end of a collection of unknown size
+                return
+    finally:
+        for future, _ in pending:
+            future.cancel()
+
+
+async def stream_records(
+    client: AuthClient, url: str, output: str, **kwargs
+) -> StreamInterface:
+    """
+    Write the records of a (paginated) collection to stdout in a raw output
+    mode (see `RecordWriter`), one page at a time
+
+    Each page is written as soon as it arrives, while the next ones are
+    prefetched (see `iter_pages`), so that only a few pages are held in
+    memory at any time.
+    """
+    writer = RecordWriter(output)
+    async for page in iter_pages(client, url, **kwargs):
+        writer.write(page)
+        sys.stdout.flush()
+    writer.close()
+    return StreamInterface(retcode=0)
+
+
+async def list_records(client: AuthClient, url: str, **kwargs) -> List[dict]:
+    """
+    All the records of a (paginated) collection, see `iter_pages`
+
+    NOTE: Commands which only write the records use `stream_records` instead.
+    """
+    return [
+        record
+        async for page in iter_pages(client, url, **kwargs)
+        for record in page
+    ]
+
+
+# A range of IDs, e.g. `100-180` (both ends included)
+ID_RANGE = re.compile(r"^(\d+)-(\d+)$")
+
+
+def parse_id_specs(
+    specs: List[str], from_file: Optional[str] = None
+) -> List[Union[int, str]]:
+    """
+    IDs given on the command line and/or in a file (one per line)
+
+    Ranges such as `100-180` are expanded, duplicates are dropped and
+    anything which is not an ID or a range is kept as a name.
+
+    Raises:
+        ValueError: If a range is reversed, or no ID is given at all.
+    """
+    specs = list(specs)
+    if from_file:
+        for line in Path(from_file).read_text().splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                specs.append(line)
+    ids: List[Union[int, str]] = []
+    for spec in specs:
+        match = ID_RANGE.match(spec)
+        if match:
+            first, last = map(int, match.groups())
+            if first > last:
+                raise ValueError(f"Invalid range of IDs {spec}")
+            ids.extend(range(first, last + 1))
+        elif spec.isdigit():
+            ids.append(int(spec))
+        else:
+            ids.append(spec)
+    if not ids:
+        raise ValueError("No ID given")
+    return list(dict.fromkeys(ids))
+
+
+def is_single_id(specs: List[str], from_file: Optional[str] = None) -> bool:
+    """
+    Whether the command line refers to a single object, which is then shown
+    in full rather than as a row of a table
+    """
+    return len(specs) == 1 and not from_file and not ID_RANGE.match(specs[0])
+
+
+def response_error(res: Response) -> str:
+    """
+    Short description of an unexpected response, e.g. `404 Job not found`
+    """
+    try:
+        data = res.json()
+    except ValueError:
+        data = {}
+    detail = data.get("detail") if isinstance(data, dict) else None
+    return f"{res.status_code} {detail or res.reason_phrase}"
+
+
+async def read_records(
+    client: AuthClient,
+    ids: List[Union[int, str]],
+    url: Callable[[int], str],
+    *,
+    kind: Optional[str] = None,
+    project_id: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Read several records concurrently, up to `FRACTAL_MAX_CONCURRENT_REQUESTS`
+    at a time
+
+    Names among `ids` are resolved as objects of the given `kind` (see
+    `resolve_name`). A record which cannot be read is replaced by
+    `{"id": ..., "error": ...}`, without aborting the others.
+    """
+    semaphore = asyncio.Semaphore(settings.FRACTAL_MAX_CONCURRENT_REQUESTS)
+
+    async def _read(object_id: Union[int, str]) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                if isinstance(object_id, str):
+                    object_id = await resolve_name(
+                        client, kind, object_id, project_id=project_id
+                    )
+                res = await client.get(
+                    url(object_id), params=fields_params(fields)
+                )
+            except NameResolutionError as e:
+                return dict(id=object_id, error=e.args[0])
+            except HTTPError as e:
+                return dict(id=object_id, error=f"{type(e).__name__}: {e}")
+        if res.status_code != 200:
+            return dict(id=object_id, error=response_error(res))
+        try:
+            data = res.json()
+        except ValueError:
+            data = {}
+        return {"id": object_id, **select_fields(data, fields)}
+
+    return await asyncio.gather(*(_read(object_id) for object_id in ids))
+
+
+def records_interface(
+    records: List[Dict[str, Any]],
+    columns: Dict[str, str],
+    **kwargs,
+) -> RecordsInterface:
+    """
+    Show the output of `read_records`, with an `Error` column (and a non-zero
+    return code) if any record could not be read
+    """
+    retcode = 0
+    if any("error" in record for record in records):
+        retcode = 1
+        columns = dict(columns, error="Error")
+    return RecordsInterface(
+        retcode=retcode, data=records, columns=columns, **kwargs
+    )
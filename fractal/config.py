@@ -10,10 +10,13 @@ This file is part of Fractal and was originally developed by eXact lab S.r.l.
 Institute for Biomedical Research and Pelkmans Lab from the University of
 Zurich.
 """
+from functools import lru_cache
+from os import cpu_count
 from os import getenv
 
 from dotenv import load_dotenv
 from pydantic import BaseSettings
+from pydantic import Field
 
 from . import __VERSION__
 
@@ -25,21 +28,118 @@ def fail_getenv(key):
     return value
 
 
-load_dotenv(".fractal.env")
+def _default_server() -> str:
+    return getenv("FRACTAL_SERVER", "http://localhost:8000")
 
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Fractal client"
     PROJECT_VERSION: str = __VERSION__
 
-    FRACTAL_USER: str = fail_getenv("FRACTAL_USER")
-    FRACTAL_PASSWORD: str = fail_getenv("FRACTAL_PASSWORD")
-    SLURM_USER: str = fail_getenv("SLURM_USER")
+    # Read from the environment when the settings are first used (see
+    # `get_settings`), rather than when this module is imported
+    FRACTAL_USER: str = Field(
+        default_factory=lambda: fail_getenv("FRACTAL_USER")
+    )
+    FRACTAL_PASSWORD: str = Field(
+        default_factory=lambda: fail_getenv("FRACTAL_PASSWORD")
+    )
+    SLURM_USER: str = Field(default_factory=lambda: fail_getenv("SLURM_USER"))
 
-    FRACTAL_SERVER: str = getenv("FRACTAL_SERVER", "http://localhost:8000")
+    FRACTAL_SERVER: str = Field(default_factory=_default_server)
 
-    BASE_URL: str = f"{FRACTAL_SERVER}/api/v1"
+    BASE_URL: str = Field(
+        default_factory=lambda: f"{_default_server()}/api/v1"
+    )
     FRACTAL_CACHE_PATH: str = "~/.cache/fractal"
 
+    # Refresh the token in the background when it expires within this many
+    # seconds
+    FRACTAL_TOKEN_REFRESH_MARGIN: int = 30
 
-settings = Settings()
+    # HTTP transport (timeouts are in seconds)
+    FRACTAL_HTTP2: bool = False
+    FRACTAL_MAX_CONNECTIONS: int = 100
+    FRACTAL_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    FRACTAL_KEEPALIVE_EXPIRY: float = 5.0
+    FRACTAL_CONNECT_TIMEOUT: float = 5.0
+    FRACTAL_READ_TIMEOUT: float = 60.0
+    FRACTAL_WRITE_TIMEOUT: float = 60.0
+    FRACTAL_POOL_TIMEOUT: float = 10.0
+
+    # Retries of transient failures, with exponential backoff (in seconds)
+    # and an overall time budget per request. POST requests are only retried
+    # if FRACTAL_RETRY_POST is set, and carry an `Idempotency-Key` header.
+    FRACTAL_MAX_RETRIES: int = 4
+    FRACTAL_RETRY_BACKOFF: float = 0.5
+    FRACTAL_RETRY_MAX_DELAY: float = 10.0
+    FRACTAL_RETRY_BUDGET: float = 60.0
+    FRACTAL_RETRY_POST: bool = False
+
+    # Client-side limits on the requests to each host (a rate of 0 means no
+    # limit). Log downloads have their own, separate budget.
+    FRACTAL_MAX_CONCURRENT_REQUESTS: int = 16
+    FRACTAL_REQUESTS_PER_SECOND: float = 50.0
+    FRACTAL_MAX_CONCURRENT_DOWNLOADS: int = 2
+    FRACTAL_DOWNLOADS_PER_SECOND: float = 1.0
+
+    # Send JSON request bodies larger than the threshold (in bytes) with gzip
+    # compression, to servers which advertise support for it
+    FRACTAL_COMPRESS_REQUESTS: bool = True
+    FRACTAL_COMPRESS_THRESHOLD: int = 16384
+
+    # On-disk cache of GET responses, with its maximum size in bytes
+    FRACTAL_HTTP_CACHE: bool = True
+    FRACTAL_HTTP_CACHE_SIZE: int = 64 * 1024 * 1024
+
+    # On-disk cache of the log archives of finished jobs, with its maximum
+    # size in bytes
+    FRACTAL_ARCHIVE_CACHE: bool = True
+    FRACTAL_ARCHIVE_CACHE_SIZE: int = 1024 * 1024 * 1024
+
+    # Lifetime (in seconds) of the task registry used to resolve task names,
+    # and of the lookups which found no task
+    FRACTAL_TASK_CACHE_TTL: int = 3600
+    FRACTAL_TASK_CACHE_NEGATIVE_TTL: int = 30
+
+    # Same as above, for the names of projects, datasets and workflows
+    FRACTAL_NAME_CACHE_TTL: int = 300
+    FRACTAL_NAME_CACHE_NEGATIVE_TTL: int = 10
+
+    # Records per page of list commands, and pages fetched ahead of the one
+    # being processed
+    FRACTAL_PAGE_SIZE: int = 100
+    FRACTAL_PAGE_PREFETCH: int = 4
+
+    # Polling of running jobs (`job wait`, `job watch`): the interval grows
+    # with the age of a job, as a fraction FRACTAL_POLL_BACKOFF of it, from
+    # FRACTAL_POLL_MIN_INTERVAL up to FRACTAL_POLL_MAX_INTERVAL (seconds)
+    FRACTAL_POLL_MIN_INTERVAL: float = 1.0
+    FRACTAL_POLL_MAX_INTERVAL: float = 60.0
+    FRACTAL_POLL_BACKOFF: float = 0.1
+
+    # Size of the chunks in which downloaded files are read (bytes)
+    FRACTAL_DOWNLOAD_CHUNK_SIZE: int = 1024 * 1024
+
+    # Threads which extract the members of job log archives
+    FRACTAL_EXTRACT_WORKERS: int = min(8, cpu_count() or 1)
+
+    # Processes which search job logs and archives (`job grep`)
+    FRACTAL_SEARCH_WORKERS: int = cpu_count() or 1
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """
+    The settings, read from the environment and `.fractal.env` on first use
+    """
+    load_dotenv(".fractal.env")
+    return Settings()
+
+
+def __getattr__(name: str):
+    # `settings` is only built when first imported or accessed, so that
+    # e.g. parsing the command line does not require the environment
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,358 @@
+"""
+Local daemon that keeps an authenticated client alive between invocations
+
+`fractal daemon start` opens a unix socket and serves commands through a
+single `AuthClient`, so that its connection pool, token and in-memory caches
+are shared across calls. Each `fractal ...` invocation first tries to forward
+its parsed arguments to the daemon, and only falls back to running the command
+in-process if no daemon is available (or if the daemon does not accept it
+within a few seconds). Invocations which set HTTP options (e.g.
+`--read-timeout`) always run in-process, since they cannot apply to the shared
+client. `FRACTAL_DAEMON_TIMEOUT` optionally bounds the time to wait for the
+reply to a forwarded command.
+
+NOTE: `forward` runs before anything else on each invocation, so this module
+must only import lightweight modules at the top level.
+"""
+import json
+import logging
+import os
+import socket
+import sys
+import time
+import traceback
+from contextvars import ContextVar
+from functools import partial
+from io import StringIO
+from os import getenv
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from .parser import parser_main
+
+
+# Commands that are always run in-process
+LOCAL_COMMANDS = ["daemon", "debug", "register", "version"]
+
+# Long-running subcommands, which show their progress (or stream their output)
+# on the terminal of the invoking process
+LOCAL_SUBCOMMANDS = [
+    ("job", "grep"),
+    ("job", "logs"),
+    ("job", "wait"),
+    ("job", "watch"),
+]
+
+# Arguments which hold paths on the local filesystem (as opposed to paths on
+# the server side). They are made absolute before being forwarded, since the
+# daemon does not share the working directory of the invoking process.
+LOCAL_PATH_ARGS = [
+    "args_file",
+    "from_file",
+    "meta_file",
+    "output_folder",
+    "script_file",
+]
+
+# Arguments which configure the HTTP client of a single invocation (see
+# `authclient.HTTP_OPTIONS`), and which the shared client of the daemon cannot
+# honour
+CLIENT_ARGS = [
+    "http2",
+    "max_connections",
+    "max_keepalive_connections",
+    "keepalive_expiry",
+    "connect_timeout",
+    "read_timeout",
+    "write_timeout",
+    "pool_timeout",
+]
+
+# Seconds to wait for the daemon to accept a request, before running the
+# command in-process
+ACCEPT_TIMEOUT = 5.0
+
+
+class DaemonTimeoutError(Exception):
+    """
+    The daemon accepted a request, but did not reply in time
+    """
+
+
+def get_socket_path() -> Path:
+    from dotenv import load_dotenv
+
+    load_dotenv(".fractal.env")
+    cache_path = getenv("FRACTAL_CACHE_PATH", "~/.cache/fractal")
+    socket_path = getenv("FRACTAL_DAEMON_SOCKET", f"{cache_path}/daemon.sock")
+    return Path(socket_path).expanduser()
+
+
+def _send(socket_path: Path, request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Send a request to the daemon, and wait for its reply
+
+    The daemon acknowledges `run` requests before serving them, so that a
+    daemon which does not respond (e.g. stopped, or stuck) is told apart from
+    a command which takes long.
+
+    Raises:
+        OSError: If the daemon does not accept the request within
+            `ACCEPT_TIMEOUT` seconds; the command was not run.
+        DaemonTimeoutError: If the daemon accepted the request, but did not
+            reply within `FRACTAL_DAEMON_TIMEOUT` seconds (if set).
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(ACCEPT_TIMEOUT)
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps(request).encode())
+        sock.shutdown(socket.SHUT_WR)
+        reply = sock.recv(65536)
+        timeout = getenv("FRACTAL_DAEMON_TIMEOUT")
+        sock.settimeout(float(timeout) if timeout else None)
+        try:
+            reply += b"".join(iter(partial(sock.recv, 65536), b""))
+        except socket.timeout:
+            raise DaemonTimeoutError(
+                f"No reply from the daemon at {socket_path} within "
+                f"{timeout} seconds"
+            )
+    return json.loads(reply)
+
+
+def forward(cli_args: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Forward a command to the running daemon, if any
+
+    Returns:
+        The daemon reply (with `retcode`, `output` and `log` keys), or `None`
+        if the command must be run in-process.
+    """
+    socket_path = get_socket_path()
+    if not socket_path.exists():
+        return None
+
+    args = parser_main.parse_args(cli_args[1:])
+    if not args.cmd or args.cmd in LOCAL_COMMANDS or args.no_daemon:
+        return None
+    if (args.cmd, getattr(args, "subcmd", None)) in LOCAL_SUBCOMMANDS:
+        return None
+    if args.no_cache:
+        # The cache belongs to the client of the daemon
+        return None
+    if any(getattr(args, key) is not None for key in CLIENT_ARGS):
+        return None
+
+    request_args = vars(args)
+    for key in LOCAL_PATH_ARGS:
+        if request_args.get(key):
+            request_args[key] = os.path.abspath(request_args[key])
+
+    request = dict(
+        op="run",
+        args=request_args,
+        user=args.user or getenv("FRACTAL_USER"),
+        server=getenv("FRACTAL_SERVER"),
+    )
+    try:
+        reply = _send(socket_path, request)
+    except OSError as e:
+        # Stale socket of a daemon which is not running (or not responding)
+        # anymore
+        logging.debug(f"Could not reach daemon at {socket_path}: {e}")
+        return None
+    except DaemonTimeoutError as e:
+        # The command may have had effects already, so it is not run again
+        return dict(retcode=1, output="", log=f"ERROR: {e}\n")
+    if reply.get("fallback"):
+        return None
+    return reply
+
+
+async def request(op: str) -> Dict[str, Any]:
+    """
+    Send a control request (`status`, `stop`) to the running daemon
+    """
+    import asyncio
+
+    reader, writer = await asyncio.open_unix_connection(str(get_socket_path()))
+    writer.write(json.dumps(dict(op=op)).encode())
+    writer.write_eof()
+    reply = json.loads(await reader.read())
+    writer.close()
+    await writer.wait_closed()
+    return reply
+
+
+_request_log: ContextVar[Optional[List[str]]] = ContextVar(
+    "request_log", default=None
+)
+
+
+class _RequestLogHandler(logging.Handler):
+    """
+    Collect the log records emitted while serving a request, so that they can
+    be sent back to the invoking process
+    """
+
+    def emit(self, record):
+        records = _request_log.get()
+        if records is not None:
+            records.append(self.format(record))
+
+
+_request_output: ContextVar[Optional[StringIO]] = ContextVar(
+    "request_output", default=None
+)
+
+
+class _RequestStdout:
+    """
+    Stand-in for `sys.stdout` in the daemon, which sends what is written while
+    serving a request (by its handler, or by `interface.show()`) to the output
+    of that request
+
+    Each request is served in its own task, so concurrent requests do not
+    interleave their outputs.
+    """
+
+    def __init__(self, stdout):
+        self._stdout = stdout
+
+    def __getattr__(self, name: str):
+        buffer = _request_output.get()
+        return getattr(self._stdout if buffer is None else buffer, name)
+
+
+class Daemon:
+    def __init__(self, client, socket_path: Path, server: str):
+        self.client = client
+        self.socket_path = socket_path
+        self.server = server
+        self.started = time.time()
+        self.requests_served = 0
+        self._stop = None
+
+    async def _run(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        from httpx import ConnectError
+
+        from . import cmd
+        from .authclient import AuthenticationError
+        from .nameindex import NameResolutionError
+
+        log = []
+        _request_log.set(log)
+        # Some handlers write (part of) their output while running
+        output = StringIO()
+        _request_output.set(output)
+        try:
+            handler = getattr(cmd, args["cmd"].replace("-", "_"))
+            interface = await handler(self.client, **args)
+            interface.output = args.get("output")
+            retcode = interface.retcode
+            interface.show()
+        except SystemExit as e:
+            # Raised by `check_response` on unexpected status codes
+            retcode = e.code if isinstance(e.code, int) else 1
+        except (AuthenticationError, ConnectError) as e:
+            retcode = 1
+            output.write(f"{e.args[0]}\n")
+        except NameResolutionError as e:
+            retcode = 1
+            output.write(f"ERROR: {e.args[0]}\n")
+        except Exception:
+            retcode = 1
+            log.append(traceback.format_exc())
+        self.requests_served += 1
+        log = "".join(f"{line}\n" for line in log)
+        return dict(retcode=retcode, output=output.getvalue(), log=log)
+
+    def status(self) -> Dict[str, Any]:
+        from .taskregistry import get_task_registry
+        from .taskregistry import stats
+
+        registry = get_task_registry(self.client.username)
+        return dict(
+            pid=os.getpid(),
+            user=self.client.username,
+            server=self.server,
+            socket=str(self.socket_path),
+            uptime=round(time.time() - self.started),
+            requests_served=self.requests_served,
+            task_cache=dict(
+                tasks=len(registry.tasks),
+                age=round(registry.age),
+                **stats,
+            ),
+        )
+
+    async def _handle_connection(self, reader, writer):
+        request = json.loads(await reader.read())
+        op = request.get("op")
+        if op == "run":
+            if request.get("user") not in (None, self.client.username) or (
+                request.get("server") not in (None, self.server)
+            ):
+                # The daemon only serves a single user on a single server
+                reply = dict(fallback=True)
+            else:
+                # Acknowledge the request (see `_send`); leading whitespace
+                # is ignored when decoding the reply
+                writer.write(b"\n")
+                await writer.drain()
+                reply = await self._run(request["args"])
+        elif op == "status":
+            reply = self.status()
+        elif op == "stop":
+            reply = dict(stopping=True)
+            self._stop.set()
+        else:
+            reply = dict(error=f"Unknown daemon request {op=}")
+        writer.write(json.dumps(reply).encode())
+        await writer.drain()
+        writer.close()
+
+    async def serve(self):
+        import asyncio
+        import signal
+
+        if self.socket_path.exists():
+            try:
+                _send(self.socket_path, dict(op="status"))
+                raise RuntimeError(
+                    f"A daemon is already listening on {self.socket_path}"
+                )
+            except OSError:
+                self.socket_path.unlink()
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, self._stop.set)
+
+        log_handler = _RequestLogHandler(level=logging.WARNING)
+        logging.getLogger().addHandler(log_handler)
+        stdout = sys.stdout
+        sys.stdout = _RequestStdout(stdout)
+
+        # Only the owner of the daemon may connect to it
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(
+                self._handle_connection, path=str(self.socket_path)
+            )
+        finally:
+            os.umask(umask)
+
+        logging.info(f"Fractal daemon listening on {self.socket_path}")
+        try:
+            async with server:
+                await self._stop.wait()
+        finally:
+            loop.remove_signal_handler(signal.SIGTERM)
+            logging.getLogger().removeHandler(log_handler)
+            sys.stdout = stdout
+            self.socket_path.unlink(missing_ok=True)
@@ -0,0 +1,256 @@
+"""
+Streaming, resumable downloads
+
+The body of a response is written to disk chunk by chunk, next to the
+destination file, with a `.part` suffix. If the transfer is interrupted, it
+is resumed with a `Range` request, guarded by the validators of the partial
+download (`If-Range`), so that a resource which changed in the meantime is
+downloaded again from scratch. Once complete, the file is checked against
+the length and digest announced by the server, and moved to its destination.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Callable
+from typing import Dict
+from typing import Optional
+
+from httpx import TransportError
+
+from .authclient import _backoff
+from .authclient import AuthClient
+from .cache import atomic_write
+from .config import settings
+
+
+class DownloadError(RuntimeError):
+    pass
+
+
+CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+# Digest algorithms of the `Repr-Digest`/`Digest` headers (RFC 9530/3230)
+# which can be checked
+DIGEST_ALGORITHMS = {"sha-256": "sha256", "sha-512": "sha512", "md5": "md5"}
+
+
+def _parse_digests(headers) -> Dict[str, str]:
+    """
+    Expected digests (hex) of the response body, by hashlib algorithm
+    """
+    digests = {}
+    for header in ["repr-digest", "digest"]:
+        for item in headers.get(header, "").split(","):
+            name, _, value = item.strip().partition("=")
+            algorithm = DIGEST_ALGORITHMS.get(name.lower())
+            if algorithm is None or not value:
+                continue
+            try:
+                digests[algorithm] = base64.b64decode(value.strip(":")).hex()
+            except ValueError:
+                continue
+    if "content-md5" in headers:
+        try:
+            digests["md5"] = base64.b64decode(headers["content-md5"]).hex()
+        except ValueError:
+            pass
+    return digests
+
+
+def _file_digest(path: Path, algorithm: str) -> str:
+    digest = hashlib.new(algorithm)
+    with path.open("rb") as f:
+        for chunk in iter(
+            lambda: f.read(settings.FRACTAL_DOWNLOAD_CHUNK_SIZE), b""
+        ):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PartialDownload:
+    """
+    The `.part` file of a download, with the validators and expected length
+    and digests of the resource it belongs to
+    """
+
+    def __init__(self, path: Path):
+        self.path = path.with_name(path.name + ".part")
+        self.meta_path = path.with_name(path.name + ".part.json")
+        try:
+            self.meta = json.loads(self.meta_path.read_text())
+        except (FileNotFoundError, ValueError):
+            self.meta = {}
+        if not self.meta:
+            self.path.unlink(missing_ok=True)
+
+    @property
+    def size(self) -> int:
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def validator(self) -> Optional[str]:
+        etag = self.meta.get("etag")
+        if etag and not etag.startswith("W/"):
+            return etag
+        return self.meta.get("last_modified")
+
+    def restart(self, res):
+        """
+        Start over, for the resource described by the response headers
+        """
+        total = res.headers.get("content-length")
+        self.meta = dict(
+            etag=res.headers.get("etag"),
+            last_modified=res.headers.get("last-modified"),
+            content_type=res.headers.get("content-type"),
+            total=int(total) if total is not None else None,
+            digests=_parse_digests(res.headers),
+        )
+        atomic_write(self.meta_path, json.dumps(self.meta))
+        self.path.write_bytes(b"")
+
+    def discard(self):
+        self.path.unlink(missing_ok=True)
+        self.meta_path.unlink(missing_ok=True)
+        self.meta = {}
+
+
+async def _resume(
+    client: AuthClient,
+    url: str,
+    part: PartialDownload,
+    expected_content_type: Optional[str],
+    on_progress: Optional[Callable[[int, Optional[int]], None]],
+) -> bool:
+    """
+    Download the rest of `part`, or all of it again if the server does not
+    support resuming it
+
+    Returns:
+        Whether the download is complete.
+    """
+    offset = part.size
+    headers = {}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        if part.validator():
+            headers["If-Range"] = part.validator()
+
+    async with client.stream("GET", url, headers=headers) as res:
+        if res.status_code == 416:
+            # The partial download does not match the resource anymore
+            part.discard()
+            return False
+        if res.status_code not in (200, 206):
+            await res.aread()
+            raise DownloadError(
+                f"Server returned {res.status_code} for {url}: {res.text}"
+            )
+        content_type = res.headers.get("content-type")
+        if expected_content_type and content_type != expected_content_type:
+            raise DownloadError(
+                f"Unexpected {content_type=} for {url}, instead of "
+                f"{expected_content_type=}"
+            )
+        if res.status_code == 206:
+            match = CONTENT_RANGE.fullmatch(
+                res.headers.get("content-range", "")
+            )
+            if not match or int(match[1]) != offset:
+                part.discard()
+                return False
+        else:
+            # Resuming is not supported, or the resource changed
+            part.restart(res)
+            offset = 0
+
+        total = part.meta.get("total")
+        with part.path.open("ab") as f:
+            # Chunks are written as they arrive, so that nothing which was
+            # received is lost if the transfer breaks
+            async for chunk in res.aiter_bytes():
+                f.write(chunk)
+                offset += len(chunk)
+                if on_progress:
+                    on_progress(offset, total)
+    return True
+
+
+async def download(
+    client: AuthClient,
+    url: str,
+    path: Path,
+    *,
+    expected_content_type: Optional[str] = None,
+    on_progress: Optional[Callable[[int, Optional[int]], None]] = None,
+) -> Path:
+    """
+    Download `url` to `path`, resuming a previous partial download if any
+
+    Arguments:
+        expected_content_type: Content type the response must have.
+        on_progress: Called with the bytes downloaded so far and the total
+            size (if known), after each chunk.
+
+    Raises:
+        DownloadError: If the server replies with an error, the download
+            cannot be completed within `FRACTAL_MAX_RETRIES` attempts, or the
+            downloaded file does not match its expected length or digest.
+    """
+    part = PartialDownload(path)
+    attempt = 0
+    while True:
+        error = None
+        try:
+            if await _resume(
+                client, url, part, expected_content_type, on_progress
+            ):
+                break
+        except TransportError as e:
+            error = e
+        attempt += 1
+        if attempt > settings.FRACTAL_MAX_RETRIES:
+            raise DownloadError(
+                f"Download of {url} failed after {attempt} attempts: "
+                f"{error!r}"
+            )
+        delay = _backoff(attempt)
+        logging.warning(
+            f"Download of {url} interrupted at {part.size} bytes "
+            f"({error!r}), resuming in {delay:.1f} s"
+        )
+        await asyncio.sleep(delay)
+
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, _check_integrity, part)
+    part.path.replace(path)
+    part.meta_path.unlink(missing_ok=True)
+    return path
+
+
+def _check_integrity(part: PartialDownload):
+    """
+    Raises:
+        DownloadError: If the file does not have the expected length or
+            digests, in which case it is discarded.
+    """
+    size = part.size
+    total = part.meta.get("total")
+    errors = []
+    if total is not None and size != total:
+        errors.append(f"{size} bytes instead of {total}")
+    for algorithm, expected in part.meta.get("digests", {}).items():
+        actual = _file_digest(part.path, algorithm)
+        if actual != expected:
+            errors.append(f"{algorithm} digest {actual} instead of {expected}")
+    if errors:
+        part.discard()
+        raise DownloadError(
+            f"Corrupted download of {part.path.name}: {', '.join(errors)}"
+        )
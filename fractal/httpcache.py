@@ -0,0 +1,129 @@
+"""
+On-disk cache of GET responses, revalidated with the server on each use
+
+Responses which carry an `ETag` or `Last-Modified` validator are stored in
+`FRACTAL_CACHE_PATH/http/<namespace>`, with one folder per server and user.
+The next request for the same URL is sent as a conditional request, so that
+an unchanged resource costs a `304 Not Modified` instead of its full body.
+The total size of each folder is capped, by evicting the least recently used
+entries.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Optional
+
+from httpx import Request
+from httpx import Response
+
+from .cache import atomic_write
+from .cache import cache_namespace
+from .cache import get_cache_dir
+from .config import settings
+
+
+# Response headers which are stored along with the body
+STORED_HEADERS = ["content-type", "etag", "last-modified"]
+
+
+class HTTPCache:
+    def __init__(self, server: str, username: str, max_size: int):
+        self.folder = get_cache_dir("http", cache_namespace(server, username))
+        self.max_size = max_size
+
+    def _path(self, url: str) -> Path:
+        return self.folder / hashlib.sha256(url.encode()).hexdigest()
+
+    def load(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached entry of a URL, if any
+        """
+        path = self._path(url)
+        try:
+            with path.open("rb") as f:
+                meta = json.loads(f.readline())
+                content = f.read()
+        except (FileNotFoundError, ValueError):
+            return None
+        if meta.get("url") != url:
+            return None
+        # The modification time tracks the last use, for LRU eviction
+        os.utime(path)
+        return dict(headers=meta["headers"], content=content)
+
+    @staticmethod
+    def validators(entry: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Headers which turn a request into a conditional one
+        """
+        headers = {}
+        if "etag" in entry["headers"]:
+            headers["If-None-Match"] = entry["headers"]["etag"]
+        if "last-modified" in entry["headers"]:
+            headers["If-Modified-Since"] = entry["headers"]["last-modified"]
+        return headers
+
+    @staticmethod
+    def response(entry: Dict[str, Any], request: Request) -> Response:
+        """
+        Rebuild the response of a cache hit
+        """
+        return Response(
+            200,
+            headers=entry["headers"],
+            content=entry["content"],
+            request=request,
+        )
+
+    def store(self, url: str, res: Response):
+        """
+        Store a successful response, if it can be revalidated
+        """
+        if res.status_code != 200:
+            return
+        if "no-store" in res.headers.get("cache-control", ""):
+            return
+        headers = {
+            key: res.headers[key]
+            for key in STORED_HEADERS
+            if key in res.headers
+        }
+        if "etag" not in headers and "last-modified" not in headers:
+            return
+        meta = json.dumps(dict(url=url, headers=headers)).encode()
+        atomic_write(self._path(url), meta + b"\n" + res.content)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in self.folder.iterdir():
+            if path.name.startswith("."):
+                # Temporary file of a concurrent write
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+
+
+def get_http_cache(username: str) -> Optional[HTTPCache]:
+    """
+    HTTP cache of a user on the current server, unless disabled
+    """
+    if not settings.FRACTAL_HTTP_CACHE:
+        return None
+    return HTTPCache(
+        settings.FRACTAL_SERVER,
+        username,
+        max_size=settings.FRACTAL_HTTP_CACHE_SIZE,
+    )
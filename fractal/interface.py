@@ -1,16 +1,122 @@
+import sys
 from typing import Any
+from typing import Callable
 from typing import Dict
+from typing import Iterable
+from typing import List
 from typing import Optional
 from typing import Sequence
 
-from rich import print_json
-from rich.console import Console
+
+# Output modes which write raw records to stdout, bypassing rich
+RAW_OUTPUTS = ["json", "ndjson", "csv"]
+
+
+def _get_json_encoder() -> Callable[[Any], str]:
+    try:
+        import orjson
+
+        def _dumps(obj: Any) -> str:
+            return orjson.dumps(obj, default=str).decode()
+
+    except ImportError:
+        import json
+
+        def _dumps(obj: Any) -> str:
+            return json.dumps(obj, default=str, separators=(",", ":"))
+
+    return _dumps
+
+
+class RecordWriter:
+    """
+    Write records to stdout in batches (e.g. the pages of a collection), as a
+    JSON array, as newline-delimited JSON or as CSV (with nested values
+    encoded as JSON)
+
+    Arguments:
+        fieldnames: Columns of the CSV output. By default, the keys found in
+            the first batch of records.
+    """
+
+    def __init__(
+        self, output: str, fieldnames: Optional[Sequence[str]] = None
+    ):
+        if output not in RAW_OUTPUTS:
+            raise ValueError(f"Unknown raw output mode {output=}")
+        self.output = output
+        self.fieldnames = fieldnames
+        self._dumps = _get_json_encoder()
+        self._separator = "["
+        self._csv_writer = None
+
+    def write(self, records: Iterable[Dict[str, Any]]):
+        write = sys.stdout.write
+        dumps = self._dumps
+        if self.output == "ndjson":
+            for record in records:
+                write(dumps(record) + "\n")
+        elif self.output == "json":
+            for record in records:
+                write(self._separator + dumps(record))
+                self._separator = ",\n"
+        else:
+            if self._csv_writer is None:
+                import csv
+
+                if self.fieldnames is None:
+                    records = list(records)
+                    if not records:
+                        return
+                    self.fieldnames = list(
+                        dict.fromkeys(
+                            key for record in records for key in record
+                        )
+                    )
+                self._csv_writer = csv.DictWriter(
+                    sys.stdout,
+                    fieldnames=self.fieldnames,
+                    extrasaction="ignore",
+                )
+                self._csv_writer.writeheader()
+            for record in records:
+                self._csv_writer.writerow(
+                    {
+                        key: dumps(value)
+                        if isinstance(value, (dict, list))
+                        else value
+                        for key, value in record.items()
+                    }
+                )
+
+    def close(self):
+        if self.output == "json":
+            sys.stdout.write("]\n" if self._separator != "[" else "[]\n")
+
+
+def write_records(
+    records: Iterable[Dict[str, Any]],
+    output: str,
+    fieldnames: Optional[Sequence[str]] = None,
+):
+    """
+    Write records to stdout one by one, see `RecordWriter`
+
+    Arguments:
+        fieldnames: Columns of the CSV output. By default, all the keys found
+            in any of the records (which are then all read before writing).
+    """
+    writer = RecordWriter(output, fieldnames)
+    writer.write(records)
+    writer.close()
 
 
 class BaseInterface:
     def __init__(self, retcode: int, data=None):
         self.retcode = retcode
         self.data = data
+        # Output mode selected with `--output`, if any
+        self.output: Optional[str] = None
 
     def show(self, *args, **kwargs):
         raise NotImplementedError("Implement in subclasses")
@@ -31,6 +137,19 @@ class PrintInterface(BaseInterface):
         print(str(self.data))
 
 
+class StreamInterface(BaseInterface):
+    """
+    Interface of commands which write their output while running, so that
+    nothing is left to show at the end
+    """
+
+    def __init__(self, retcode: int, data: Any = None):
+        super().__init__(retcode, data)
+
+    def show(self, *args, **kwargs):
+        pass
+
+
 class RichJsonInterface(BaseInterface):
     """
     Output json using rich.print_json
@@ -49,6 +168,29 @@ class RichJsonInterface(BaseInterface):
             self.extra_lines = "\n".join(extra_lines)
 
     def show(self, *args, **kwargs):
+        if self.output in RAW_OUTPUTS:
+            if self.output == "json" and isinstance(self.data, dict):
+                # A single object keeps its shape
+                sys.stdout.write(_get_json_encoder()(self.data) + "\n")
+            else:
+                data = (
+                    self.data if isinstance(self.data, list) else [self.data]
+                )
+                write_records(data, self.output)
+            if self.extra_lines:
+                sys.stderr.write(self.extra_lines + "\n")
+            return
+        if (
+            self.output == "table"
+            and isinstance(self.data, list)
+            and all(isinstance(item, dict) for item in self.data)
+        ):
+            columns = {key: key for key in self.data[0]} if self.data else {}
+            RecordsInterface(self.retcode, self.data, columns=columns).show()
+            return
+
+        from rich import print_json
+
         print_json(data=self.data)
         if self.extra_lines:
             print(self.extra_lines)
@@ -59,5 +201,54 @@ class RichConsoleInterface(BaseInterface):
         super().__init__(retcode, data)
 
     def show(self, *args, **kwargs):
+        from rich.console import Console
+
         console = Console()
         console.print(self.data)
+
+
+class RecordsInterface(BaseInterface):
+    """
+    Output a list of records, as a rich table or (with `--output`) as raw
+    JSON, NDJSON or CSV
+
+    Arguments:
+        columns: Keys of the records shown in the table, with their headers.
+        formatters: Functions which render the values of some columns in the
+            table.
+    """
+
+    def __init__(
+        self,
+        retcode: int,
+        data: List[Dict[str, Any]],
+        columns: Dict[str, str],
+        title: Optional[str] = None,
+        formatters: Optional[Dict[str, Callable[[Any], str]]] = None,
+    ):
+        super().__init__(retcode, data)
+        self.columns = columns
+        self.title = title
+        self.formatters = formatters or {}
+
+    def show(self, *args, **kwargs):
+        if self.output in RAW_OUTPUTS:
+            write_records(self.data, self.output)
+            return
+
+        from rich.console import Console
+        from rich.table import Table
+
+        table = Table(title=self.title)
+        for header in self.columns.values():
+            table.add_column(header, style="white", justify="center")
+        for record in self.data:
+            table.add_row(
+                *(
+                    ""
+                    if record.get(column) is None
+                    else self.formatters.get(column, str)(record[column])
+                    for column in self.columns
+                )
+            )
+        Console().print(table)
@@ -0,0 +1,62 @@
+"""
+Search of regular expressions in job logs
+
+These functions run in the worker processes of `job grep`, so they only take
+and return picklable values.
+"""
+import io
+import re
+from pathlib import Path
+from typing import List
+from typing import Optional
+from typing import Tuple
+from zipfile import ZipFile
+
+from .archive import select_members
+
+
+def grep_text(
+    text: str, pattern: str, flags: int = 0
+) -> List[Tuple[int, str]]:
+    """
+    Lines of a text which match a regular expression
+
+    Returns:
+        A list of `(line_number, line)` tuples.
+    """
+    regex = re.compile(pattern, flags)
+    return [
+        (lineno, line)
+        for lineno, line in enumerate(text.splitlines(), start=1)
+        if regex.search(line)
+    ]
+
+
+def grep_archive(
+    path: Path,
+    pattern: str,
+    flags: int = 0,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+) -> List[Tuple[str, int, str]]:
+    """
+    Lines of the members of a zip archive which match a regular expression
+
+    Members are decompressed while being read, without extracting them to
+    disk.
+
+    Returns:
+        A list of `(member_name, line_number, line)` tuples.
+    """
+    regex = re.compile(pattern, flags)
+    matches = []
+    with ZipFile(path) as zipfile:
+        for member in select_members(zipfile.infolist(), include, exclude):
+            with zipfile.open(member) as f:
+                lines = io.TextIOWrapper(f, encoding="utf-8", errors="replace")
+                for lineno, line in enumerate(lines, start=1):
+                    if regex.search(line):
+                        matches.append(
+                            (member.filename, lineno, line.rstrip("\r\n"))
+                        )
+    return matches
@@ -0,0 +1,153 @@
+"""
+Local index of the names of projects, datasets and workflows
+
+The index maps names to IDs within scopes, which are synced with the server
+independently of each other:
+    * `projects`: all the projects of the user;
+    * `datasets/<project_id>`: the datasets of a project;
+    * `workflows/<project_id>`: the workflows of a project.
+
+It is stored in `FRACTAL_CACHE_PATH/name-index`, in one file per server and
+user, and is only parsed again when another process updated it.
+"""
+import json
+import time
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from .cache import atomic_write
+from .cache import cache_namespace
+from .cache import FileLock
+from .cache import get_cache_dir
+from .config import settings
+
+
+# Format of the index file, bumped on incompatible changes
+INDEX_VERSION = 1
+
+
+class NameResolutionError(Exception):
+    """
+    A name (of a project, dataset, workflow or task) given in place of an ID
+    could not be resolved
+    """
+
+
+class NameNotFoundError(NameResolutionError, KeyError):
+    pass
+
+
+class AmbiguousNameError(NameResolutionError, ValueError):
+    pass
+
+
+# In-memory indices, with the modification time of their file
+_loaded: Dict[Path, Tuple[int, "NameIndex"]] = {}
+
+
+def _read_scopes(path: Path) -> Dict[str, Dict[str, Any]]:
+    try:
+        data = json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+    if data.get("index_version") != INDEX_VERSION:
+        return {}
+    return data["scopes"]
+
+
+class NameIndex:
+    def __init__(self, path: Path, scopes: Dict[str, Dict[str, Any]]):
+        self.path = path
+        self.scopes = scopes
+
+    @classmethod
+    def load(cls, server: str, username: str) -> "NameIndex":
+        """
+        Load the index of a user on a server (empty, if missing)
+        """
+        path = get_cache_dir("name-index") / cache_namespace(server, username)
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return cls(path, {})
+        if path in _loaded and _loaded[path][0] == mtime:
+            return _loaded[path][1]
+        index = cls(path, _read_scopes(path))
+        _loaded[path] = (mtime, index)
+        return index
+
+    def age(self, scope: str) -> float:
+        """
+        Seconds since the last sync of a scope (infinite, if never synced)
+        """
+        if scope not in self.scopes:
+            return float("inf")
+        return time.time() - self.scopes[scope]["synced_at"]
+
+    def ids(self, scope: str) -> List[int]:
+        """
+        IDs of all the objects of a scope
+        """
+        if scope not in self.scopes:
+            return []
+        return sorted(
+            {id for ids in self.scopes[scope]["names"].values() for id in ids}
+        )
+
+    def lookup(self, scope: str, name: str) -> List[int]:
+        """
+        IDs of the objects of a scope with the given name
+        """
+        if scope not in self.scopes:
+            return []
+        return self.scopes[scope]["names"].get(name, [])
+
+    async def update(
+        self, scopes: Dict[str, List[Dict[str, Any]]]
+    ) -> "NameIndex":
+        """
+        Replace some scopes with the objects just fetched from the server
+
+        Scopes which are not updated are preserved, including those updated
+        by other processes in the meantime.
+        """
+        now = time.time()
+        async with self.lock:
+            merged = _read_scopes(self.path)
+            for scope, objects in scopes.items():
+                names: Dict[str, List[int]] = {}
+                for obj in objects:
+                    names.setdefault(obj["name"], []).append(obj["id"])
+                merged[scope] = dict(synced_at=now, names=names)
+            return self._write(merged)
+
+    async def invalidate(self, *prefixes: str) -> "NameIndex":
+        """
+        Drop the scopes whose name starts with any of the prefixes, e.g.
+        after objects in them were created, renamed or deleted
+        """
+        async with self.lock:
+            scopes = {
+                scope: value
+                for scope, value in _read_scopes(self.path).items()
+                if not scope.startswith(prefixes)
+            }
+            return self._write(scopes)
+
+    @property
+    def lock(self) -> FileLock:
+        return FileLock(self.path.with_name(f"{self.path.name}.lock"))
+
+    def _write(self, scopes: Dict[str, Dict[str, Any]]) -> "NameIndex":
+        data = dict(index_version=INDEX_VERSION, scopes=scopes)
+        atomic_write(self.path, json.dumps(data))
+        index = NameIndex(self.path, scopes)
+        _loaded[self.path] = (self.path.stat().st_mtime_ns, index)
+        return index
+
+
+def get_name_index(username: str) -> NameIndex:
+    return NameIndex.load(settings.FRACTAL_SERVER, username)
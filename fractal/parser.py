@@ -13,6 +13,41 @@ Institute for Biomedical Research and Pelkmans Lab from the University of
 Zurich.
 """
 import argparse as ap
+from typing import List
+
+
+class LazySubParsersAction(ap._SubParsersAction):
+    """
+    Subparsers action that only populates the selected subparser
+
+    Each command group registers a builder function, which adds the group
+    arguments and subcommands to an (initially empty) parser. Builders only
+    run when the corresponding command is actually invoked, so that parsing
+    e.g. `fractal job status 1` does not pay for building the whole tree.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._builders = {}
+
+    def add_lazy_parser(self, name, builder, **kwargs):
+        parser = self.add_parser(name, **kwargs)
+        self._builders[name] = builder
+        return parser
+
+    def build(self, name):
+        builder = self._builders.pop(name, None)
+        if builder is not None:
+            builder(self._name_parser_map[name])
+        return self._name_parser_map[name]
+
+    def build_all(self):
+        for name in list(self._builders):
+            self.build(name)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        self.build(values[0])
+        super().__call__(parser, namespace, values, option_string)
 
 
 parser_main = ap.ArgumentParser(description="Fractal Analytics Framework")
@@ -48,448 +83,817 @@ parser_main.add_argument(
     action="store_true",
     help="Output raw json",
 )
-
-subparsers_main = parser_main.add_subparsers(title="Commands:", dest="cmd")
-
-# REGISTER GROUP
-register_parser = subparsers_main.add_parser(
-    "register", help="Register with the Fractal server"
-)
-register_parser.add_argument("email", help="Email to be used as username")
-register_parser.add_argument(
-    "slurm_user", help="Username to login into Slurm cluster"
-)
-register_parser.add_argument(
-    "-p",
-    "--password",
-    help=("Password for the new user"),
-)
-# PROJECT GROUP
-project_parser = subparsers_main.add_parser("project", help="project commands")
-project_subparsers = project_parser.add_subparsers(
-    title="Valid subcommands:", dest="subcmd", required=True
-)
-
-# project new
-project_new_parser = project_subparsers.add_parser(
-    "new", help="Create new project"
+parser_main.add_argument(
+    "--no-daemon",
+    default=False,
+    action="store_true",
+    help="Run the command in-process, even if a `fractal daemon` is running",
 )
-project_new_parser.add_argument("name", help="Name of new project", type=str)
-project_new_parser.add_argument(
-    "path",
+parser_main.add_argument(
+    "--no-cache",
+    default=False,
+    action="store_true",
     help=(
-        "Project directory of new project. "
-        "New datasets will be written here."
+        "Fetch all responses from the server, bypassing the HTTP cache and "
+        "the cache of job archives"
     ),
 )
-project_new_parser.add_argument(
-    "-d",
-    "--dataset",
+parser_main.add_argument(
+    "--output",
+    choices=["table", "json", "ndjson", "csv"],
     help=(
-        "Name of new dataset to create. "
-        "By default, the dataset `default` is created."
+        "Output format. `json`, `ndjson` and `csv` write raw records, which "
+        "is faster for large outputs and suitable for tools like `jq`"
     ),
 )
 
-# project list
-project_list_parser = project_subparsers.add_parser(
-    "list", help="List projects"
-)
-
-# project show
-project_show_parser = project_subparsers.add_parser(
-    "show", help="Show details of a single project"
-)
-project_show_parser.add_argument(
-    "project_id", type=int, help="Id of project to show"
+http_group = parser_main.add_argument_group(
+    "HTTP options",
+    "Override the FRACTAL_* settings of the same name (timeouts in seconds)",
 )
+http_group.add_argument(
+    "--http2",
+    default=None,
+    action="store_true",
+    help="Use HTTP/2, if the server supports it (requires the `h2` package)",
+)
+http_group.add_argument("--max-connections", type=int)
+http_group.add_argument("--max-keepalive-connections", type=int)
+http_group.add_argument("--keepalive-expiry", type=float)
+http_group.add_argument("--connect-timeout", type=float)
+http_group.add_argument("--read-timeout", type=float)
+http_group.add_argument("--write-timeout", type=float)
+http_group.add_argument("--pool-timeout", type=float)
+
+subparsers_main = parser_main.add_subparsers(
+    title="Commands:", dest="cmd", action=LazySubParsersAction
+)
+
+
+def _comma_separated(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _add_fields_arg(read_parser):
+    read_parser.add_argument(
+        "--fields",
+        type=_comma_separated,
+        help=(
+            "Comma-separated fields to show (e.g. `id,status`). Only these "
+            "are requested from the server, and wide fields such as logs are "
+            "never loaded unless listed"
+        ),
+    )
+
+
+def _add_ids_args(read_parser, dest: str, help: str):
+    read_parser.add_argument(
+        dest,
+        nargs="*",
+        default=[],
+        metavar=dest[:-1],
+        help=f"{help}. Ranges of IDs such as `100-180` are accepted as well",
+    )
+    read_parser.add_argument(
+        "--from-file", help="File with more IDs or names, one per line"
+    )
+
+
+def _add_pagination_args(list_parser):
+    list_parser.add_argument(
+        "--limit", type=int, help="Maximum number of records to list"
+    )
+    list_parser.add_argument(
+        "--offset",
+        type=int,
+        default=0,
+        help="Number of records to skip (default: 0)",
+    )
+    list_parser.add_argument(
+        "--page-size",
+        type=int,
+        help="Records fetched per request (default: FRACTAL_PAGE_SIZE)",
+    )
 
 
-# project delete
-project_delete_parser = project_subparsers.add_parser(
-    "delete", help="Delete project"
-)
-
-# project add-dataset
-project_add_dataset_parser = project_subparsers.add_parser(
-    "add-dataset", help="Add dataset to project"
-)
-project_add_dataset_parser.add_argument(
-    "project_id", type=int, help="Id of project to add the new dataset to"
-)
-project_add_dataset_parser.add_argument(
-    "dataset_name", help="Name of new dataset"
-)
-project_add_dataset_parser.add_argument(
-    "--metadata",
-    help="Path to file containing dataset metadata in JSON format.",
-)
+# REGISTER GROUP
+def _build_register(register_parser):
+    register_parser.add_argument("email", help="Email to be used as username")
+    register_parser.add_argument(
+        "slurm_user", help="Username to login into Slurm cluster"
+    )
+    register_parser.add_argument(
+        "-p",
+        "--password",
+        help=("Password for the new user"),
+    )
 
 
-# DATASET GROUP
-dataset_parser = subparsers_main.add_parser("dataset", help="dataset commands")
-dataset_subparsers = dataset_parser.add_subparsers(
-    title="Valid subcommands:", dest="subcmd", required=True
+subparsers_main.add_lazy_parser(
+    "register", _build_register, help="Register with the Fractal server"
 )
 
-# dataset add-resource
-dataset_add_resource_parser = dataset_subparsers.add_parser(
-    "add-resource", help="Add resource to existing dataset"
-)
-dataset_add_resource_parser.add_argument(
-    "project_id", type=int, help="Project id"
-)
-dataset_add_resource_parser.add_argument(
-    "dataset_id", type=int, help="Dataset id"
-)
-dataset_add_resource_parser.add_argument("path", help="Path to resource")
-dataset_add_resource_parser.add_argument(
-    "-g", "--glob-pattern", help="Glob pattern"
-)
 
-# dataset add-resource
-dataset_rm_resource_parser = dataset_subparsers.add_parser(
-    "rm-resource", help="Remove resource to existing dataset"
-)
-dataset_rm_resource_parser.add_argument(
-    "project_id", type=int, help="Project id"
-)
-dataset_rm_resource_parser.add_argument(
-    "dataset_id", type=int, help="Dataset id"
-)
-dataset_rm_resource_parser.add_argument(
-    "resource_id", type=int, help="Resource id"
+# PROJECT GROUP
+def _build_project(project_parser):
+    project_subparsers = project_parser.add_subparsers(
+        title="Valid subcommands:", dest="subcmd", required=True
+    )
+
+    # project new
+    project_new_parser = project_subparsers.add_parser(
+        "new", help="Create new project"
+    )
+    project_new_parser.add_argument(
+        "name", help="Name of new project", type=str
+    )
+    project_new_parser.add_argument(
+        "path",
+        help=(
+            "Project directory of new project. "
+            "New datasets will be written here."
+        ),
+    )
+    project_new_parser.add_argument(
+        "-d",
+        "--dataset",
+        help=(
+            "Name of new dataset to create. "
+            "By default, the dataset `default` is created."
+        ),
+    )
+
+    # project list
+    project_list_parser = project_subparsers.add_parser(
+        "list", help="List projects"
+    )
+    _add_pagination_args(project_list_parser)
+    _add_fields_arg(project_list_parser)
+
+    # project show
+    project_show_parser = project_subparsers.add_parser(
+        "show", help="Show details of a single project"
+    )
+    project_show_parser.add_argument(
+        "project_id", help="ID or name of project to show"
+    )
+    _add_fields_arg(project_show_parser)
+
+    # project delete
+    project_subparsers.add_parser("delete", help="Delete project")
+
+    # project add-dataset
+    project_add_dataset_parser = project_subparsers.add_parser(
+        "add-dataset", help="Add dataset to project"
+    )
+    project_add_dataset_parser.add_argument(
+        "project_id", help="ID or name of project to add the new dataset to"
+    )
+    project_add_dataset_parser.add_argument(
+        "dataset_name", help="Name of new dataset"
+    )
+    project_add_dataset_parser.add_argument(
+        "--metadata",
+        help="Path to file containing dataset metadata in JSON format.",
+    )
+
+
+subparsers_main.add_lazy_parser(
+    "project", _build_project, help="project commands"
 )
 
-# dataset edit
-dataset_edit_parser = dataset_subparsers.add_parser(
-    "edit", help="Edit dataset", argument_default=ap.SUPPRESS
-)
-dataset_edit_parser.add_argument("project_id", type=int, help="Project id")
-dataset_edit_parser.add_argument("dataset_id", type=int, help="Dataset id")
-dataset_edit_parser.add_argument("--name", help="New name of dataset")
-dataset_edit_parser.add_argument("--path", help="New path of dataset")
-dataset_edit_parser.add_argument(
-    "--metadata",
-    help=(
-        "Path to file containing dataset metadata in JSON format. "
-        "(Set to `none` to clear)"
-    ),
-)
-dataset_edit_parser.add_argument(
-    "--read-only",
-    dest="read_only",
-    help="Set read-only flag of dataset",
-    action="store_true",
-)
-dataset_edit_parser.add_argument(
-    "--read-write",
-    dest="read_only",
-    help="Set read-only flag of dataset (0 for False, 1 for True)",
-    action="store_false",
-)
-dataset_edit_parser.add_argument("-t", "--type", help="Dataset type")
 
-# dataset show
-dataset_show_parser = dataset_subparsers.add_parser(
-    "show", help="Show dataset", argument_default=ap.SUPPRESS
+# DATASET GROUP
+def _build_dataset(dataset_parser):
+    dataset_subparsers = dataset_parser.add_subparsers(
+        title="Valid subcommands:", dest="subcmd", required=True
+    )
+
+    # dataset add-resource
+    dataset_add_resource_parser = dataset_subparsers.add_parser(
+        "add-resource", help="Add resource to existing dataset"
+    )
+    dataset_add_resource_parser.add_argument(
+        "project_id", help="Project ID or name"
+    )
+    dataset_add_resource_parser.add_argument(
+        "dataset_id", help="Dataset ID or name"
+    )
+    dataset_add_resource_parser.add_argument("path", help="Path to resource")
+    dataset_add_resource_parser.add_argument(
+        "-g", "--glob-pattern", help="Glob pattern"
+    )
+
+    # dataset add-resource
+    dataset_rm_resource_parser = dataset_subparsers.add_parser(
+        "rm-resource", help="Remove resource to existing dataset"
+    )
+    dataset_rm_resource_parser.add_argument(
+        "project_id", help="Project ID or name"
+    )
+    dataset_rm_resource_parser.add_argument(
+        "dataset_id", help="Dataset ID or name"
+    )
+    dataset_rm_resource_parser.add_argument(
+        "resource_id", type=int, help="Resource id"
+    )
+
+    # dataset edit
+    dataset_edit_parser = dataset_subparsers.add_parser(
+        "edit", help="Edit dataset", argument_default=ap.SUPPRESS
+    )
+    dataset_edit_parser.add_argument("project_id", help="Project ID or name")
+    dataset_edit_parser.add_argument("dataset_id", help="Dataset ID or name")
+    dataset_edit_parser.add_argument("--name", help="New name of dataset")
+    dataset_edit_parser.add_argument("--path", help="New path of dataset")
+    dataset_edit_parser.add_argument(
+        "--metadata",
+        help=(
+            "Path to file containing dataset metadata in JSON format. "
+            "(Set to `none` to clear)"
+        ),
+    )
+    dataset_edit_parser.add_argument(
+        "--read-only",
+        dest="read_only",
+        help="Set read-only flag of dataset",
+        action="store_true",
+    )
+    dataset_edit_parser.add_argument(
+        "--read-write",
+        dest="read_only",
+        help="Set read-only flag of dataset (0 for False, 1 for True)",
+        action="store_false",
+    )
+    dataset_edit_parser.add_argument("-t", "--type", help="Dataset type")
+
+    # dataset show
+    dataset_show_parser = dataset_subparsers.add_parser(
+        "show",
+        help="Show one or more datasets",
+        argument_default=ap.SUPPRESS,
+    )
+    dataset_show_parser.add_argument("project_id", help="Project ID or name")
+    _add_ids_args(dataset_show_parser, "dataset_ids", "Dataset ID or name")
+    _add_fields_arg(dataset_show_parser)
+
+
+subparsers_main.add_lazy_parser(
+    "dataset", _build_dataset, help="dataset commands"
 )
-dataset_show_parser.add_argument("project_id", type=int, help="Project id")
-dataset_show_parser.add_argument("dataset_id", type=int, help="Dataset id")
 
 
 # TASK GROUP
-task_parser = subparsers_main.add_parser("task", help="task commands")
-task_subparsers = task_parser.add_subparsers(
-    title="Valid subcommands:", dest="subcmd", required=True
-)
+def _build_task(task_parser):
+    task_subparsers = task_parser.add_subparsers(
+        title="Valid subcommands:", dest="subcmd", required=True
+    )
+
+    # task list
+    task_list_parser = task_subparsers.add_parser("list", help="List tasks")
+    _add_pagination_args(task_list_parser)
+    _add_fields_arg(task_list_parser)
+
+    # task collect
+    task_collect_parser = task_subparsers.add_parser(
+        "collect",
+        help="Install and collect all tasks a pip installable package exposes",
+    )
+    task_collect_parser.add_argument(
+        "package",
+        help="Package name or path to local package",
+    )
+    task_collect_parser.add_argument(
+        "--python-version",
+        help="Select the python version to use for this package",
+    )
+    task_collect_parser.add_argument(
+        "--package-version",
+        help="Select the package version",
+    )
+    task_collect_parser.add_argument(
+        "--package-extras",
+        help=(
+            "Comma separated list of extra components for the package to "
+            "be installed, e.g., `collect fractal-tasks-core "
+            "--package-extras=torch,tensorflow` will trigger the "
+            "installation of `fractal-tasks-core[torch,tensorflow]`"
+        ),
+    )
+    task_collect_parser.add_argument(
+        "--private",
+        default=False,
+        action="store_true",
+        help="Intall tasks as private to the user (as opposed to global)",
+    )
+
+    # task check-collection
+    task_check_collection_parser = task_subparsers.add_parser(
+        "check-collection",
+        help="Check status of background task collection processes",
+    )
+    task_check_collection_parser.add_argument(
+        "state_id",
+        help="State ID of the collection (see output of task collect)",
+    )
+    task_check_collection_parser.add_argument(
+        "--verbose",
+        default=False,
+        action="store_true",
+        help="Output more verbose output",
+    )
+
+    # task edit
+    task_edit_parser = task_subparsers.add_parser(
+        "edit", help="Edit task", argument_default=ap.SUPPRESS
+    )
+    task_edit_parser.add_argument(
+        "task_id_or_name",
+        help="ID, name or name@version of task to edit",
+        type=str,
+    )
+    task_edit_parser.add_argument("--name", help="New task name")
+    task_edit_parser.add_argument(
+        "--resource-type",
+        choices=["task", "workflow"],
+        help="New resource type",
+    )
+    task_edit_parser.add_argument(
+        "--input-type",
+        help="New input type",
+    )
+    task_edit_parser.add_argument(
+        "--output-type",
+        help="New resource type",
+    )
+    task_edit_parser.add_argument(
+        "--default-args",
+        help="Filename containing JSON encoded default arguments",
+    )
+
+
+subparsers_main.add_lazy_parser("task", _build_task, help="task commands")
 
-# task list
-task_list_parser = task_subparsers.add_parser("list", help="List tasks")
-
-# task collect
-task_collect_parser = task_subparsers.add_parser(
-    "collect",
-    help="Install and collect all tasks a pip installable package exposes",
-)
-task_collect_parser.add_argument(
-    "package",
-    help="Package name or path to local package",
-)
-task_collect_parser.add_argument(
-    "--python-version",
-    help="Select the python version to use for this package",
-)
-task_collect_parser.add_argument(
-    "--package-version",
-    help="Select the package version",
-)
-task_collect_parser.add_argument(
-    "--package-extras",
-    help=(
-        "Comma separated list of extra components for the package to be "
-        "installed, e.g., `collect fractal-tasks-core "
-        "--package-extras=torch,tensorflow` will trigger the installation of "
-        "`fractal-tasks-core[torch,tensorflow]`"
-    ),
-)
-task_collect_parser.add_argument(
-    "--private",
-    default=False,
-    action="store_true",
-    help="Intall tasks as private to the user (as opposed to global)",
-)
-
-# task check-collection
-task_check_collection_parser = task_subparsers.add_parser(
-    "check-collection",
-    help="Check status of background task collection processes",
-)
-task_check_collection_parser.add_argument(
-    "state_id",
-    help="State ID of the collection (see output of task collect)",
-)
-task_check_collection_parser.add_argument(
-    "--verbose",
-    default=False,
-    action="store_true",
-    help="Output more verbose output",
-)
-
-
-# task edit
-task_edit_parser = task_subparsers.add_parser(
-    "edit", help="Edit task", argument_default=ap.SUPPRESS
-)
-task_edit_parser.add_argument(
-    "task_id_or_name", help="ID or name of task to edit", type=str
-)
-task_edit_parser.add_argument("--name", help="New task name")
-task_edit_parser.add_argument(
-    "--resource-type",
-    choices=["task", "workflow"],
-    help="New resource type",
-)
-task_edit_parser.add_argument(
-    "--input-type",
-    help="New input type",
-)
-task_edit_parser.add_argument(
-    "--output-type",
-    help="New resource type",
-)
-task_edit_parser.add_argument(
-    "--default-args", help="Filename containing JSON encoded default arguments"
-)
 
 # WORKFLOW GROUP
-
-# workflow new
-workflow_parser = subparsers_main.add_parser(
-    "workflow", help="workflow commands"
-)
-workflow_subparsers = workflow_parser.add_subparsers(
-    title="Valid subcommand", dest="subcmd", required=True
-)
-workflow_new_parser = workflow_subparsers.add_parser(
-    "new", help="Create new workflow"
-)
-workflow_new_parser.add_argument(
-    "name",
-    help="Workflow name (must be unique, and not only made of numbers only)",
-)
-workflow_new_parser.add_argument(
-    "project_id",
-    help="Project ID",
-)
-
-# workflow list
-workflow_list_parser = workflow_subparsers.add_parser(
-    "list", help="List workflows for given project"
-)
-workflow_list_parser.add_argument(
-    "project_id",
-    help="Project ID",
-)
-
-# workflow delete
-workflow_new_parser = workflow_subparsers.add_parser(
-    "delete", help="Delete workflow"
-)
-workflow_new_parser.add_argument(
-    "id",
-    help="Workflow id",
-)
-
-# workflow show
-workflow_new_parser = workflow_subparsers.add_parser(
-    "show", help="Show a workflow"
-)
-workflow_new_parser.add_argument(
-    "id",
-    help="Workflow id",
-)
-
-# workflow add task
-workflow_add_task_parser = workflow_subparsers.add_parser(
-    "add-task", help="Add a new task to a specific workflow"
-)
-workflow_add_task_parser.add_argument(
-    "id",
-    help="Workflow id",
-)
-workflow_add_task_parser.add_argument(
-    "task_id_or_name", help="ID or name of the new task", type=str
-)
-workflow_add_task_parser.add_argument(
-    "--order", help="Order of this task within the workflow's task list"
-)
-workflow_add_task_parser.add_argument(
-    "--args-file",
-    help=(
-        "Path to a json serialised file containing the arguments "
-        "ovverrides of the task"
-    ),
-)
-workflow_add_task_parser.add_argument(
-    "--meta-file",
-    help=(
-        "Path to a json serialised file containing the meta"
-        "ovverrides of the task"
-    ),
-)
-
-
-# workflow edit task
-workflow_edit_task_parser = workflow_subparsers.add_parser(
-    "edit-task", help="Edit a task within a specific workflow"
-)
-workflow_edit_task_parser.add_argument(
-    "id",
-    help="Workflow id",
-)
-workflow_edit_task_parser.add_argument(
-    "workflow_task_id",
-    help="Workflow task Id, the Id of a task inside the list of tasks",
-)
-workflow_edit_task_parser.add_argument(
-    "--args-file",
-    help=(
-        "Path to a json serialised file containing the arguments "
-        "ovverrides of the task"
-    ),
-)
-workflow_edit_task_parser.add_argument(
-    "--meta-file",
-    help=(
-        "Path to a json serialised file containing the meta"
-        "ovverrides of the task"
-    ),
-)
-
-
-# workflow remove task
-workflow_remove_task_parser = workflow_subparsers.add_parser(
-    "rm-task", help="Remove a task in a specific workflow"
-)
-workflow_remove_task_parser.add_argument(
-    "id",
-    help="Workflow id",
-)
-workflow_remove_task_parser.add_argument(
-    "workflow_task_id",
-    help="Workflow task Id, the Id of a task inside the list of tasks",
-)
-
-# workflow edit
-workflow_edit_parser = workflow_subparsers.add_parser(
-    "edit", help="Edit workflow", argument_default=ap.SUPPRESS
-)
-workflow_edit_parser.add_argument(
-    "id",
-    help="Workflow id",
-)
-workflow_edit_parser.add_argument("--name", help="New workflow name")
-
-workflow_edit_parser.add_argument(
-    "--project-id",
-    help="Change the project associated with the current workflow",
-)
-
-# workflow apply
-workflow_apply_parser = workflow_subparsers.add_parser(
-    "apply", help="Apply workflow to dataset", argument_default=ap.SUPPRESS
-)
-workflow_apply_parser.add_argument("workflow_id")
-workflow_apply_parser.add_argument("input_dataset_id")
-workflow_apply_parser.add_argument(
-    "-o", "--output_dataset_id", help="Output dataset id"
-)
-workflow_apply_parser.add_argument(
-    "--overwrite-input",
-    default=False,
-    action="store_true",
-    help="Allow overwriting the content of the input dataset",
-)
-workflow_apply_parser.add_argument(
-    "-p",
-    "--project-id",
-    help="Id of project the workflow and dataset belong to",
-)
-workflow_apply_parser.add_argument(
-    "-w",
-    "--worker-init",
-    help="Command to be run before starting a worker",
+def _build_workflow(workflow_parser):
+    # workflow new
+    workflow_subparsers = workflow_parser.add_subparsers(
+        title="Valid subcommand", dest="subcmd", required=True
+    )
+    workflow_new_parser = workflow_subparsers.add_parser(
+        "new", help="Create new workflow"
+    )
+    workflow_new_parser.add_argument(
+        "name",
+        help=(
+            "Workflow name (must be unique, and not only made of numbers "
+            "only)"
+        ),
+    )
+    workflow_new_parser.add_argument(
+        "project_id",
+        help="Project ID or name",
+    )
+
+    # workflow list
+    workflow_list_parser = workflow_subparsers.add_parser(
+        "list", help="List workflows for given project"
+    )
+    workflow_list_parser.add_argument(
+        "project_id",
+        help="Project ID or name",
+    )
+    _add_pagination_args(workflow_list_parser)
+    _add_fields_arg(workflow_list_parser)
+
+    # workflow delete
+    workflow_new_parser = workflow_subparsers.add_parser(
+        "delete", help="Delete workflow"
+    )
+    workflow_new_parser.add_argument(
+        "id",
+        help="Workflow ID or name",
+    )
+
+    # workflow show
+    workflow_new_parser = workflow_subparsers.add_parser(
+        "show", help="Show one or more workflows"
+    )
+    _add_ids_args(workflow_new_parser, "ids", "Workflow ID or name")
+    _add_fields_arg(workflow_new_parser)
+
+    # workflow add task
+    workflow_add_task_parser = workflow_subparsers.add_parser(
+        "add-task", help="Add a new task to a specific workflow"
+    )
+    workflow_add_task_parser.add_argument(
+        "id",
+        help="Workflow ID or name",
+    )
+    workflow_add_task_parser.add_argument(
+        "task_id_or_name",
+        help="ID, name or name@version of the new task",
+        type=str,
+    )
+    workflow_add_task_parser.add_argument(
+        "--order", help="Order of this task within the workflow's task list"
+    )
+    workflow_add_task_parser.add_argument(
+        "--args-file",
+        help=(
+            "Path to a json serialised file containing the arguments "
+            "ovverrides of the task"
+        ),
+    )
+    workflow_add_task_parser.add_argument(
+        "--meta-file",
+        help=(
+            "Path to a json serialised file containing the meta"
+            "ovverrides of the task"
+        ),
+    )
+
+    # workflow edit task
+    workflow_edit_task_parser = workflow_subparsers.add_parser(
+        "edit-task", help="Edit a task within a specific workflow"
+    )
+    workflow_edit_task_parser.add_argument(
+        "id",
+        help="Workflow ID or name",
+    )
+    workflow_edit_task_parser.add_argument(
+        "workflow_task_id",
+        help="Workflow task Id, the Id of a task inside the list of tasks",
+    )
+    workflow_edit_task_parser.add_argument(
+        "--args-file",
+        help=(
+            "Path to a json serialised file containing the arguments "
+            "ovverrides of the task"
+        ),
+    )
+    workflow_edit_task_parser.add_argument(
+        "--meta-file",
+        help=(
+            "Path to a json serialised file containing the meta"
+            "ovverrides of the task"
+        ),
+    )
+
+    # workflow remove task
+    workflow_remove_task_parser = workflow_subparsers.add_parser(
+        "rm-task", help="Remove a task in a specific workflow"
+    )
+    workflow_remove_task_parser.add_argument(
+        "id",
+        help="Workflow ID or name",
+    )
+    workflow_remove_task_parser.add_argument(
+        "workflow_task_id",
+        help="Workflow task Id, the Id of a task inside the list of tasks",
+    )
+
+    # workflow edit
+    workflow_edit_parser = workflow_subparsers.add_parser(
+        "edit", help="Edit workflow", argument_default=ap.SUPPRESS
+    )
+    workflow_edit_parser.add_argument(
+        "id",
+        help="Workflow ID or name",
+    )
+    workflow_edit_parser.add_argument("--name", help="New workflow name")
+
+    workflow_edit_parser.add_argument(
+        "--project-id",
+        help="Change the project (ID or name) of the current workflow",
+    )
+
+    # workflow apply
+    workflow_apply_parser = workflow_subparsers.add_parser(
+        "apply", help="Apply workflow to dataset", argument_default=ap.SUPPRESS
+    )
+    workflow_apply_parser.add_argument(
+        "workflow_id", help="Workflow ID or name"
+    )
+    workflow_apply_parser.add_argument(
+        "input_dataset_id", help="Input dataset ID or name"
+    )
+    workflow_apply_parser.add_argument(
+        "-o", "--output_dataset_id", help="Output dataset ID or name"
+    )
+    workflow_apply_parser.add_argument(
+        "--overwrite-input",
+        default=False,
+        action="store_true",
+        help="Allow overwriting the content of the input dataset",
+    )
+    workflow_apply_parser.add_argument(
+        "-p",
+        "--project-id",
+        help="ID or name of project the workflow and dataset belong to",
+    )
+    workflow_apply_parser.add_argument(
+        "-w",
+        "--worker-init",
+        help="Command to be run before starting a worker",
+    )
+
+
+subparsers_main.add_lazy_parser(
+    "workflow", _build_workflow, help="workflow commands"
 )
 
 
 # JOB GROUP
-
-job_parser = subparsers_main.add_parser("job", help="job commands")
-job_subparsers = job_parser.add_subparsers(
-    title="Valid subcommand", dest="subcmd", required=True
-)
-
-# job list
-job_list_parser = job_subparsers.add_parser(
-    "list", help="List jobs for given project"
-)
-job_list_parser.add_argument(
-    "project_id",
-    help="Project ID",
-)
-
-# job status
-job_status_parser = job_subparsers.add_parser(
-    "status",
-    help="Query status of workflow-execution job",
-    argument_default=ap.SUPPRESS,
-)
-job_status_parser.add_argument(
-    "job_id",
-    help="Id of the job",
-)
-job_status_parser.add_argument(
-    "--do-not-separate-logs",
-    dest="do_not_separate_logs",
-    help="Show the job logs in the main output, instead of a separate field",
-    action="store_true",
-)
-
-# job download-logs
-job_download_logs_parser = job_subparsers.add_parser(
-    "download-logs",
-    help="Download full folder of workflow-execution job",
-)
-job_download_logs_parser.add_argument(
-    "job_id",
-    help="Id of the job",
-)
-job_download_logs_parser.add_argument(
-    "--output",
-    dest="output_folder",
-    help="Path of the output folder",
-    required=True,
+def _build_job(job_parser):
+    job_subparsers = job_parser.add_subparsers(
+        title="Valid subcommand", dest="subcmd", required=True
+    )
+
+    # job list
+    job_list_parser = job_subparsers.add_parser(
+        "list", help="List jobs for given project"
+    )
+    job_list_parser.add_argument(
+        "project_id",
+        help="Project ID or name",
+    )
+    _add_pagination_args(job_list_parser)
+    _add_fields_arg(job_list_parser)
+
+    # job status
+    job_status_parser = job_subparsers.add_parser(
+        "status",
+        help="Query status of one or more workflow-execution jobs",
+        argument_default=ap.SUPPRESS,
+    )
+    _add_ids_args(job_status_parser, "job_ids", "Id of the job")
+    job_status_parser.add_argument(
+        "--do-not-separate-logs",
+        dest="do_not_separate_logs",
+        help=(
+            "Show the job logs in the main output, instead of a separate "
+            "field"
+        ),
+        action="store_true",
+    )
+    _add_fields_arg(job_status_parser)
+    job_status_parser.add_argument(
+        "--tail",
+        type=int,
+        metavar="N",
+        help="Only show the last N lines of the job log",
+    )
+
+    # job logs
+    job_logs_parser = job_subparsers.add_parser(
+        "logs", help="Show the log of a workflow-execution job"
+    )
+    job_logs_parser.add_argument("job_id", help="Id of the job")
+    job_logs_parser.add_argument(
+        "-f",
+        "--follow",
+        action="store_true",
+        help=(
+            "Keep showing the lines appended to the log, until the job "
+            "finishes. Exit status is 0 if the job is done, 1 otherwise"
+        ),
+    )
+    job_logs_parser.add_argument(
+        "--tail",
+        type=int,
+        metavar="N",
+        help="Start from the last N lines of the log",
+    )
+
+    # job download-logs
+    job_download_logs_parser = job_subparsers.add_parser(
+        "download-logs",
+        help=(
+            "Download full folder of workflow-execution job, or of all the "
+            "jobs of a project"
+        ),
+    )
+    job_download_logs_parser.add_argument(
+        "job_id",
+        nargs="?",
+        help="Id of the job (unless using --project)",
+    )
+    job_download_logs_parser.add_argument(
+        "--output",
+        dest="output_folder",
+        help="Path of the output folder (required unless using --list)",
+    )
+    job_download_logs_parser.add_argument(
+        "--project",
+        dest="project_id",
+        help=(
+            "Project ID or name: download the logs of its jobs, each to a "
+            "`job_<id>` subfolder of the output folder, skipping those "
+            "already downloaded (the logs of jobs which are still submitted "
+            "or running go to `job_<id>.active` instead, and are downloaded "
+            "again each time)"
+        ),
+    )
+    job_download_logs_parser.add_argument(
+        "--status",
+        action="append",
+        choices=["submitted", "running", "done", "failed"],
+        help="Only download the logs of jobs with a given status (with "
+        "--project, can be repeated)",
+    )
+    job_download_logs_parser.add_argument(
+        "--include",
+        action="append",
+        metavar="PATTERN",
+        help=(
+            "Only extract the files matching a glob pattern, e.g. `*.err` "
+            "(can be repeated)"
+        ),
+    )
+    job_download_logs_parser.add_argument(
+        "--exclude",
+        action="append",
+        metavar="PATTERN",
+        help="Do not extract the files matching a glob pattern",
+    )
+    job_download_logs_parser.add_argument(
+        "--list",
+        dest="list_only",
+        action="store_true",
+        help="List the files in the archive, without extracting them",
+    )
+
+    # job wait
+    job_wait_parser = job_subparsers.add_parser(
+        "wait",
+        help=(
+            "Wait for jobs to finish. Exit status is 0 if all jobs are done, "
+            "1 if any failed, 2 on timeout and 3 if any could not be read"
+        ),
+    )
+    job_wait_parser.add_argument(
+        "job_ids", type=int, nargs="+", metavar="job_id", help="Id of a job"
+    )
+    job_wait_parser.add_argument(
+        "--timeout", type=float, help="Maximum time to wait (seconds)"
+    )
+
+    # job watch
+    job_watch_parser = job_subparsers.add_parser(
+        "watch",
+        help=(
+            "Wait for all the running jobs of a project to finish, including "
+            "jobs submitted in the meantime. Exit status as in `job wait`"
+        ),
+    )
+    job_watch_parser.add_argument(
+        "--project",
+        dest="project_id",
+        required=True,
+        help="Project ID or name",
+    )
+    job_watch_parser.add_argument(
+        "--timeout", type=float, help="Maximum time to wait (seconds)"
+    )
+
+    # job grep
+    job_grep_parser = job_subparsers.add_parser(
+        "grep",
+        help=(
+            "Search a regular expression in the logs of the jobs of a "
+            "project, printing matches as `job_id:file:line:text`"
+        ),
+    )
+    job_grep_parser.add_argument("pattern", help="Regular expression")
+    job_grep_parser.add_argument(
+        "--project",
+        dest="project_id",
+        required=True,
+        help="Project ID or name",
+    )
+    job_grep_parser.add_argument(
+        "--status",
+        action="append",
+        choices=["submitted", "running", "done", "failed"],
+        help="Only search the jobs with a given status (can be repeated)",
+    )
+    job_grep_parser.add_argument(
+        "--archives",
+        action="store_true",
+        help="Also search the files in the log archives of the jobs",
+    )
+    job_grep_parser.add_argument(
+        "--include",
+        action="append",
+        metavar="PATTERN",
+        help="Only search the archived files matching a glob pattern",
+    )
+    job_grep_parser.add_argument(
+        "--exclude",
+        action="append",
+        metavar="PATTERN",
+        help="Do not search the archived files matching a glob pattern",
+    )
+    job_grep_parser.add_argument(
+        "-i",
+        "--ignore-case",
+        action="store_true",
+        help="Ignore case distinctions",
+    )
+
+
+subparsers_main.add_lazy_parser("job", _build_job, help="job commands")
+
+
+# RUN-SCRIPT
+def _build_run_script(run_script_parser):
+    run_script_parser.add_argument(
+        "script_file",
+        help=(
+            "Path to a file with one fractal command per line (without the "
+            "leading `fractal`). A line can be labelled as `label = command`, "
+            "and later lines can refer to its output as `${label}` (or "
+            "`${label[i]}` for its i-th field). A `wait` line waits for all "
+            "previous commands to complete"
+        ),
+    )
+    run_script_parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=8,
+        help="Maximum number of commands running at the same time",
+    )
+
+
+subparsers_main.add_lazy_parser(
+    "run-script",
+    _build_run_script,
+    help="Run many commands from a file, through a single client",
+)
+
+
+# DEBUG GROUP
+def _build_debug(debug_parser):
+    debug_subparsers = debug_parser.add_subparsers(
+        title="Valid subcommand", dest="subcmd", required=True
+    )
+
+    # debug startup
+    debug_startup_parser = debug_subparsers.add_parser(
+        "startup",
+        help="Report the import-time breakdown of the client startup",
+    )
+    debug_startup_parser.add_argument(
+        "command",
+        nargs="?",
+        default="--batch job status 1",
+        help=(
+            "Quoted command line whose startup is profiled (the command is "
+            "only parsed and dispatched, not sent to the server). Default: "
+            "`%(default)s`"
+        ),
+    )
+    debug_startup_parser.add_argument(
+        "--limit",
+        type=int,
+        default=15,
+        help="Number of packages to include in the breakdown",
+    )
+
+    # debug task-cache
+    debug_subparsers.add_parser(
+        "task-cache",
+        help="Show the state of the registry used to resolve task names",
+    )
+
+
+subparsers_main.add_lazy_parser(
+    "debug", _build_debug, help="client diagnostics"
+)
+
+
+# DAEMON GROUP
+def _build_daemon(daemon_parser):
+    daemon_subparsers = daemon_parser.add_subparsers(
+        title="Valid subcommand", dest="subcmd", required=True
+    )
+    daemon_subparsers.add_parser(
+        "start",
+        help=(
+            "Serve fractal commands through a persistent authenticated "
+            "client (runs in the foreground, until `fractal daemon stop`)"
+        ),
+    )
+    daemon_subparsers.add_parser(
+        "status", help="Show the status of the running daemon"
+    )
+    daemon_subparsers.add_parser("stop", help="Stop the running daemon")
+
+
+subparsers_main.add_lazy_parser(
+    "daemon", _build_daemon, help="persistent client daemon"
 )
 
 
@@ -0,0 +1,92 @@
+"""
+Client-side limits on the load put on the server
+
+Requests are limited per host, both in the number of concurrent requests and
+in their rate (through a token bucket). Heavy endpoints, e.g. the download of
+job logs, have a separate and tighter budget, so that they cannot starve the
+other requests.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+from urllib.parse import urlsplit
+
+from .config import settings
+
+
+# URL path fragments of the endpoints with a separate budget
+HEAVY_ENDPOINTS = ["/job/download/"]
+
+
+class TokenBucket:
+    """
+    Allow `rate` acquisitions per second on average, with bursts of up to
+    `capacity`
+
+    Waiters are served in order of arrival.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _fill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._fill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._fill()
+            self.tokens -= 1
+
+
+class RequestLimiter:
+    """
+    Concurrency and rate limits, with one budget per host and endpoint class
+    """
+
+    def __init__(self):
+        self._limits: Dict[
+            Tuple[str, bool], Tuple[asyncio.Semaphore, Optional[TokenBucket]]
+        ] = {}
+
+    def _get_limits(
+        self, host: str, heavy: bool
+    ) -> Tuple[asyncio.Semaphore, Optional[TokenBucket]]:
+        key = (host, heavy)
+        if key not in self._limits:
+            if heavy:
+                concurrency = settings.FRACTAL_MAX_CONCURRENT_DOWNLOADS
+                rate = settings.FRACTAL_DOWNLOADS_PER_SECOND
+            else:
+                concurrency = settings.FRACTAL_MAX_CONCURRENT_REQUESTS
+                rate = settings.FRACTAL_REQUESTS_PER_SECOND
+            bucket = TokenBucket(rate) if rate > 0 else None
+            self._limits[key] = (asyncio.Semaphore(concurrency), bucket)
+        return self._limits[key]
+
+    @asynccontextmanager
+    async def __call__(self, url: str):
+        """
+        Wait for a slot to send a request to `url`, and hold it until the
+        request is complete
+        """
+        parts = urlsplit(str(url))
+        heavy = any(path in parts.path for path in HEAVY_ENDPOINTS)
+        semaphore, bucket = self._get_limits(parts.netloc, heavy)
+        async with semaphore:
+            if bucket is not None:
+                await bucket.acquire()
+            yield
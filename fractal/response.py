@@ -1,16 +1,46 @@
+import gzip
 import logging
 from json.decoder import JSONDecodeError
 from sys import exit
+from typing import Any
+from typing import List
+from typing import Optional
 
 
-def check_response(res, expected_status_code=200, coerce=False):
+def select_fields(data: Any, fields: Optional[List[str]]) -> Any:
+    """
+    Keep only the given top-level fields of a record, or of each record of a
+    list
+    """
+    if fields is None:
+        return data
+    if isinstance(data, list):
+        return [select_fields(record, fields) for record in data]
+    return {field: data[field] for field in fields if field in data}
+
+
+def _request_payload(request) -> str:
+    """
+    Body of a request, as text, whether or not it was compressed
+    """
+    content = request.content
+    if request.headers.get("Content-Encoding") == "gzip":
+        try:
+            content = gzip.decompress(content)
+        except OSError:
+            pass
+    return content.decode("utf-8", errors="replace")
+
+
+def check_response(res, expected_status_code=200, coerce=False, fields=None):
     """
     Check the validity of the http response from fractal server
 
     If the status code of the response is not one of the expected values, print
     the error to stderr and terminate with exit status 1.
 
-    On success, optionally coerce to a pydantic model
+    On success, optionally coerce to a pydantic model. If `fields` are given,
+    only those are kept, and the (partial) data is never coerced.
     """
 
     # Also allow a list of expected status codes
@@ -29,13 +59,13 @@ def check_response(res, expected_status_code=200, coerce=False):
         logging.error(
             f"Original request: {res._request.method} {res._request.url}"
         )
-        logging.error(
-            f"Original payload: {res._request._content.decode('utf-8')}"
-        )
+        logging.error(f"Original payload: {_request_payload(res._request)}")
         logging.error(f"Server error message: {data}\n")
         logging.error("Terminating.\n")
         exit(1)
 
+    if fields is not None:
+        return select_fields(data, fields)
     if coerce:
         return coerce(**data)
     else:
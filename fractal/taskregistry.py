@@ -0,0 +1,161 @@
+"""
+Local registry of the tasks available on a server
+
+Tasks are identified by `(name, version, source)`, so that several versions
+of the same package can be collected side by side, and can be referred to as
+`name` (if unique) or `name@version`. The registry is stored in
+`FRACTAL_CACHE_PATH/task-registry`, in one file per server and user, and is
+only parsed again when another process updated it. The modification time of
+the file is the time of the last sync with the server.
+"""
+import json
+import os
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .cache import atomic_write
+from .cache import cache_namespace
+from .cache import FileLock
+from .cache import get_cache_dir
+from .config import settings
+from .nameindex import AmbiguousNameError
+from .nameindex import NameNotFoundError
+
+
+# Format of the registry file, bumped on incompatible changes
+REGISTRY_VERSION = 1
+
+# In-memory registries, with the modification time of their file
+_loaded: Dict[Path, Tuple[int, "TaskRegistry"]] = {}
+
+# Outcomes of the task lookups of this process: `hits`, `misses` (which
+# trigger a sync) and `negative_hits` (misses right after a sync, which are
+# not synced again)
+stats: Counter = Counter()
+
+
+def task_version(task: Dict[str, Any]) -> Optional[str]:
+    """
+    Version of a task, as set by the server or as found in its source
+
+    Tasks collected with pip have a source like `pip:package==1.2.3` or
+    `pip-local:package-1.2.3-py3-none-any.whl`.
+    """
+    if task.get("version"):
+        return task["version"]
+    kind, _, spec = task.get("source", "").partition(":")
+    if kind == "pip" and "==" in spec:
+        return spec.split("==")[1]
+    if kind == "pip-local" and spec.count("-") >= 1:
+        return spec.split("-")[1]
+    return None
+
+
+class TaskRegistry:
+    def __init__(
+        self, path: Path, tasks: List[Dict[str, Any]], synced_at: float = 0
+    ):
+        self.path = path
+        self.tasks = tasks
+        self.synced_at = synced_at
+        self.index: Dict[str, List[Dict[str, Any]]] = {}
+        for task in tasks:
+            self.index.setdefault(task["name"], []).append(task)
+
+    @classmethod
+    def load(cls, server: str, username: str) -> "TaskRegistry":
+        """
+        Load the registry of a user on a server (empty, if missing)
+        """
+        folder = get_cache_dir("task-registry")
+        path = folder / cache_namespace(server, username)
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return cls(path, [])
+        if path in _loaded and _loaded[path][0] == mtime:
+            return _loaded[path][1]
+        try:
+            data = json.loads(path.read_text())
+        except ValueError:
+            data = {}
+        if data.get("registry_version") != REGISTRY_VERSION:
+            return cls(path, [])
+        registry = cls(path, data["tasks"], synced_at=mtime / 1e9)
+        _loaded[path] = (mtime, registry)
+        return registry
+
+    @property
+    def age(self) -> float:
+        """
+        Seconds since the last sync
+        """
+        return time.time() - self.synced_at
+
+    @property
+    def lock(self) -> FileLock:
+        return FileLock(self.path.with_name(f"{self.path.name}.lock"))
+
+    def sync(self, task_list: List[Dict[str, Any]]) -> "TaskRegistry":
+        """
+        Bring the registry in line with the task list of the server
+
+        The file is only rewritten if the task list changed, otherwise it is
+        just marked as synced.
+        """
+        tasks = [
+            dict(
+                id=task["id"],
+                name=task["name"],
+                version=task_version(task),
+                source=task["source"],
+            )
+            for task in task_list
+        ]
+        if tasks == self.tasks and self.path.exists():
+            os.utime(self.path)
+        else:
+            data = dict(registry_version=REGISTRY_VERSION, tasks=tasks)
+            atomic_write(self.path, json.dumps(data, indent=4))
+        mtime = self.path.stat().st_mtime_ns
+        registry = TaskRegistry(self.path, tasks, synced_at=mtime / 1e9)
+        _loaded[self.path] = (mtime, registry)
+        return registry
+
+    def lookup(self, reference: str) -> int:
+        """
+        ID of the task referred to as `name` or `name@version`
+
+        Raises:
+            NameNotFoundError: If no task matches the reference.
+            AmbiguousNameError: If more than one task matches the reference.
+        """
+        name, version = reference, None
+        if reference not in self.index and "@" in reference:
+            name, version = reference.rsplit("@", 1)
+        candidates = self.index.get(name, [])
+        if version is not None:
+            candidates = [t for t in candidates if t["version"] == version]
+        if not candidates:
+            raise NameNotFoundError(f'Task "{reference}" not in {self.path}')
+        if len(candidates) > 1:
+            matches = ", ".join(
+                f"{t['name']}@{t['version']} (id={t['id']}, "
+                f"source={t['source']})"
+                for t in candidates
+            )
+            raise AmbiguousNameError(
+                f'Task "{reference}" is ambiguous, it matches {matches}. '
+                "Use `name@version` or the task ID."
+            )
+        return candidates[0]["id"]
+
+
+def get_task_registry(username: str) -> TaskRegistry:
+    return TaskRegistry.load(settings.FRACTAL_SERVER, username)
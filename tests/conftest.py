@@ -51,6 +51,27 @@ async def invoke(clisplit):
     return __invoke
 
 
+@pytest.fixture
+def mock_server():
+    """
+    Route the requests of an AuthClient to a mock handler, with a valid token
+    """
+    import time
+
+    import httpx
+    import jwt
+
+    async def __mock_server(auth_client, handler):
+        await auth_client.client.aclose()
+        auth_client.client = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler)
+        )
+        token = jwt.encode(dict(exp=time.time() + 3600), "key")
+        auth_client.auth._set_token(token)
+
+    return __mock_server
+
+
 @pytest.fixture
 def clear_task_cache():
     from fractal.config import settings
@@ -59,8 +80,8 @@ def clear_task_cache():
     # would be to inject a new (function-scoped) FRACTAL_CACHE_PATH variable
     # for each test
     cache_dir = Path(settings.FRACTAL_CACHE_PATH).expanduser()
-    cache_file = cache_dir / "tasks"
-    cache_file.unlink(missing_ok=True)
+    for cache_file in cache_dir.glob("task-registry/*"):
+        cache_file.unlink(missing_ok=True)
 
 
 from .fixtures_testserver import *  # noqa: 401
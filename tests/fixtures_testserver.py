@@ -174,6 +174,19 @@ async def job_factory(db):
     return _job_factory
 
 
+@pytest.fixture
+async def job_updater(db):
+    async def _job_updater(job, **fields):
+        for key, value in fields.items():
+            setattr(job, key, value)
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        return job
+
+    return _job_updater
+
+
 @pytest.fixture
 async def user_factory(client, testserver):
     async def __register_user(email: str, password: str, slurm_user: str):
@@ -1,17 +1,25 @@
+import asyncio
+import multiprocessing
+import time
 from os import environ
 
 import pytest
+from devtools import debug
 
 from fractal.authclient import AuthenticationError
 from fractal.authclient import AuthToken
 
 
-async def test_auth_fail(client):
+async def test_auth_fail(client, tmp_path, monkeypatch):
     """
     GIVEN no user registered
     WHEN when fetching a token
     THEN authentication error is raised
     """
+    from fractal.config import settings
+
+    # Make sure no valid token is cached from previous tests
+    monkeypatch.setattr(settings, "FRACTAL_CACHE_PATH", str(tmp_path))
     with pytest.raises(AuthenticationError):
         auth = AuthToken(
             client,
@@ -36,3 +44,330 @@ async def test_auth_registerd(client, register_user):
     )
     token = await auth()
     assert token
+    await auth.close()
+
+
+async def test_auth_single_flight(
+    client, register_user, tmp_path, monkeypatch
+):
+    """
+    GIVEN an expired token
+    WHEN many requests need the token at the same time
+    THEN a single login takes place
+    """
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_CACHE_PATH", str(tmp_path))
+    auth = AuthToken(
+        client,
+        username=environ.get("FRACTAL_USER"),
+        password=environ.get("FRACTAL_PASSWORD"),
+        slurm_user=environ.get("SLURM_USER"),
+    )
+    logins = []
+    get_fresh_token = auth._get_fresh_token
+
+    async def _counting_get_fresh_token():
+        logins.append(time.time())
+        await get_fresh_token()
+
+    auth._get_fresh_token = _counting_get_fresh_token
+
+    auth.expires_at = 0
+    headers = await asyncio.gather(*(auth.header() for _ in range(20)))
+    assert len(logins) == 1
+    assert len({header["Authorization"] for header in headers}) == 1
+    assert not auth.expired
+
+    # A token close to expiry is refreshed in the background, while requests
+    # keep using the current one
+    await auth.close()
+    for cache_file in (tmp_path / "sessions").iterdir():
+        cache_file.unlink()
+    auth.expires_at = time.time() + 0.5
+    await auth()
+    assert len(logins) == 1
+    for _ in range(50):
+        await asyncio.sleep(0.1)
+        if auth.expires_at > time.time() + 1:
+            break
+    assert len(logins) == 2
+    assert auth.expires_at > time.time() + 1
+    await auth.close()
+
+    # Errors of the background refresh are logged, and the next request
+    # which finds the token expired logs in again
+    async def _failing_get_fresh_token():
+        raise RuntimeError("Cannot send a request")
+
+    auth._get_fresh_token = _failing_get_fresh_token
+    for cache_file in (tmp_path / "sessions").iterdir():
+        cache_file.unlink()
+    auth.expires_at = time.time() + 0.2
+    await auth()
+    await asyncio.wait_for(auth._refresh_task, timeout=5)
+    assert auth._refresh_task.exception() is None
+    auth._get_fresh_token = _counting_get_fresh_token
+    auth.expires_at = 0
+    await auth()
+    assert len(logins) == 3
+    await auth.close()
+
+
+def _login_in_subprocess(_) -> tuple:
+    """
+    Get a token in a new process, and report how many logins it took
+    """
+    from httpx import AsyncClient
+
+    async def _login():
+        async with AsyncClient() as client:
+            auth = AuthToken(
+                client,
+                username=environ.get("FRACTAL_USER"),
+                password=environ.get("FRACTAL_PASSWORD"),
+                slurm_user=environ.get("SLURM_USER"),
+            )
+            logins = []
+            get_fresh_token = auth._get_fresh_token
+
+            async def _counting_get_fresh_token():
+                logins.append(time.time())
+                await get_fresh_token()
+
+            auth._get_fresh_token = _counting_get_fresh_token
+            token = await auth()
+            await auth.close()
+            return len(logins), token
+
+    return asyncio.run(_login())
+
+
+async def test_auth_many_processes(register_user, tmp_path, monkeypatch):
+    """
+    GIVEN an empty token cache
+    WHEN many processes need a token at the same time
+    THEN a single login takes place, and all processes share its token
+    """
+    N_PROCESSES = 16
+    monkeypatch.setenv("FRACTAL_CACHE_PATH", str(tmp_path))
+
+    start = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(N_PROCESSES) as pool:
+        results = pool.map(_login_in_subprocess, range(N_PROCESSES))
+    debug(f"{N_PROCESSES} processes: {time.perf_counter() - start:.2f} s")
+
+    logins = sum(n_logins for n_logins, _ in results)
+    tokens = {token for _, token in results}
+    assert logins == 1
+    assert len(tokens) == 1
+    assert len(list((tmp_path / "sessions").glob("*.lock"))) == 1
+
+
+async def test_retries(tmp_path, monkeypatch, mock_server):
+    """
+    GIVEN a server which fails transiently
+    WHEN sending requests through the AuthClient
+    THEN idempotent requests are retried within the limits of the settings,
+        and POST requests only if enabled
+    """
+    import httpx
+
+    from fractal.authclient import AuthClient
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(settings, "FRACTAL_RETRY_BACKOFF", 0.01)
+    monkeypatch.setattr(settings, "FRACTAL_MAX_RETRIES", 3)
+
+    calls = []
+    failures = dict(flaky=2, throttled=1, down=100, refused=2)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        name = request.url.path.strip("/")
+        if len([c for c in calls if c.url == request.url]) > failures[name]:
+            return httpx.Response(200, json=dict(name=name))
+        if name == "refused":
+            raise httpx.ConnectError("Connection refused", request=request)
+        if name == "throttled":
+            return httpx.Response(429, headers={"Retry-After": "0.2"})
+        return httpx.Response(503)
+
+    async with AuthClient(username="user", password="", slurm_user="") as c:
+        await mock_server(c, handler)
+
+        res = await c.get("http://server/flaky/")
+        assert res.status_code == 200
+        assert len(calls) == 3
+
+        start = time.perf_counter()
+        res = await c.get("http://server/throttled/")
+        assert res.status_code == 200
+        assert time.perf_counter() - start >= 0.2
+
+        # Retries stop after FRACTAL_MAX_RETRIES
+        calls.clear()
+        res = await c.get("http://server/down/")
+        assert res.status_code == 503
+        assert len(calls) == 4
+
+        # POST requests are not retried by default, unless they did not
+        # reach the server
+        calls.clear()
+        res = await c.post("http://server/down/")
+        assert res.status_code == 503
+        assert len(calls) == 1
+        res = await c.post("http://server/refused/")
+        assert res.status_code == 200
+
+        monkeypatch.setattr(settings, "FRACTAL_RETRY_POST", True)
+        calls.clear()
+        res = await c.post("http://server/down/")
+        assert len(calls) == 4
+        keys = {call.headers["Idempotency-Key"] for call in calls}
+        assert len(keys) == 1
+
+
+async def test_request_compression(tmp_path, monkeypatch, mock_server):
+    """
+    GIVEN a server which advertises gzip support in `Accept-Encoding`
+    WHEN sending large JSON bodies
+    THEN they are compressed, unless disabled or rejected by the server
+    """
+    import gzip
+    import json
+
+    import httpx
+
+    from fractal.authclient import AuthClient
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(settings, "FRACTAL_COMPRESS_THRESHOLD", 1000)
+
+    received = []
+    accept_gzip = [True]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        encoding = request.headers.get("Content-Encoding")
+        if encoding == "gzip" and not accept_gzip[0]:
+            return httpx.Response(415, headers={"Accept-Encoding": "identity"})
+        body = request.read()
+        if encoding == "gzip":
+            body = gzip.decompress(body)
+        received.append((encoding, json.loads(body)))
+        headers = {"Accept-Encoding": "gzip"} if accept_gzip[0] else {}
+        return httpx.Response(200, headers=headers)
+
+    payload = dict(args={f"well_{i}": "B/03" for i in range(200)})
+    async with AuthClient(username="user", password="", slurm_user="") as c:
+        await mock_server(c, handler)
+
+        # Support is unknown until the first response
+        await c.post("http://server/a/", json=payload)
+        await c.post("http://server/a/", json=payload)
+        await c.post("http://server/a/", json=dict(small=True))
+        assert received == [
+            (None, payload),
+            ("gzip", payload),
+            (None, dict(small=True)),
+        ]
+
+        monkeypatch.setattr(settings, "FRACTAL_COMPRESS_REQUESTS", False)
+        received.clear()
+        await c.patch("http://server/a/", json=payload)
+        assert received == [(None, payload)]
+
+        monkeypatch.setattr(settings, "FRACTAL_COMPRESS_REQUESTS", True)
+        accept_gzip[0] = False
+        received.clear()
+        res = await c.patch("http://server/a/", json=payload)
+        assert res.status_code == 200
+        assert received == [(None, payload)]
+        assert c.accepts_gzip == {"server": False}
+
+
+async def test_compressed_request_error(
+    tmp_path, monkeypatch, mock_server, caplog
+):
+    """
+    GIVEN a server which replies with an error to a compressed request
+    WHEN checking the response
+    THEN the decompressed payload is logged before exiting
+    """
+    import httpx
+
+    from fractal.authclient import AuthClient
+    from fractal.config import settings
+    from fractal.response import check_response
+
+    monkeypatch.setattr(settings, "FRACTAL_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(settings, "FRACTAL_COMPRESS_THRESHOLD", 1000)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        headers = {"Accept-Encoding": "gzip"}
+        return httpx.Response(422, headers=headers, json=dict(detail="bad"))
+
+    payload = dict(args={f"well_{i}": "B/03" for i in range(200)})
+    async with AuthClient(username="user", password="", slurm_user="") as c:
+        await mock_server(c, handler)
+        await c.post("http://server/a/", json=payload)
+        res = await c.post("http://server/a/", json=payload)
+    assert res.request.headers["Content-Encoding"] == "gzip"
+    with pytest.raises(SystemExit):
+        check_response(res, expected_status_code=201)
+    assert '"well_199": "B/03"' in caplog.text
+    assert "bad" in caplog.text
+
+
+async def test_get_coalescing(tmp_path, monkeypatch, mock_server):
+    """
+    GIVEN many concurrent GET requests for few resources
+    WHEN they are in flight at the same time
+    THEN a single request per resource reaches the server
+    """
+    import httpx
+
+    from fractal.authclient import AuthClient
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_CACHE_PATH", str(tmp_path))
+
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(str(request.url))
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json=dict(url=str(request.url)))
+
+    async with AuthClient(username="user", password="", slurm_user="") as c:
+        await mock_server(c, handler)
+        responses = await asyncio.gather(
+            *(c.get("http://server/job/1") for _ in range(10)),
+            *(
+                c.get("http://server/job/", params=dict(id=2))
+                for _ in range(5)
+            ),
+        )
+        assert sorted(calls) == [
+            "http://server/job/1",
+            "http://server/job/?id=2",
+        ]
+        assert {res.json()["url"] for res in responses[:10]} == {
+            "http://server/job/1"
+        }
+
+        # Cancelling a caller does not affect the others
+        calls.clear()
+        first = asyncio.create_task(c.get("http://server/job/1"))
+        second = asyncio.create_task(c.get("http://server/job/1"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        res = await second
+        assert res.status_code == 200
+        assert len(calls) == 1
+
+        # Requests which are not in flight anymore are sent again
+        await c.get("http://server/job/1")
+        assert len(calls) == 2
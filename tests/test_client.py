@@ -57,3 +57,74 @@ async def test_bad_credentials(invoke):
     res.show()
     assert res.retcode != 0
     assert "BAD_CREDENTIALS" in res.data
+
+
+def test_help_without_environment(tmp_path):
+    """
+    GIVEN an environment without credentials
+    WHEN asking for the help of the client
+    THEN it is shown, since the settings are only read to run a command
+    """
+    import os
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    import fractal
+
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if key not in ("FRACTAL_USER", "FRACTAL_PASSWORD", "SLURM_USER")
+    }
+    env["PYTHONPATH"] = str(Path(fractal.__file__).parents[1])
+    res = subprocess.run(
+        [sys.executable, "-m", "fractal", "--help"],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    assert res.returncode == 0, res.stderr
+    assert "usage:" in res.stdout
+
+
+async def test_debug_startup(invoke):
+    """
+    GIVEN the client
+    WHEN profiling the startup of a command
+    THEN the import-time breakdown is reported
+    """
+    iface = await invoke("--batch debug startup version")
+    debug(iface.data)
+    assert iface.retcode == 0
+    assert float(iface.data) > 0
+
+    iface = await invoke("debug startup '--batch job status 1' --limit 3")
+    iface.show()
+    assert iface.retcode == 0
+    assert iface.data.row_count == 3
+
+
+async def test_http_options(register_user, invoke):
+    """
+    GIVEN the HTTP transport settings and their CLI overrides
+    WHEN a client is created
+    THEN settings apply unless overridden, and the overrides reach the server
+        calls
+    """
+    from fractal.authclient import make_async_client
+    from fractal.config import settings
+
+    async with make_async_client() as client:
+        assert client.timeout.connect == settings.FRACTAL_CONNECT_TIMEOUT
+        assert client.timeout.read == settings.FRACTAL_READ_TIMEOUT
+    async with make_async_client(read_timeout=120.0, http2=True) as client:
+        assert client.timeout.read == 120.0
+        assert client.timeout.write == settings.FRACTAL_WRITE_TIMEOUT
+
+    iface = await invoke(
+        "--connect-timeout 2 --read-timeout 10 --max-connections 4 "
+        "project list"
+    )
+    assert iface.retcode == 0
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import shlex
+import socket
+import threading
+
+from devtools import debug
+
+from fractal.daemon import CLIENT_ARGS
+from fractal.daemon import forward
+
+
+async def test_daemon(register_user, invoke, tmp_path, monkeypatch):
+    """
+    GIVEN a running `fractal daemon`
+    WHEN invoking client commands
+    THEN they are forwarded to the daemon, unless they must run locally
+    """
+    socket_path = tmp_path / "daemon.sock"
+    monkeypatch.setenv("FRACTAL_DAEMON_SOCKET", str(socket_path))
+
+    # Nothing is forwarded when no daemon is running
+    assert forward(shlex.split("fractal project list")) is None
+
+    daemon = asyncio.create_task(invoke("daemon start"))
+    for _ in range(50):
+        if socket_path.exists():
+            break
+        await asyncio.sleep(0.1)
+
+    res = await invoke("daemon status")
+    debug(res.data)
+    assert res.retcode == 0
+    assert res.data["requests_served"] == 0
+
+    # NOTE: `forward` is blocking, and the daemon runs in this event loop
+    loop = asyncio.get_running_loop()
+
+    async def _forward(args: str):
+        return await loop.run_in_executor(None, forward, shlex.split(args))
+
+    reply = await _forward("fractal --batch project new prj /tmp")
+    debug(reply)
+    assert reply["retcode"] == 0
+    project_id = reply["output"].split()[0]
+
+    reply = await _forward(f"fractal project show {project_id}")
+    assert reply["retcode"] == 0
+    assert '"name": "prj"' in reply["output"]
+
+    # Output written while the command runs is sent back as well
+    reply = await _forward("fractal --output ndjson project list")
+    assert reply["retcode"] == 0
+    assert json.loads(reply["output"])["id"] == int(project_id)
+
+    # Server errors are reported back with their retcode
+    reply = await _forward("fractal project show 123456")
+    debug(reply)
+    assert reply["retcode"] == 1
+    assert "404" in reply["log"]
+    reply = await _forward("fractal project show missing_project")
+    assert reply["retcode"] == 1
+    assert 'No project named "missing_project"' in reply["output"]
+
+    # Some commands are never forwarded
+    assert await _forward("fractal version") is None
+    assert await _forward("fractal --no-daemon project list") is None
+    assert await _forward("fractal -u other@user.xy project list") is None
+    assert await _forward("fractal --read-timeout 5 project list") is None
+    from fractal.authclient import HTTP_OPTIONS
+
+    assert CLIENT_ARGS == HTTP_OPTIONS
+
+    res = await invoke("daemon status")
+    assert res.data["requests_served"] == 5
+
+    res = await invoke("daemon stop")
+    assert res.retcode == 0
+    res = await daemon
+    assert res.retcode == 0
+    assert not socket_path.exists()
+
+
+def test_unresponsive_daemon(tmp_path, monkeypatch):
+    """
+    GIVEN a daemon socket whose server does not reply
+    WHEN forwarding a command
+    THEN it runs in-process if the request was not accepted, and fails
+        (without running again) if it was accepted
+    """
+    socket_path = tmp_path / "daemon.sock"
+    monkeypatch.setenv("FRACTAL_DAEMON_SOCKET", str(socket_path))
+    monkeypatch.setenv("FRACTAL_DAEMON_TIMEOUT", "0.2")
+    monkeypatch.setattr("fractal.daemon.ACCEPT_TIMEOUT", 0.2)
+    done = threading.Event()
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(socket_path))
+        server.listen(1)
+        # The connection is queued, but never accepted
+        assert forward(shlex.split("fractal project list")) is None
+
+        def _accept_and_hang():
+            conn, _ = server.accept()
+            with conn:
+                conn.sendall(b"\n")
+                done.wait()
+
+        server.accept()[0].close()
+        thread = threading.Thread(target=_accept_and_hang)
+        thread.start()
+        reply = forward(shlex.split("fractal project list"))
+        done.set()
+        thread.join()
+    assert reply["retcode"] == 1
+    assert "No reply from the daemon" in reply["log"]
@@ -62,6 +62,37 @@ async def test_show_dataset(register_user, invoke):
     assert res.retcode == 0
 
 
+async def test_show_many_datasets(register_user, invoke, tmp_path):
+    res = await invoke("project new prj0 prj_path0 --dataset ds0")
+    project_id = res.data["id"]
+    res = await invoke(f"--batch project add-dataset {project_id} ds1")
+    ds1 = int(res.data)
+    ds0 = ds1 - 1
+
+    ids_file = tmp_path / "ids.txt"
+    ids_file.write_text(f"# Datasets\n{ds1}\nmissing\n")
+    res = await invoke(f"dataset show {project_id} ds0 --from-file {ids_file}")
+    res.show()
+    assert res.retcode == 1
+    assert [ds["id"] for ds in res.data] == [ds0, ds1, "missing"]
+    assert [ds.get("name") for ds in res.data] == ["ds0", "ds1", None]
+    assert "No dataset named" in res.data[2]["error"]
+
+    res = await invoke(f"dataset show {project_id} {ds0}-{ds1}")
+    assert res.retcode == 0
+    assert len(res.data) == 2
+
+    res = await invoke(f"dataset show {project_id} {ds1}-{ds0}")
+    assert res.retcode == 1
+    assert res.data == f"ERROR: Invalid range of IDs {ds1}-{ds0}"
+
+    empty_file = tmp_path / "empty.txt"
+    empty_file.write_text("# Nothing\n")
+    res = await invoke(f"dataset show {project_id} --from-file {empty_file}")
+    assert res.retcode == 1
+    assert res.data == "ERROR: No ID given"
+
+
 async def test_delete_resource(register_user, invoke):
     res = await invoke("project new prj0 prj_path0")
     project_id = res.data["id"]
@@ -0,0 +1,343 @@
+import base64
+import hashlib
+import os
+
+import httpx
+import pytest
+
+from fractal.authclient import AuthClient
+from fractal.download import download
+from fractal.download import DownloadError
+
+CONTENT = bytes(range(256)) * 400
+
+
+class InterruptedStream(httpx.AsyncByteStream):
+    """
+    Response body which breaks after `size` bytes
+    """
+
+    def __init__(self, content: bytes, size: int):
+        self.content = content
+        self.size = size
+
+    async def __aiter__(self):
+        yield self.content[: self.size]
+        raise httpx.ReadError("Connection reset")
+
+
+def _server(interruptions: list, etag: str = '"v1"', digest: bytes = None):
+    """
+    Mock server which supports Range requests, and breaks the first
+    responses after the given numbers of bytes
+    """
+    requests = []
+    digest = digest or hashlib.sha256(CONTENT).digest()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        headers = {
+            "Content-Type": "application/x-zip-compressed",
+            "ETag": etag,
+            "Repr-Digest": f"sha-256=:{base64.b64encode(digest).decode()}:",
+        }
+        start = 0
+        status_code = 200
+        range_ = request.headers.get("Range")
+        if range_ and request.headers.get("If-Range") == etag:
+            start = int(range_.split("=")[1].rstrip("-"))
+            status_code = 206
+            headers[
+                "Content-Range"
+            ] = f"bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}"
+        body = CONTENT[start:]
+        headers["Content-Length"] = str(len(body))
+        if interruptions:
+            stream = InterruptedStream(body, interruptions.pop(0))
+            return httpx.Response(status_code, headers=headers, stream=stream)
+        return httpx.Response(status_code, headers=headers, content=body)
+
+    return handler, requests
+
+
+async def test_download_resume(tmp_path, monkeypatch, mock_server):
+    """
+    GIVEN a server whose responses break in the middle of the body
+    WHEN downloading a file
+    THEN the download is resumed with Range requests, and checked against
+        the digest announced by the server
+    """
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(settings, "FRACTAL_RETRY_BACKOFF", 0.01)
+
+    handler, requests = _server([30000, 20000])
+    progress = []
+    path = tmp_path / "archive.zip"
+    async with AuthClient(
+        username="user", password="", slurm_user=""
+    ) as client:
+        await mock_server(client, handler)
+        await download(
+            client,
+            "http://server/api/v1/job/download/1",
+            path,
+            expected_content_type="application/x-zip-compressed",
+            on_progress=lambda done, total: progress.append((done, total)),
+        )
+
+    assert path.read_bytes() == CONTENT
+    assert [r.headers.get("Range") for r in requests] == [
+        None,
+        "bytes=30000-",
+        "bytes=50000-",
+    ]
+    # Ranges and lengths must refer to the bytes which are written
+    assert {r.headers["Accept-Encoding"] for r in requests} == {"identity"}
+    assert progress[-1] == (len(CONTENT), len(CONTENT))
+    assert not list(tmp_path.glob("*.part*"))
+
+
+async def test_download_errors(tmp_path, monkeypatch, mock_server):
+    """
+    GIVEN a server which sends a wrong digest, or keeps failing
+    WHEN downloading a file
+    THEN the download fails and the partial file is discarded
+    """
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(settings, "FRACTAL_RETRY_BACKOFF", 0.01)
+    monkeypatch.setattr(settings, "FRACTAL_MAX_RETRIES", 2)
+    path = tmp_path / "archive.zip"
+
+    handler, _ = _server([], digest=b"x" * 32)
+    async with AuthClient(
+        username="user", password="", slurm_user=""
+    ) as client:
+        await mock_server(client, handler)
+        with pytest.raises(DownloadError, match="sha256"):
+            await download(client, "http://server/file", path)
+        assert not list(tmp_path.glob("archive.zip*"))
+
+        handler, requests = _server([10] * 5)
+        await mock_server(client, handler)
+        with pytest.raises(DownloadError, match="3 attempts"):
+            await download(client, "http://server/file", path)
+        # The partial download is kept, and resumed by the next call
+        assert (tmp_path / "archive.zip.part").stat().st_size == 30
+        handler, requests = _server([])
+        await mock_server(client, handler)
+        await download(client, "http://server/file", path)
+        assert requests[0].headers["Range"] == "bytes=30-"
+        assert path.read_bytes() == CONTENT
+
+        with pytest.raises(DownloadError, match="content_type"):
+            await download(
+                client,
+                "http://server/file",
+                tmp_path / "other.zip",
+                expected_content_type="application/json",
+            )
+
+
+async def test_archive_listing_and_extraction(
+    tmp_path, monkeypatch, mock_server
+):
+    """
+    GIVEN a remote archive, on a server which supports suffix ranges
+    WHEN listing its members, and extracting some of them
+    THEN only the end of the archive is downloaded for the listing, and
+        members are extracted in parallel
+    """
+    from io import BytesIO
+    from zipfile import ZIP_DEFLATED
+    from zipfile import ZipFile
+
+    from fractal.archive import extract_members
+    from fractal.archive import list_remote_archive
+    from fractal.archive import select_members
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_CACHE_PATH", str(tmp_path))
+    buffer = BytesIO()
+    with ZipFile(buffer, mode="w", compression=ZIP_DEFLATED) as zipfile:
+        for i in range(200):
+            zipfile.writestr(f"task_{i:03d}.err", CONTENT + os.urandom(1000))
+            zipfile.writestr(f"task_{i:03d}.out", f"output {i}")
+    archive = buffer.getvalue()
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        suffix = int(request.headers["Range"].split("-")[1])
+        start = max(len(archive) - suffix, 0)
+        sent.append(len(archive) - start)
+        return httpx.Response(
+            206,
+            headers={
+                "Content-Range": (
+                    f"bytes {start}-{len(archive) - 1}/{len(archive)}"
+                )
+            },
+            content=archive[start:],
+        )
+
+    async with AuthClient(
+        username="user", password="", slurm_user=""
+    ) as client:
+        await mock_server(client, handler)
+        members = await list_remote_archive(
+            client, "http://server/file", tail_size=1024
+        )
+    assert len(members) == 400
+    # The tail grows until it holds the central directory, which is much
+    # smaller than the archive
+    assert len(sent) == 2
+    assert sent[-1] < len(archive) / 4
+
+    path = tmp_path / "archive.zip"
+    path.write_bytes(archive)
+    selected = select_members(members, include=["*.err"], exclude=["*_1*"])
+    assert len(selected) == 100
+    extract_members(path, selected, tmp_path / "out", workers=4)
+    extracted = sorted(p.name for p in (tmp_path / "out").iterdir())
+    assert extracted == sorted(m.filename for m in selected)
+    assert (tmp_path / "out/task_042.err").read_bytes()[:1000] == CONTENT[
+        :1000
+    ]
+
+
+async def test_list_corrupted_archive(tmp_path, monkeypatch, mock_server):
+    """
+    GIVEN a remote archive whose central directory is corrupted
+    WHEN listing its members
+    THEN the listing gives up once the whole archive was fetched
+    """
+    import struct
+    from zipfile import BadZipFile
+
+    from fractal.archive import EOCD_SIGNATURE
+    from fractal.archive import list_remote_archive
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_CACHE_PATH", str(tmp_path))
+    # The "end of central directory" record announces a central directory
+    # which starts 100 bytes before the end
+    archive = (
+        CONTENT
+        + EOCD_SIGNATURE
+        + struct.pack("<HHHHIIH", 0, 0, 1, 1, 78, len(CONTENT) - 78, 0)
+    )
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        suffix = int(request.headers["Range"].split("-")[1])
+        start = max(len(archive) - suffix, 0)
+        sent.append(len(archive) - start)
+        return httpx.Response(
+            206,
+            headers={
+                "Content-Range": (
+                    f"bytes {start}-{len(archive) - 1}/{len(archive)}"
+                )
+            },
+            content=archive[start:],
+        )
+
+    async with AuthClient(
+        username="user", password="", slurm_user=""
+    ) as client:
+        await mock_server(client, handler)
+        with pytest.raises(BadZipFile):
+            await list_remote_archive(
+                client, "http://server/file", tail_size=1024
+            )
+    assert sent[-1] == len(archive)
+    assert sent == sorted(set(sent))
+
+
+def test_parse_digests():
+    """
+    GIVEN digest headers, some of them malformed
+    WHEN parsing them
+    THEN the malformed ones are ignored
+    """
+    from fractal.download import _parse_digests
+
+    sha256 = hashlib.sha256(CONTENT).digest()
+    md5 = hashlib.md5(CONTENT).digest()
+    headers = httpx.Headers(
+        {
+            "Repr-Digest": (
+                f"sha-256=:{base64.b64encode(sha256).decode()}:, sha-512=:x:"
+            ),
+            "Content-MD5": base64.b64encode(md5).decode(),
+        }
+    )
+    assert _parse_digests(headers) == dict(sha256=sha256.hex(), md5=md5.hex())
+    for content_md5 in ["not base64!", "abc"]:
+        headers = httpx.Headers({"Content-MD5": content_md5})
+        assert _parse_digests(headers) == {}
+
+
+def test_extract_nested_members(tmp_path):
+    """
+    GIVEN an archive whose members share deeply nested folders
+    WHEN extracting them in parallel
+    THEN the workers do not race on creating the folders
+    """
+    from zipfile import ZipFile
+
+    from fractal.archive import extract_members
+
+    path = tmp_path / "archive.zip"
+    with ZipFile(path, mode="w") as zipfile:
+        for n in range(20):
+            for i in range(8):
+                zipfile.writestr(f"d{n}/a/b/c/{i}.log", f"log {n} {i}")
+        zipfile.writestr("../outside.log", "sanitised")
+    with ZipFile(path) as zipfile:
+        members = zipfile.infolist()
+
+    extract_members(path, members, tmp_path / "out", workers=8)
+    assert len(list((tmp_path / "out").rglob("*.log"))) == 161
+    assert (tmp_path / "out/d7/a/b/c/3.log").read_text() == "log 7 3"
+    assert (tmp_path / "out/outside.log").read_text() == "sanitised"
+
+
+def test_archive_cache(tmp_path, monkeypatch):
+    """
+    GIVEN an archive cache which holds two archives at most
+    WHEN storing the archives of several jobs
+    THEN identical archives are stored once, and the least recently used
+        ones are evicted
+    """
+    from fractal.archivecache import ArchiveCache
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_CACHE_PATH", str(tmp_path))
+    cache = ArchiveCache("http://server", "user", max_size=2 * len(CONTENT))
+
+    def _archive(name: str, content: bytes):
+        path = tmp_path / name
+        path.write_bytes(content)
+        return path
+
+    cache.store(1, _archive("1.zip", CONTENT), "t1")
+    cache.store(2, _archive("2.zip", CONTENT), "t2")
+    assert cache.load(1) == cache.load(2)
+    assert cache.load(1, start_timestamp="t2") is None
+    cache.store(3, _archive("3.zip", CONTENT[::-1]), "t3")
+    assert len(list(cache.objects.iterdir())) == 2
+
+    dest = tmp_path / "out.zip"
+    assert cache.export(2, dest)
+    assert dest.read_bytes() == CONTENT
+    # Make the archive of job 3 the least recently used one
+    os.utime(cache.load(3), (0, 0))
+    cache.store(4, _archive("4.zip", CONTENT[:100]), "t4")
+    assert cache.load(3) is None
+    assert not (cache.jobs / "3").exists()
+    assert not cache.export(3, tmp_path / "missing.zip")
+    assert cache.load(1) and cache.load(4)
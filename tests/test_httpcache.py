@@ -0,0 +1,91 @@
+import time
+
+import httpx
+from devtools import debug
+
+from fractal.authclient import AuthClient
+from fractal.httpcache import HTTPCache
+
+
+async def test_http_cache(tmp_path, monkeypatch, mock_server):
+    """
+    GIVEN a server which sends ETag validators
+    WHEN fetching the same resource again
+    THEN the cached body is revalidated and served on 304
+    """
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_CACHE_PATH", str(tmp_path))
+    version = dict(project=1)
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        etag = f'"{version["project"]}"'
+        sent.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        return httpx.Response(
+            200, headers={"ETag": etag}, json=dict(name=f"v{etag}")
+        )
+
+    async with AuthClient(username="user", password="", slurm_user="") as c:
+        await mock_server(c, handler)
+
+        url = "http://server/api/v1/project/1"
+        first = await c.get(url)
+        second = await c.get(url)
+        assert sent == [None, '"1"']
+        assert second.status_code == 200
+        assert second.json() == first.json()
+
+        version["project"] = 2
+        third = await c.get(url)
+        assert third.json() == dict(name='v"2"')
+        fourth = await c.get(url)
+        assert fourth.json() == third.json()
+        assert sent[-1] == '"2"'
+        debug(sent)
+
+    # --no-cache
+    sent.clear()
+    async with AuthClient(
+        username="user", password="", slurm_user="", use_cache=False
+    ) as c:
+        await mock_server(c, handler)
+        await c.get(url)
+        assert sent == [None]
+
+
+def test_http_cache_eviction(tmp_path, monkeypatch):
+    """
+    GIVEN an HTTP cache with a size limit
+    WHEN storing more than the limit
+    THEN the least recently used entries are evicted
+    """
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_CACHE_PATH", str(tmp_path))
+    cache = HTTPCache("http://server", "user", max_size=2500)
+    request = httpx.Request("GET", "http://server/")
+
+    def _store(url: str):
+        res = httpx.Response(
+            200, headers={"ETag": '"x"'}, content=b"x" * 1000, request=request
+        )
+        cache.store(url, res)
+
+    _store("http://server/1")
+    time.sleep(0.01)
+    _store("http://server/2")
+    time.sleep(0.01)
+    assert cache.load("http://server/1") is not None
+    time.sleep(0.01)
+    _store("http://server/3")
+
+    assert cache.load("http://server/2") is None
+    assert cache.load("http://server/1")["content"] == b"x" * 1000
+    assert cache.load("http://server/3") is not None
+
+    # Responses without validators are not stored
+    cache.store("http://server/4", httpx.Response(200, content=b"y"))
+    assert cache.load("http://server/4") is None
@@ -1,3 +1,5 @@
+import csv
+import json
 from pathlib import Path
 
 import pytest  # noqa F401
@@ -74,6 +76,7 @@ async def test_job_list(
     project_factory,
     workflow_factory,
     job_factory,
+    capsys,
 ):
     """
     GIVEN several job entries in the database
@@ -121,6 +124,44 @@ async def test_job_list(
     # command. We add a res.show() for when pytest is run with the -s flag
     res.show()
 
+    # Check raw output modes
+    capsys.readouterr()
+    res = await invoke(f"--output ndjson job list {project_id}")
+    res.show()
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [job1.id, job2.id]
+
+    res = await invoke(f"--output json job list {project_id}")
+    res.show()
+    jobs = json.loads(capsys.readouterr().out)
+    assert [job["status"] for job in jobs] == ["running", "done"]
+
+    res = await invoke(f"--output csv job list {project_id}")
+    res.show()
+    rows = list(csv.DictReader(capsys.readouterr().out.splitlines()))
+    assert [int(row["id"]) for row in rows] == [job1.id, job2.id]
+
+    res = await invoke(f"--output ndjson workflow show {wf_1.id}")
+    res.show()
+    assert json.loads(capsys.readouterr().out)["id"] == wf_1.id
+    res = await invoke(f"--output json workflow show {wf_1.id}")
+    res.show()
+    assert json.loads(capsys.readouterr().out)["id"] == wf_1.id
+
+    # Field projection
+    res = await invoke(f"job list {project_id}")
+    assert set(res.data[0]) == set(res.columns)
+    assert "log" not in res.data[0]
+    res = await invoke(f"job list {project_id} --fields id,status")
+    assert res.data == [
+        dict(id=job1.id, status="running"),
+        dict(id=job2.id, status="done"),
+    ]
+    assert list(res.columns) == ["id", "status"]
+    res.show()
+    res = await invoke(f"job status {job2.id} --fields status,workflow_id")
+    assert res.data == dict(status="done", workflow_id=job2.workflow_id)
+
 
 async def test_job_download_logs(
     register_user,
@@ -172,3 +213,456 @@ async def test_job_download_logs(
     with logfile.open("r") as f:
         contents = f.read()
     assert contents == LOG
+
+    # Selective extraction
+    for name in ["task_1.err", "task_2.err", "task_1.out"]:
+        (wd / name).write_text(name)
+    output = tmp_path / "selected"
+    res = await invoke(
+        f"job download-logs {job.id} --output {output} "
+        "--include *.err --include log.* --exclude task_2.*"
+    )
+    assert res.retcode == 0
+    assert sorted(p.name for p in output.iterdir()) == [
+        "log.txt",
+        "task_1.err",
+    ]
+    assert (output / "task_1.err").read_text() == "task_1.err"
+    assert not list(tmp_path.glob("*.zip*"))
+
+    res = await invoke(f"job download-logs {job.id} --list --include *.out")
+    assert [member["name"] for member in res.data] == ["task_1.out"]
+    assert res.data[0]["size"] == len("task_1.out")
+    res = await invoke(f"job download-logs {job.id}")
+    assert res.retcode == 1
+
+
+async def test_job_download_project_logs(
+    register_user,
+    invoke,
+    tmp_path: Path,
+    job_factory,
+    job_updater,
+    monkeypatch,
+):
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_CACHE_PATH", str(tmp_path))
+    res = await invoke("project new prj0 prj_path0")
+    project_id = res.data["id"]
+    jobs = {}
+    working_dirs = []
+    for status in ["done", "failed", "failed"]:
+        wd = tmp_path / f"wd_{len(jobs)}"
+        wd.mkdir()
+        job = await job_factory(
+            project_id=project_id, working_dir=str(wd), status=status
+        )
+        (wd / "log.txt").write_text(f"job {job.id}")
+        jobs[job.id] = status
+        working_dirs.append(wd)
+
+    output = tmp_path / "logs"
+    res = await invoke(
+        f"job download-logs --project {project_id} --status failed "
+        f"--output {output}"
+    )
+    assert res.retcode == 0
+    failed = sorted(i for i, status in jobs.items() if status == "failed")
+    assert sorted(r["id"] for r in res.data) == failed
+    assert {r["result"] for r in res.data} == {"downloaded"}
+    for job_id in failed:
+        logfile = output / f"job_{job_id}" / "log.txt"
+        assert logfile.read_text() == f"job {job_id}"
+
+    # Complete downloads are skipped
+    res = await invoke(f"job download-logs --project prj0 --output {output}")
+    assert res.retcode == 0
+    results = {r["id"]: r["result"] for r in res.data}
+    assert results == {
+        job_id: "skipped" if status == "failed" else "downloaded"
+        for job_id, status in jobs.items()
+    }
+    assert len(list(output.iterdir())) == len(jobs)
+
+    # The archives of finished jobs are served from the cache, unless it is
+    # bypassed
+    for wd in working_dirs:
+        (wd / "log.txt").write_text("rewritten")
+    output = tmp_path / "cached"
+    res = await invoke(f"job download-logs --project prj0 --output {output}")
+    assert {r["result"] for r in res.data} == {"cached"}
+    for job_id in jobs:
+        logfile = output / f"job_{job_id}" / "log.txt"
+        assert logfile.read_text() == f"job {job_id}"
+    res = await invoke(f"job download-logs {failed[0]} --list")
+    assert [member["name"] for member in res.data] == ["log.txt"]
+    output = tmp_path / "fresh"
+    res = await invoke(
+        f"--no-cache job download-logs {failed[0]} --output {output}"
+    )
+    assert (output / "log.txt").read_text() == "rewritten"
+
+    res = await invoke(f"job download-logs 1 --project prj0 --output {output}")
+    assert res.retcode == 1
+    res = await invoke("job download-logs --project prj0 --list")
+    assert res.retcode == 1
+
+    # The logs of active jobs are downloaded again until the jobs finish
+    wd = tmp_path / "wd_running"
+    wd.mkdir()
+    (wd / "log.txt").write_text("started")
+    running = await job_factory(
+        project_id=project_id, working_dir=str(wd), status="running"
+    )
+    output = tmp_path / "active"
+    for log in ["started", "halfway"]:
+        (wd / "log.txt").write_text(log)
+        res = await invoke(
+            f"--batch job download-logs --project prj0 --status running "
+            f"--output {output}"
+        )
+        assert res.data == f"{running.id} downloaded"
+        assert (output / f"job_{running.id}.active/log.txt").read_text() == log
+        assert not (output / f"job_{running.id}").exists()
+    (wd / "log.txt").write_text("finished")
+    await job_updater(running, status="done")
+    res = await invoke(
+        f"--batch job download-logs --project prj0 --status done "
+        f"--output {output}"
+    )
+    assert f"{running.id} downloaded" in res.data.splitlines()
+    assert (output / f"job_{running.id}/log.txt").read_text() == "finished"
+    assert not (output / f"job_{running.id}.active").exists()
+
+
+async def test_job_grep(
+    register_user, invoke, tmp_path: Path, job_factory, monkeypatch, capsys
+):
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_CACHE_PATH", str(tmp_path))
+    res = await invoke("project new prj0 prj_path0")
+    project_id = res.data["id"]
+    jobs = {}
+    for status in ["done", "failed", "failed"]:
+        wd = tmp_path / f"wd_{len(jobs)}"
+        wd.mkdir()
+        error = "ValueError: bad input" if status == "failed" else "ok"
+        job = await job_factory(
+            project_id=project_id,
+            working_dir=str(wd),
+            status=status,
+            log=f"START\n{error}\nEND",
+        )
+        (wd / "task.err").write_text(f"Traceback\n  line\n{error}\n")
+        (wd / "task.out").write_text(error)
+        jobs[job.id] = status
+    failed = sorted(i for i, status in jobs.items() if status == "failed")
+
+    capsys.readouterr()
+    res = await invoke(f"job grep valueerror -i --project {project_id}")
+    assert res.retcode == 0
+    assert res.data == dict(jobs=3, matched_jobs=2)
+    lines = capsys.readouterr().out.splitlines()
+    assert sorted(lines) == [
+        f"{job_id}:log:2:ValueError: bad input" for job_id in failed
+    ]
+
+    res = await invoke(
+        "--batch job grep ValueError --project prj0 --status failed "
+        "--archives --exclude *.out"
+    )
+    assert res.retcode == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert sorted(lines) == sorted(
+        f"{job_id}:{filename}:{lineno}:ValueError: bad input"
+        for job_id in failed
+        for filename, lineno in [("log", 2), ("task.err", 3)]
+    )
+
+    res = await invoke(
+        "--output json job grep Traceback --project prj0 --archives"
+    )
+    assert res.retcode == 0
+    assert sorted(r["job_id"] for r in res.data) == sorted(jobs)
+    assert {r["file"] for r in res.data} == {"task.err"}
+
+    res = await invoke("--batch job grep NotFound --project prj0")
+    assert res.retcode == 1
+    res = await invoke("job grep ( --project prj0")
+    assert res.retcode == 2
+
+    # Logs which cannot be fetched are counted as errors, and the other ones
+    # are still searched
+    import httpx
+    from fractal.authclient import AuthClient
+
+    get = AuthClient.get
+
+    async def failing_get(self, url, **kwargs):
+        if url.endswith(f"/job/{failed[0]}"):
+            return httpx.Response(500, json=dict(detail="Unavailable"))
+        return await get(self, url, **kwargs)
+
+    monkeypatch.setattr(AuthClient, "get", failing_get)
+    capsys.readouterr()
+    res = await invoke("--batch job grep ValueError --project prj0")
+    assert res.retcode == 2
+    assert capsys.readouterr().out.splitlines() == [
+        f"{failed[1]}:log:2:ValueError: bad input"
+    ]
+
+
+def test_poll_interval(monkeypatch):
+    from datetime import datetime
+    from datetime import timedelta
+    from datetime import timezone
+
+    from fractal.cmd._job import poll_interval
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_POLL_MIN_INTERVAL", 1)
+    monkeypatch.setattr(settings, "FRACTAL_POLL_MAX_INTERVAL", 60)
+    monkeypatch.setattr(settings, "FRACTAL_POLL_BACKOFF", 0.1)
+
+    def _submitted(seconds_ago: float) -> str:
+        start = datetime.now(timezone.utc) - timedelta(seconds=seconds_ago)
+        return start.replace(tzinfo=None).isoformat()
+
+    assert 0.9 <= poll_interval(_submitted(0)) <= 1.1
+    assert 0.9 <= poll_interval(None) <= 1.1
+    assert 27 <= poll_interval(_submitted(300)) <= 33
+    assert 54 <= poll_interval(_submitted(86400)) <= 66
+
+
+async def test_job_wait_and_watch(
+    register_user,
+    invoke,
+    project_factory,
+    workflow_factory,
+    job_factory,
+    job_updater,
+    monkeypatch,
+    tmp_path: Path,
+):
+    """
+    GIVEN jobs which are running, done or failed
+    WHEN calling `job wait` and `job watch`
+    THEN the commands return once the jobs finish, with an exit status
+        reflecting how they finished
+    """
+    import asyncio
+
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_POLL_MIN_INTERVAL", 0.1)
+    monkeypatch.setattr(settings, "FRACTAL_POLL_MAX_INTERVAL", 0.2)
+
+    res = await invoke("project new prj0 prj_path0")
+    project_id = res.data["id"]
+    wf = await workflow_factory(project_id=project_id)
+    done = await job_factory(
+        project_id=project_id,
+        workflow_id=wf.id,
+        working_dir=str(tmp_path),
+        status="done",
+    )
+    failed = await job_factory(
+        project_id=project_id,
+        workflow_id=wf.id,
+        working_dir=str(tmp_path),
+        status="failed",
+    )
+    running = await job_factory(
+        project_id=project_id,
+        workflow_id=wf.id,
+        working_dir=str(tmp_path),
+        status="running",
+    )
+
+    res = await invoke(f"job wait {done.id}")
+    assert res.retcode == 0
+    res = await invoke(f"--batch job wait {done.id} {failed.id}")
+    assert res.retcode == 1
+    assert res.data == f"{done.id} done\n{failed.id} failed"
+
+    # Unknown jobs are reported without aborting the others
+    res = await invoke(f"job wait {failed.id} 9999 --timeout 0.5")
+    assert res.retcode == 3
+    assert res.data[1] == dict(
+        id=9999, status="error", error="404 Job not found"
+    )
+    res = await invoke(f"--batch job wait {running.id} 9999 --timeout 0.5")
+    assert res.retcode == 3
+    assert res.data == f"{running.id} running\n9999 error"
+
+    # Timeout
+    res = await invoke(f"job wait {done.id} {running.id} --timeout 0.5")
+    assert res.retcode == 2
+    res = await invoke("job watch --project prj0 --timeout 0.5")
+    assert res.retcode == 2
+    assert [job["id"] for job in res.data] == [running.id]
+
+    # Jobs which finish, or are submitted, while watching
+    async def _later():
+        await asyncio.sleep(0.5)
+        new = await job_factory(
+            project_id=project_id,
+            workflow_id=wf.id,
+            working_dir=str(tmp_path),
+            status="submitted",
+        )
+        await job_updater(running, status="done")
+        await asyncio.sleep(0.5)
+        await job_updater(new, status="done")
+        return new
+
+    task = asyncio.ensure_future(_later())
+    res = await invoke(f"--batch job watch --project {project_id}")
+    new = await task
+    assert res.retcode == 0
+    assert res.data == f"{running.id} done\n{new.id} done"
+
+
+async def test_many_job_statuses(
+    register_user,
+    invoke,
+    workflow_factory,
+    job_factory,
+    tmp_path: Path,
+    capsys,
+):
+    """
+    GIVEN several jobs
+    WHEN calling `job status` with many IDs, ranges or a file of IDs
+    THEN the jobs are shown in a single table, with errors for the IDs
+        which cannot be read
+    """
+    res = await invoke("project new prj0 prj_path0")
+    project_id = res.data["id"]
+    wf = await workflow_factory(project_id=project_id)
+    jobs = [
+        await job_factory(
+            project_id=project_id,
+            workflow_id=wf.id,
+            working_dir=str(tmp_path),
+            status=status,
+            log=LOG,
+        )
+        for status in ["done", "failed", "running"]
+    ]
+    first, last = jobs[0].id, jobs[-1].id
+
+    res = await invoke(f"job status {first}-{last}")
+    res.show()
+    assert res.retcode == 0
+    assert [job["status"] for job in res.data] == ["done", "failed", "running"]
+    assert "log" not in res.data[0]
+
+    res = await invoke(f"--batch job status {last} {first} 9999")
+    assert res.retcode == 1
+    assert res.data == f"{last} running\n{first} done\n9999 error"
+
+    ids_file = tmp_path / "ids.txt"
+    ids_file.write_text(f"{first}\n9999\n")
+    capsys.readouterr()
+    res = await invoke(f"--output ndjson job status --from-file {ids_file}")
+    res.show()
+    records = [
+        json.loads(line) for line in capsys.readouterr().out.splitlines()
+    ]
+    assert records[0]["log"] == LOG
+    assert records[1] == dict(id=9999, error="404 Job not found")
+
+    # CSV output has the columns of all the records
+    for ids in [f"9999 {first}", f"{first} 9999"]:
+        res = await invoke(f"--output csv job status {ids}")
+        res.show()
+        rows = list(csv.DictReader(capsys.readouterr().out.splitlines()))
+        rows = {row["id"]: row for row in rows}
+        assert rows["9999"]["error"] == "404 Job not found"
+        assert rows[str(first)]["status"] == "done"
+
+    # Invalid ID specifications are reported as errors
+    res = await invoke(f"job status {last}-{first}")
+    assert res.retcode == 1
+    assert res.data == f"ERROR: Invalid range of IDs {last}-{first}"
+    res = await invoke("job status")
+    assert res.retcode == 1
+    assert res.data == "ERROR: No ID given"
+
+
+def test_log_tail():
+    from fractal.cmd._job import last_lines
+    from fractal.cmd._job import LogTail
+
+    assert last_lines("a\nb\nc\n", 2) == "b\nc"
+    assert last_lines("a\nb\nc", 5) == "a\nb\nc"
+    assert last_lines("a\nb\nc", 0) == ""
+
+    tail = LogTail()
+    # Servers which send the full log
+    assert tail.update("line 1\n") == "line 1\n"
+    assert tail.update("line 1\n") == ""
+    assert tail.update("line 1\nline 2\n") == "line 2\n"
+    assert not tail.rewritten
+    assert tail.update("other\n") == "other\n"
+    assert tail.rewritten
+    # Servers which support partial reads
+    assert tail.offset == 6
+    assert tail.update("more\n", offset=6) == "more\n"
+    assert tail.offset == 11
+    assert tail.update("other\nmore\nend\n") == "end\n"
+
+
+async def test_job_logs(
+    register_user,
+    invoke,
+    workflow_factory,
+    job_factory,
+    job_updater,
+    tmp_path: Path,
+    monkeypatch,
+    capsys,
+):
+    """
+    GIVEN a running job, whose log grows
+    WHEN calling `job logs`, with `--tail` and `--follow`
+    THEN the last lines of the log are shown, and then the lines appended to
+        it until the job finishes
+    """
+    import asyncio
+
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_POLL_MIN_INTERVAL", 0.1)
+    monkeypatch.setattr(settings, "FRACTAL_POLL_MAX_INTERVAL", 0.2)
+
+    res = await invoke("project new prj0 prj_path0")
+    wf = await workflow_factory(project_id=res.data["id"])
+    log = "".join(f"line {i}\n" for i in range(100))
+    job = await job_factory(
+        workflow_id=wf.id,
+        working_dir=str(tmp_path),
+        status="running",
+        log=log,
+    )
+
+    res = await invoke(f"job logs {job.id} --tail 2")
+    assert res.data == "line 98\nline 99"
+    res = await invoke(f"job status {job.id} --fields status,log --tail 1")
+    assert res.extra_lines.endswith("line 99")
+
+    async def _later():
+        await asyncio.sleep(0.5)
+        await job_updater(job, log=log + "line 100\n")
+        await asyncio.sleep(0.5)
+        await job_updater(job, log=log + "line 100\nline 101\n", status="done")
+
+    task = asyncio.ensure_future(_later())
+    capsys.readouterr()
+    res = await invoke(f"job logs {job.id} --tail 1 --follow")
+    await task
+    assert res.retcode == 0
+    assert capsys.readouterr().out == "line 99\nline 100\nline 101\n"
@@ -22,8 +22,8 @@ async def test_project_create_batch(register_user, invoke):
 async def test_project_list(register_user, invoke):
     res = await invoke("project list")
     debug(res)
-    debug(vars(res.data))
-    assert len(res.data.rows) == 0
+    debug(res.data)
+    assert len(res.data) == 0
 
     res.show()
 
@@ -32,9 +32,20 @@ async def test_project_list(register_user, invoke):
 
     res = await invoke("project list")
     debug(res)
-    debug(vars(res.data))
+    debug(res.data)
     res.show()
-    assert len(res.data.rows) == 2
+    assert len(res.data) == 2
+
+    res = await invoke("project list --limit 1 --offset 1 --page-size 1")
+    assert [p["name"] for p in res.data] == ["prj1"]
+    res = await invoke("project list --offset 2")
+    assert res.data == []
+
+    res = await invoke("project list --fields name,id")
+    assert [list(p) for p in res.data] == [["name", "id"], ["name", "id"]]
+    res.show()
+    res = await invoke("project show prj1 --fields name")
+    assert res.data == dict(name="prj1")
 
 
 async def test_add_dataset(register_user, invoke):
@@ -49,3 +60,46 @@ async def test_add_dataset(register_user, invoke):
     assert res.retcode == 0
     res.show()
     assert res.data["name"] == DATASET_NAME
+
+
+async def test_name_resolution(register_user, invoke, tmp_path, monkeypatch):
+    """
+    GIVEN a project with a dataset and a workflow
+    WHEN referring to them by name
+    THEN the names are resolved to their IDs
+    """
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_CACHE_PATH", str(tmp_path))
+    res = await invoke("project new named_project named_path --dataset ds_a")
+    project_id = res.data["id"]
+    dataset_id = res.data["dataset_list"][0]["id"]
+    res = await invoke(f"workflow new named_wf {project_id}")
+    workflow_id = res.data["id"]
+
+    res = await invoke("project show named_project")
+    assert res.data["id"] == project_id
+    res = await invoke("--json dataset show named_project ds_a")
+    assert res.data["id"] == dataset_id
+    res = await invoke("workflow show named_wf")
+    assert res.data["id"] == workflow_id
+    res = await invoke("workflow list named_project")
+    assert res.retcode == 0
+
+    # Objects created after the index was synced are found as well
+    res = await invoke("project add-dataset named_project ds_b")
+    res = await invoke("--json dataset show named_project ds_b")
+    assert res.data["name"] == "ds_b"
+
+    res = await invoke("dataset show named_project missing_dataset")
+    assert res.retcode == 1
+    assert 'No dataset named "missing_dataset"' in res.data
+
+    await invoke("project add-dataset named_project ds_b")
+    res = await invoke("dataset show named_project ds_b")
+    assert res.retcode == 1
+    assert "ambiguous" in res.data
+
+    res = await invoke("project show missing_project")
+    assert res.retcode == 1
+    assert res.data == 'ERROR: No project named "missing_project"'
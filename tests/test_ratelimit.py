@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from devtools import debug
+
+from fractal.ratelimit import RequestLimiter
+from fractal.ratelimit import TokenBucket
+
+
+async def test_token_bucket():
+    """
+    GIVEN a token bucket
+    WHEN acquiring more tokens than its capacity
+    THEN the first ones are granted at once, and the others at its rate
+    """
+    bucket = TokenBucket(rate=20, capacity=5)
+    start = time.perf_counter()
+    await asyncio.gather(*(bucket.acquire() for _ in range(5)))
+    assert time.perf_counter() - start < 0.05
+    await asyncio.gather(*(bucket.acquire() for _ in range(5)))
+    elapsed = time.perf_counter() - start
+    debug(elapsed)
+    assert elapsed >= 5 / 20 * 0.9
+
+
+async def test_request_limiter(monkeypatch):
+    """
+    GIVEN a request limiter
+    WHEN many requests are sent at the same time
+    THEN concurrency is capped per host, with a separate budget for downloads
+    """
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_MAX_CONCURRENT_REQUESTS", 3)
+    monkeypatch.setattr(settings, "FRACTAL_MAX_CONCURRENT_DOWNLOADS", 1)
+    monkeypatch.setattr(settings, "FRACTAL_REQUESTS_PER_SECOND", 0)
+    monkeypatch.setattr(settings, "FRACTAL_DOWNLOADS_PER_SECOND", 0)
+
+    limiter = RequestLimiter()
+    running = dict()
+    peak = dict()
+
+    async def _request(url: str, key: str):
+        async with limiter(url):
+            running[key] = running.get(key, 0) + 1
+            peak[key] = max(peak.get(key, 0), running[key])
+            await asyncio.sleep(0.01)
+            running[key] -= 1
+
+    await asyncio.gather(
+        *(_request("http://a/api/project/", "a") for _ in range(10)),
+        *(_request("http://b/api/project/", "b") for _ in range(10)),
+        *(_request("http://a/api/job/download/1", "a-dl") for _ in range(5)),
+    )
+    debug(peak)
+    assert peak == {"a": 3, "b": 3, "a-dl": 1}
@@ -0,0 +1,121 @@
+from devtools import debug
+
+from fractal.cmd._script import parse_script
+
+
+def test_parse_script():
+    """
+    GIVEN a script
+    WHEN parsing it
+    THEN the dependencies between lines are computed
+    """
+    script = """
+    # A comment
+    prj = project new prj /tmp
+    other = project new other /tmp
+    project add-dataset ${prj[0]} out
+    wf = workflow new wf ${prj[0]}
+    workflow add-task ${wf} 1
+    workflow add-task \\
+        ${wf} 2
+    wait
+    workflow show ${wf}
+    """
+    lines = parse_script(script)
+    debug([(line.lineno, line.command) for line in lines])
+    prj, other, add_dataset, wf, add_1, add_2, show = lines
+
+    assert prj.label == "prj"
+    assert prj.depends_on == other.depends_on == []
+    assert add_dataset.depends_on == [prj]
+    assert wf.depends_on == [prj, add_dataset]
+    assert add_1.depends_on == [wf]
+    # Tasks are added in order
+    assert add_2.lineno == 8
+    assert add_2.depends_on == [wf, add_1]
+    assert set(show.depends_on) == set(lines[:-1])
+
+
+def test_parse_script_with_names():
+    """
+    GIVEN a script which refers to objects by name
+    WHEN parsing it
+    THEN lines sharing a name depend on each other, but not lines sharing
+        other arguments such as paths
+    """
+    script = """
+    project new prj /tmp
+    project new other /tmp
+    workflow new wf prj
+    workflow add-task wf task1 --args-file /tmp/args.json
+    workflow add-task wf task2 --order 0
+    job download-logs --project other --output /tmp/logs
+    """
+    prj, other, wf, add_1, add_2, logs = parse_script(script)
+
+    assert other.depends_on == []
+    assert wf.depends_on == [prj]
+    assert add_1.depends_on == [wf]
+    assert add_2.depends_on == [add_1]
+    assert logs.depends_on == [other]
+
+
+async def test_run_script(
+    register_user, invoke, tmp_path, task_factory, clear_task_cache
+):
+    """
+    GIVEN a script creating a project and a workflow
+    WHEN running it
+    THEN all commands succeed, and outputs are passed along through labels
+    """
+    await task_factory(name="task1")
+    await task_factory(name="task2")
+    script = tmp_path / "script.txt"
+    script.write_text(
+        "prj = project new prj /tmp\n"
+        "dataset add-resource ${prj[0]} ${prj[1]} /tmp/resource\n"
+        "project add-dataset ${prj[0]} out\n"
+        "wf = workflow new wf ${prj[0]}\n"
+        "workflow add-task ${wf} task1\n"
+        "workflow add-task ${wf} task2\n"
+        "project show ${prj[0]}\n"
+    )
+    res = await invoke(f"-j run-script {script} --max-concurrency 2")
+    debug(res.data)
+    assert res.retcode == 0
+    assert [line["status"] for line in res.data] == ["ok"] * 7
+
+    workflow_id = res.data[3]["output"]
+    res = await invoke(f"workflow show {workflow_id}")
+    task_list = [wftask["task"]["name"] for wftask in res.data["task_list"]]
+    assert task_list == ["task1", "task2"]
+
+
+async def test_run_script_errors(register_user, invoke, tmp_path):
+    """
+    GIVEN a script with invalid or failing lines
+    WHEN running it
+    THEN errors are reported and dependent lines are skipped
+    """
+    script = tmp_path / "script.txt"
+
+    script.write_text("project show ${prj}\n")
+    res = await invoke(f"run-script {script}")
+    assert res.retcode == 1
+    assert "label `prj` is not defined" in res.data
+
+    script.write_text("version\n")
+    res = await invoke(f"run-script {script}")
+    assert res.retcode == 1
+    assert "cannot be used in a script" in res.data
+
+    script.write_text(
+        "prj = project show 123456\n"
+        "workflow new wf ${prj}\n"
+        "project new prj /tmp\n"
+    )
+    res = await invoke(f"-j run-script {script}")
+    res.show()
+    assert res.retcode == 1
+    statuses = [line["status"] for line in res.data]
+    assert statuses == ["failed", "skipped", "ok"]
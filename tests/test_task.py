@@ -93,3 +93,19 @@ async def test_edit_task(register_user, invoke, clear_task_cache):
     # TODO:
     # Decide what it means to edit a task
     raise NotImplementedError
+
+
+def test_task_version():
+    from fractal.taskregistry import task_version
+
+    assert (
+        task_version(dict(source="pip:fractal-tasks-core==0.9.1")) == "0.9.1"
+    )
+    assert (
+        task_version(
+            dict(source="pip-local:fractal_tasks_core-0.9.1-py3-none-any.whl")
+        )
+        == "0.9.1"
+    )
+    assert task_version(dict(source="pip:fractal-tasks-core")) is None
+    assert task_version(dict(source="source", version="2")) == "2"
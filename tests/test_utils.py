@@ -0,0 +1,117 @@
+import asyncio
+import io
+import json
+import sys
+
+import httpx
+
+
+async def test_paginated_list(tmp_path, monkeypatch, mock_server):
+    """
+    GIVEN servers which paginate (with or without a total, or replying with
+        bare lists), and one which does not
+    WHEN listing records through `list_records`
+    THEN pages are prefetched concurrently and honour `--limit/--offset`,
+        and whole lists are sliced on the client side
+    """
+    from fractal.authclient import AuthClient
+    from fractal.cmd.utils import list_records
+    from fractal.cmd.utils import stream_records
+    from fractal.config import settings
+
+    monkeypatch.setattr(settings, "FRACTAL_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(settings, "FRACTAL_HTTP_CACHE", False)
+    monkeypatch.setattr(settings, "FRACTAL_PAGE_PREFETCH", 3)
+
+    records = [dict(id=i) for i in range(25)]
+    calls = []
+    in_flight = 0
+    max_in_flight = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, max_in_flight
+        calls.append(request.url.params)
+        if request.url.path == "/flat/":
+            return httpx.Response(200, json=records)
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        offset = int(request.url.params["offset"])
+        limit = int(request.url.params["limit"])
+        items = records[offset:][:limit]
+        if request.url.path == "/list/":
+            return httpx.Response(200, json=items)
+        total = len(records) if request.url.path == "/total/" else None
+        return httpx.Response(200, json=dict(items=items, total=total))
+
+    async with AuthClient(username="user", password="", slurm_user="") as c:
+        await mock_server(c, handler)
+
+        res = await list_records(c, "http://server/total/", page_size=4)
+        assert res == records
+        assert len(calls) == 7
+        assert max_in_flight == 3
+
+        calls.clear()
+        res = await list_records(
+            c, "http://server/total/", limit=7, offset=3, page_size=4
+        )
+        assert res == records[3:10]
+        assert [p["limit"] for p in calls] == ["4", "3"]
+
+        # Without `total`, fetching stops at the first short page (a request
+        # past it may have been prefetched, before being cancelled)
+        calls.clear()
+        res = await list_records(c, "http://server/nototal/", page_size=10)
+        assert res == records
+        assert len(calls) in [4, 5]
+
+        # Bare lists are pages too, if they are not longer than requested
+        calls.clear()
+        res = await list_records(c, "http://server/list/", page_size=10)
+        assert res == records
+        assert len(calls) in [3, 4]
+        res = await list_records(
+            c, "http://server/list/", limit=5, offset=10, page_size=10
+        )
+        assert res == records[10:15]
+
+        calls.clear()
+        res = await list_records(
+            c, "http://server/flat/", limit=5, offset=20, page_size=2
+        )
+        assert res == records[20:25]
+        assert len(calls) == 1
+        res = await list_records(c, "http://server/flat/", offset=20)
+        assert res == records[20:]
+
+        # Fields are requested from the server, and dropped if not supported
+        calls.clear()
+        res = await list_records(c, "http://server/flat/", fields=["name"])
+        assert res == [{}] * len(records)
+        assert calls[0]["fields"] == "name"
+
+        # A whole list which fits in a page is not fetched again
+        calls.clear()
+        res = await list_records(c, "http://server/flat/", page_size=25)
+        assert res == records
+        assert len(calls) <= 1 + settings.FRACTAL_PAGE_PREFETCH
+
+        # Raw outputs are written one page at a time, as pages arrive
+        class Stdout(io.StringIO):
+            def write(self, text):
+                requests_sent.append(len(calls))
+                return super().write(text)
+
+        calls.clear()
+        requests_sent = []
+        stdout = Stdout()
+        with monkeypatch.context() as m:
+            m.setattr(sys, "stdout", stdout)
+            res = await stream_records(
+                c, "http://server/total/", "json", page_size=4
+            )
+        assert res.retcode == 0
+        assert json.loads(stdout.getvalue()) == records
+        assert requests_sent[0] < len(calls) == 7
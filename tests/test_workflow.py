@@ -1,6 +1,5 @@
 import asyncio
 import json
-import logging
 import time
 from pathlib import Path
 
@@ -47,6 +46,26 @@ async def test_workflow_list(register_user, invoke):
     assert len(res_list.data) == 2
 
 
+async def test_workflow_show_many(register_user, invoke):
+    res = await invoke("project new prj0 prj_path0")
+    project_id = res.data["id"]
+    wf_ids = []
+    for name in ["WF1", "WF2"]:
+        res = await invoke(f"--batch workflow new {name} {project_id}")
+        wf_ids.append(int(res.data))
+
+    res = await invoke(f"workflow show WF2 {wf_ids[0]} 9999")
+    res.show()
+    assert res.retcode == 1
+    assert [wf["id"] for wf in res.data] == [wf_ids[1], wf_ids[0], 9999]
+    assert "error" in res.data[2]
+    assert "Error" in res.columns.values()
+
+    res = await invoke(f"workflow show {wf_ids[1]}-{wf_ids[0]}")
+    assert res.retcode == 1
+    assert res.data == f"ERROR: Invalid range of IDs {wf_ids[1]}-{wf_ids[0]}"
+
+
 async def test_workflow_list_when_two_projects_exist(
     register_user, invoke, tmp_path: Path
 ):
@@ -139,42 +158,72 @@ async def test_add_task_by_name(
     assert res.data["task_list"][0]["id"] == task.id
 
 
-async def test_task_cache_fails_for_non_unique_names(
+async def test_task_name_lookups(
+    invoke,
+    register_user,
+    task_factory,
+    workflow_factory,
+    clear_task_cache,
+):
+    """
+    GIVEN an empty task registry
+    WHEN many tasks are added by name, including missing ones
+    THEN the task list is fetched once
+    """
+    from fractal.taskregistry import stats
+
+    task = await task_factory(name="lookup_task")
+    wf = await workflow_factory()
+    stats.clear()
+    for _ in range(5):
+        res = await invoke(f"workflow add-task {wf.id} {task.name}")
+        assert res.retcode == 0
+    for _ in range(2):
+        res = await invoke(f"workflow add-task {wf.id} missing_task")
+        assert res.retcode == 1
+        assert 'Task "missing_task"' in res.data
+    debug(stats)
+    assert stats == dict(misses=1, hits=4, negative_hits=2)
+
+    res = await invoke("debug task-cache")
+    assert res.data["tasks"] >= 1
+    assert res.data["fresh"]
+
+
+async def test_task_registry_versions(
     invoke,
     register_user,
     task_factory,
     workflow_factory,
     tmp_path: Path,
-    caplog: pytest.LogCaptureFixture,
     clear_task_cache,
 ):
     """
-    GIVEN two tasks with the same name
-    WHEN the client is invoked to list the tasks
+    GIVEN two versions of a task with the same name
+    WHEN the client is invoked to add the task by name
     THEN
-        * A warning is raised that the cache won't be written
-        * Addressing tasks by name raises a FileNotFoundError
+        * The bare name is rejected as ambiguous
+        * `name@version` selects one of the two tasks
     """
-
-    # Create two tasks with the same name
-    task1 = await task_factory()
-    task2 = await task_factory()
+    task1 = await task_factory(source="pip:fractal-tasks-core==0.1.0")
+    task2 = await task_factory(source="pip:fractal-tasks-core==0.2.0")
     assert task1.name == task2.name
 
-    # Verify that a warning is raised upon creating the cache file
-    caplog.set_level(logging.WARNING)
     res = await invoke("task list")
     assert res.retcode == 0
-    debug(caplog.text)
-    assert "Cannot write task-list cache" in caplog.text
 
-    # Verify that adding tasks to a worfklow by name (as opposed to "by id")
-    # fails because of missing cache file
     wf = await workflow_factory()
-    cmd = f"workflow add-task {wf.id} {task1.name}"
-    debug(cmd)
-    with pytest.raises(FileNotFoundError):
-        res = await invoke(cmd)
+    res = await invoke(f"workflow add-task {wf.id} {task1.name}")
+    assert res.retcode == 1
+    assert "ambiguous" in res.data
+
+    res = await invoke(f"workflow add-task {wf.id} {task2.name}@0.2.0")
+    assert res.retcode == 0
+    debug(res.data)
+    assert res.data["task_list"][0]["task"]["id"] == task2.id
+
+    res = await invoke(f"workflow add-task {wf.id} {task1.name}@0.3.0")
+    assert res.retcode == 1
 
 
 async def test_edit_workflow_task(